@@ -0,0 +1,55 @@
+"""
+Attribute projection and publish cadence
+json_attributes are the bulk of our MQTT bytes and most fields never change.
+Per entity family (disk, docker, vm, share) only the configured fields are
+kept, and an entity's attributes are only republished when they changed or
+once every attribute_interval seconds.
+"""
+import time
+
+
+class AttributeFilter:
+    __slots__ = ('projections', 'interval', 'published')
+
+    def __init__(self, projections=None, interval=0):
+        """
+        Args:
+            projections: {family: [field, ...]} of the fields to keep; families not listed keep everything
+            interval: Seconds between republishes of unchanged attributes, 0 to publish every time
+        """
+        self.published = {}
+        self.configure(projections, interval)
+
+    def configure(self, projections, interval):
+        self.projections = {family: frozenset(fields or ()) for family, fields in (projections or {}).items()}
+        self.interval = interval or 0
+
+    def project(self, family, attributes):
+        """The fields of `attributes` configured for `family` (the same dict if nothing is filtered)"""
+        fields = self.projections.get(family)
+        if fields is None or not attributes:
+            return attributes
+        return {key: value for key, value in attributes.items() if key in fields}
+
+    def due(self, sensor_id, serialized, now=None):
+        """
+        True if serialized attributes should be published for sensor_id now
+
+        Records the publish, so call it only when the message is actually sent.
+        """
+        if not self.interval:
+            return True
+        now = now or time.time()
+        fingerprint = hash(serialized)
+        last = self.published.get(sensor_id)
+        if last is not None and last[0] == fingerprint and now - last[1] < self.interval:
+            return False
+        self.published[sensor_id] = (fingerprint, now)
+        return True
+
+    def forget(self, sensor_id):
+        self.published.pop(sensor_id, None)
+
+    def reset(self):
+        """Publish everything again on the next cycle (e.g. the broker may have lost retained messages)"""
+        self.published.clear()
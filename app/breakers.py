@@ -0,0 +1,190 @@
+"""
+Circuit breakers for Unraid endpoints
+One breaker per endpoint (/graphql, /sub, /login and each PHP page) per server.
+After FAILURE_THRESHOLD failures in a row a breaker opens and requests to that
+endpoint fail at once with CircuitOpenError, without touching emhttp. After a
+jittered, exponentially growing pause it lets one trial request through
+(half-open): success closes it, failure opens it again for longer.
+
+Requests to an endpoint that is failing are retries, and all retries of a
+server draw from one retry budget, so a struggling server gets at most
+RETRY_BUDGET extra requests per minute from all collectors together.
+"""
+import time
+import random
+import httpx
+
+FAILURE_THRESHOLD = 3
+BASE_BACKOFF = 10
+MAX_BACKOFF = 300
+# Retries per minute per server
+RETRY_BUDGET = 20
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+
+class CircuitOpenError(httpx.TransportError):
+    """A request was refused locally because its endpoint's breaker is open or the retry budget is spent"""
+
+
+def endpoint_of(path):
+    """Breaker key of a request path: all nchan subscriptions share '/sub'"""
+    return '/sub' if path.startswith('/sub/') else path
+
+
+class CircuitBreaker:
+    __slots__ = ('state', 'failures', 'opens', 'open_until', 'trial', 'last_error', 'changed')
+
+    def __init__(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.opens = 0
+        self.open_until = 0
+        self.trial = False
+        self.last_error = None
+        self.changed = time.time()
+
+    def allow(self, now):
+        if self.state == OPEN:
+            if now < self.open_until:
+                return False
+            self.state = HALF_OPEN
+            self.changed = now
+        if self.state == HALF_OPEN:
+            # One trial request at a time
+            if self.trial:
+                return False
+            self.trial = True
+        return True
+
+    def success(self, now):
+        changed = self.state != CLOSED
+        self.state = CLOSED
+        self.failures = 0
+        self.opens = 0
+        self.trial = False
+        if changed:
+            self.changed = now
+        return changed
+
+    def failure(self, error, now):
+        self.failures += 1
+        self.trial = False
+        self.last_error = str(error)[:200]
+        if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= FAILURE_THRESHOLD):
+            self.opens += 1
+            backoff = min(BASE_BACKOFF * 2 ** (self.opens - 1), MAX_BACKOFF)
+            self.open_until = now + backoff * random.uniform(0.5, 1.0)
+            self.state = OPEN
+            self.changed = now
+            return True
+        return False
+
+    def as_dict(self, now):
+        return {
+            'state': self.state,
+            'consecutive_failures': self.failures,
+            'retry_in': round(max(0.0, self.open_until - now), 1) if self.state == OPEN else None,
+            'last_error': self.last_error,
+            'since': round(now - self.changed, 1)
+        }
+
+
+class RetryBudget:
+    """Token bucket of retries, refilled continuously at per_minute"""
+
+    def __init__(self, per_minute=RETRY_BUDGET):
+        self.per_minute = per_minute
+        self.tokens = float(per_minute)
+        self.updated = time.time()
+        self.refused = 0
+
+    def withdraw(self, now):
+        self.tokens = min(self.per_minute, self.tokens + (now - self.updated) * self.per_minute / 60)
+        self.updated = now
+        if self.tokens < 1:
+            self.refused += 1
+            return False
+        self.tokens -= 1
+        return True
+
+
+class Breakers:
+    def __init__(self, retry_budget=RETRY_BUDGET, on_change=None):
+        """
+        Args:
+            retry_budget: Retries per minute shared by all endpoints of the server
+            on_change: Optional callable (endpoint, breaker) called when a breaker opens or closes
+        """
+        self.breakers = {}
+        self.budget = RetryBudget(retry_budget)
+        self.on_change = on_change
+
+    def get(self, endpoint):
+        breaker = self.breakers.get(endpoint)
+        if breaker is None:
+            breaker = self.breakers[endpoint] = CircuitBreaker()
+        return breaker
+
+    def before(self, endpoint):
+        """Raise CircuitOpenError unless a request to endpoint may go out now"""
+        now = time.time()
+        breaker = self.get(endpoint)
+        if not breaker.allow(now):
+            raise CircuitOpenError(f'{endpoint} circuit open, retry in {max(0.0, breaker.open_until - now):.0f}s')
+        if breaker.failures and not self.budget.withdraw(now):
+            breaker.trial = False
+            raise CircuitOpenError(f'{endpoint} retry refused, retry budget spent')
+
+    def success(self, endpoint):
+        breaker = self.get(endpoint)
+        if breaker.success(time.time()) and self.on_change:
+            self.on_change(endpoint, breaker)
+
+    def failure(self, endpoint, error):
+        breaker = self.get(endpoint)
+        if breaker.failure(error, time.time()) and self.on_change:
+            self.on_change(endpoint, breaker)
+
+    def release(self, endpoint):
+        """The request was cancelled before it had an outcome; let the next trial through"""
+        self.get(endpoint).trial = False
+
+    def open(self):
+        return sorted(endpoint for endpoint, breaker in self.breakers.items() if breaker.state != CLOSED)
+
+    def report(self):
+        now = time.time()
+        return {
+            'endpoints': {endpoint: breaker.as_dict(now) for endpoint, breaker in self.breakers.items()},
+            'retry_tokens': round(self.budget.tokens, 1),
+            'retries_refused': self.budget.refused
+        }
+
+
+class BreakerTransport(httpx.AsyncBaseTransport):
+    """Send requests through the breaker of their endpoint"""
+
+    def __init__(self, breakers, inner):
+        self.breakers = breakers
+        self.inner = inner
+
+    async def handle_async_request(self, request):
+        endpoint = endpoint_of(request.url.path)
+        self.breakers.before(endpoint)
+        try:
+            response = await self.inner.handle_async_request(request)
+        except httpx.TransportError as e:
+            self.breakers.failure(endpoint, e)
+            raise
+        except BaseException:
+            self.breakers.release(endpoint)
+            raise
+        if response.status_code >= 500 or response.status_code == 429:
+            self.breakers.failure(endpoint, f'HTTP {response.status_code}')
+        else:
+            self.breakers.success(endpoint)
+        return response
+
+    async def aclose(self):
+        await self.inner.aclose()
@@ -0,0 +1,141 @@
+"""
+Traffic capture for offline replay
+Records raw nchan frames and every HTTP exchange (GraphQL, VMMachines.php,
+ShareList.php, UPS pages...) of one server to a gzipped JSON-lines file, and
+plays HTTP exchanges back from such a file (see replay.py).
+
+Line format, one JSON object per line:
+    {"kind": "header", "server": ..., "mode": ..., "started": ...}
+    {"t": <unix time>, "kind": "nchan", "channels": [...], "data": <frame>}
+    {"t": ..., "kind": "http", "collector": ..., "cycle": ..., "method": ..., "path": ...,
+     "request": <body>, "status": ..., "headers": {...}, "body": <text>}
+
+Binary frames and bodies are stored base64 encoded under "data_b64" / "body_b64".
+"""
+import gzip
+import json
+import time
+import base64
+import contextvars
+import httpx
+
+# (collector name, cycle number) of the running collector; lets replay group the
+# requests of one collector cycle back together
+CAPTURE_CONTEXT = contextvars.ContextVar('capture_context', default=None)
+
+# Response headers worth keeping. Request headers (API key, cookie) are never stored.
+KEPT_HEADERS = ('content-type', 'location')
+
+# Request bodies that carry credentials
+REDACTED_PATHS = ('/login',)
+
+# The body is handed on already decoded
+DROPPED_HEADERS = ('content-encoding', 'content-length', 'transfer-encoding')
+
+FLUSH_INTERVAL = 5
+
+
+def _text_field(record, name, value):
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        value = bytes(value)
+        try:
+            record[name] = value.decode('utf-8')
+        except UnicodeDecodeError:
+            record[f'{name}_b64'] = base64.b64encode(value).decode('ascii')
+    else:
+        record[name] = value
+
+
+def field(record, name):
+    """Read back a field written by _text_field"""
+    if f'{name}_b64' in record:
+        return base64.b64decode(record[f'{name}_b64'])
+    return record.get(name)
+
+
+class CaptureWriter:
+    def __init__(self, path, server_name, mode):
+        self.path = path
+        self.file = gzip.open(path, 'at', encoding='utf-8')
+        self.last_flush = time.time()
+        self.records = 0
+        self.write('header', server=server_name, mode=mode, started=time.time())
+
+    def write(self, kind, **fields):
+        record = {'t': round(time.time(), 3), 'kind': kind}
+        for name, value in fields.items():
+            _text_field(record, name, value)
+        self.file.write(json.dumps(record, separators=(',', ':')) + '\n')
+        self.records += 1
+        if record['t'] - self.last_flush >= FLUSH_INTERVAL:
+            self.file.flush()
+            self.last_flush = record['t']
+
+    def nchan(self, channels, data):
+        self.write('nchan', channels=list(channels), data=data)
+
+    def close(self):
+        self.file.close()
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """Pass requests through to the network and record each exchange"""
+
+    def __init__(self, writer, **kwargs):
+        self.writer = writer
+        self.inner = httpx.AsyncHTTPTransport(**kwargs)
+
+    async def handle_async_request(self, request):
+        response = await self.inner.handle_async_request(request)
+        body = await response.aread()
+        collector, cycle = CAPTURE_CONTEXT.get() or (None, None)
+        self.writer.write(
+            'http',
+            collector=collector,
+            cycle=cycle,
+            method=request.method,
+            path=request.url.path,
+            query=request.url.query.decode('ascii', 'replace'),
+            request=b'' if request.url.path in REDACTED_PATHS else request.content,
+            status=response.status_code,
+            headers={name: response.headers[name] for name in KEPT_HEADERS if name in response.headers},
+            body=body
+        )
+        headers = [(name, value) for name, value in response.headers.multi_items() if name.lower() not in DROPPED_HEADERS]
+        return httpx.Response(response.status_code, headers=headers, content=body, request=request,
+                              extensions=response.extensions)
+
+    async def aclose(self):
+        await self.inner.aclose()
+
+
+class PlaybackTransport(httpx.AsyncBaseTransport):
+    """Answer requests from recorded exchanges, in recorded order per method and path"""
+
+    def __init__(self, records=()):
+        self.queues = {}
+        self.misses = 0
+        for record in records:
+            self.add(record)
+
+    def add(self, record):
+        self.queues.setdefault((record['method'], record['path']), []).append(record)
+
+    async def handle_async_request(self, request):
+        queue = self.queues.get((request.method, request.url.path))
+        if not queue:
+            self.misses += 1
+            return httpx.Response(404, content=b'not in capture', request=request)
+        # Keep the last exchange so repeated requests in one cycle still get an answer
+        record = queue.pop(0) if len(queue) > 1 else queue[0]
+        return httpx.Response(record['status'], headers=record.get('headers') or {}, content=field(record, 'body') or b'',
+                              request=request)
+
+
+def read_capture(path):
+    """Yield the records of a capture file in order"""
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
@@ -0,0 +1,136 @@
+"""
+Collector registry
+Declares which collectors run in each data collection mode and resolves their
+parser functions once when a collector starts, so loops never import at runtime
+and modules of collectors that never start (other modes, options switched off,
+sources not routed) are never loaded. Also keeps the startup profile (import
+cost per module, time to first publish).
+"""
+import time
+import importlib
+import psutil
+
+
+class StartupProfile:
+    def __init__(self):
+        self.process_start = psutil.Process().create_time()
+        self.imports = {}
+        self.first_publish = {}
+
+    def import_module(self, name):
+        """Import a module, recording how long a first import took"""
+        if name in self.imports:
+            return importlib.import_module(name)
+        started = time.perf_counter()
+        module = importlib.import_module(name)
+        self.imports[name] = time.perf_counter() - started
+        return module
+
+    def mark_first_publish(self, server_name):
+        """Record the first broker publish of a server; returns seconds since process start"""
+        if server_name not in self.first_publish:
+            self.first_publish[server_name] = time.time() - self.process_start
+        return self.first_publish[server_name]
+
+    def report(self):
+        return {
+            'imports_ms': {name: round(seconds * 1000, 1) for name, seconds in self.imports.items()},
+            'first_publish_s': {name: round(seconds, 2) for name, seconds in self.first_publish.items()}
+        }
+
+
+STARTUP = StartupProfile()
+
+
+class Collector:
+    __slots__ = ('name', 'targets', 'method', 'interval', 'needs_session', 'description', 'requires', 'channels',
+                 'streaming', 'option', 'functions')
+
+    def __init__(self, name, targets=(), method=None, interval='scan_interval', needs_session=True, description=None,
+                 requires=(), channels=(), streaming=False, option=None):
+        """
+        Args:
+            name: Unique collector name, also the task key on the server
+            targets: 'module:function' coroutines called as fn(server, create_config=True) every cycle
+            method: Name of a server coroutine method that runs its own loop (instead of targets)
+            interval: Server attribute holding the sleep between cycles
+            needs_session: Refresh the Unraid session cookie before each cycle
+            description: Used in log messages
+            requires: GraphQL root fields the collector can't work without
+            channels: nchan channels the collector subscribes to
+            streaming: The single target is a long-running fn(server) that loops by itself
+            option: Server attribute that must be truthy for the collector to run
+        """
+        self.name = name
+        self.targets = targets
+        self.method = method
+        self.interval = interval
+        self.needs_session = needs_session
+        self.description = description or name
+        self.requires = requires
+        self.channels = channels
+        self.streaming = streaming
+        self.option = option
+        self.functions = None
+
+    def resolve(self):
+        """Import the target modules once and cache the functions"""
+        if self.functions is None:
+            functions = []
+            for target in self.targets:
+                module_name, _, function_name = target.partition(':')
+                functions.append(getattr(STARTUP.import_module(module_name), function_name))
+            self.functions = tuple(functions)
+        return self.functions
+
+    def enabled(self, server):
+        return self.option is None or bool(getattr(server, self.option, None))
+
+
+SYSTEM_COLLECTORS = (
+    # Uses local psutil, runs in every mode
+    Collector('system_sensors', (
+        'parsers.uptime:system_uptime',
+        'parsers.cpu:cpu_temperature_avg',
+        'parsers.cpu:cpu_utilization',
+    ), needs_session=False, description='system sensors'),
+)
+
+# System sensors come first: they need no session and are the cheapest first data
+MODES = {
+    'graphql': SYSTEM_COLLECTORS + (
+        Collector('graphql_disk', ('parsers.graphql_disks:disks_graphql',), description='GraphQL disk info', requires=('array',)),
+        Collector('disk_telemetry', ('parsers.disk_telemetry:disk_telemetry',), description='GraphQL disk telemetry',
+                  requires=('array',)),
+        Collector('graphql_docker', ('parsers.graphql_docker:docker_containers',), description='GraphQL Docker info',
+                  requires=('docker',)),
+        Collector('graphql_vms', ('parsers.graphql_vms:vms_graphql',), description='GraphQL VM info'),
+        Collector('graphql_array', (
+            'parsers.graphql_array:array_status_graphql',
+            'parsers.graphql_array:parity_history_graphql',
+        ), description='GraphQL array info', requires=('array',)),
+        # Shares update less frequently (once per hour like the original)
+        Collector('graphql_shares', ('parsers.graphql_shares:shares_graphql',), interval='share_parser_interval',
+                  description='GraphQL shares info', requires=('shares',)),
+        Collector('graphql_ups', ('parsers.graphql_ups:ups_graphql',), interval='ups_scan_interval', description='GraphQL UPS info',
+                  channels=('apcups',)),
+        Collector('graphql_system', ('parsers.graphql_system:system_metrics_graphql',), interval='system_scan_interval',
+                  description='system metrics', channels=('update1', 'temperature')),
+        Collector('docker_load', ('parsers.docker_load:docker_load_stream',), streaming=True, option='docker_load_interval',
+                  description='Docker load stream', channels=('dockerload',)),
+    ),
+    'websocket': SYSTEM_COLLECTORS + (
+        Collector('websocket', method='ws_connect'),
+        Collector('vm_sensors', method='vm_sensor_loop'),
+        Collector('graphql_disk', ('parsers.graphql_disks:disks_graphql',), description='GraphQL disk info'),
+        Collector('http_ups', ('parsers.http_ups:fetch_ups_http',), description='HTTP UPS data'),
+    ),
+}
+
+# Every collector of both modes; the server's router (routing.py) picks which of them run
+MODES['auto'] = tuple({collector.name: collector for mode in ('websocket', 'graphql') for collector in MODES[mode]}.values())
+
+
+def collectors_for(mode, server):
+    """Collectors of a mode that the server's options enable; their functions are resolved when they start"""
+    return tuple(collector for collector in MODES[mode] if collector.enabled(server))
@@ -0,0 +1,88 @@
+"""
+Config hot reload
+Watches config.yaml and applies the difference to the running servers:
+new entries are started, removed ones stopped, and interval changes are
+applied in place without touching MQTT connections or Unraid sessions.
+"""
+import os
+import asyncio
+from utils import load_file, get_logger
+
+RELOAD_INTERVAL = 10
+
+# Changing any of these needs a new session (or client id), or new discovery configs, so the server is restarted
+CONNECTION_KEYS = ('host', 'port', 'ssl', 'username', 'password', 'api_key', 'discovery', 'state_topics', 'sources')
+
+
+def _by_name(config):
+    """Server entries by name; empty for anything that isn't a mapping with an 'unraid' list"""
+    entries = config.get('unraid') if isinstance(config, dict) else None
+    if not isinstance(entries, list):
+        return {}
+    return {entry.get('name'): entry for entry in entries if isinstance(entry, dict) and entry.get('name')}
+
+
+class ConfigWatcher:
+    def __init__(self, path, config, servers, create_server, interval=RELOAD_INTERVAL):
+        """
+        Args:
+            path: config.yaml to watch
+            config: The config the servers were started with
+            servers: Mapping of server name -> UnRAIDServer, updated in place
+            create_server: Callable (mqtt_config, unraid_config) -> UnRAIDServer
+            interval: Seconds between modification time checks
+        """
+        self.path = path
+        self.config = config
+        self.servers = servers
+        self.create_server = create_server
+        self.interval = interval
+        self.logger = get_logger('config')
+        self.mtime = self.stat()
+
+    def stat(self):
+        try:
+            return os.stat(self.path).st_mtime
+        except OSError:
+            return None
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            mtime = self.stat()
+            if mtime is None or mtime == self.mtime:
+                continue
+            self.mtime = mtime
+
+            try:
+                config = load_file(self.path)
+                if not _by_name(config):
+                    # Empty, half-written or broken file: never tear down every server over it
+                    self.logger.warning('Config reload: no valid unraid entries, keeping the running config')
+                    continue
+                await self.apply(config)
+            except Exception:
+                self.logger.exception('Config reload failed')
+
+    async def apply(self, config):
+        old_entries = _by_name(self.config)
+        new_entries = _by_name(config)
+        mqtt_changed = (config.get('mqtt') or {}) != (self.config.get('mqtt') or {})
+        self.config = config
+
+        for name in old_entries.keys() - new_entries.keys():
+            self.logger.info(f'Config reload: removing server {name}')
+            await self.servers.pop(name).stop()
+
+        for name, entry in new_entries.items():
+            old_entry = old_entries.get(name)
+            if old_entry is None:
+                self.logger.info(f'Config reload: adding server {name}')
+                self.servers[name] = self.create_server(config.get('mqtt'), entry)
+            elif mqtt_changed or any(entry.get(key) != old_entry.get(key) for key in CONNECTION_KEYS):
+                self.logger.info(f'Config reload: connection settings of {name} changed, restarting it')
+                await self.servers.pop(name).stop()
+                self.servers[name] = self.create_server(config.get('mqtt'), entry)
+            elif entry != old_entry:
+                self.logger.info(f'Config reload: updating {name}')
+                self.servers[name].reload(entry)
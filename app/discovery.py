@@ -0,0 +1,64 @@
+"""
+Device-based Home Assistant discovery
+With discovery: device a server publishes a single retained
+homeassistant/device/<id>/config message listing all its entities as
+components (Home Assistant 2024.11+), instead of one config per entity that
+repeats the device block. Collectors report their entities as usual; the
+registry assembles the device payload incrementally and it is only republished
+when a component or the device changed.
+"""
+import json
+
+ORIGIN = {'name': 'hass-unraid'}
+
+# Device payloads larger than this fall back to per-entity discovery; some brokers
+# (and AWS IoT style limits) reject packets of a few hundred KB
+MAX_PAYLOAD_BYTES = 256 * 1024
+
+
+class ComponentRegistry:
+    def __init__(self):
+        self.components = {}
+        # Components to send once as {'platform': ...} so Home Assistant removes them
+        self.removed = {}
+        # Old per-entity config topics to clear once the device config is out
+        self.migrated = []
+        self.published = None
+
+    def __len__(self):
+        return len(self.components)
+
+    def add(self, object_id, platform, config):
+        """
+        Record an entity's discovery config (without the device block)
+
+        Returns:
+            bool: True if the entity was not a component yet
+        """
+        new = object_id not in self.components
+        self.components[object_id] = {'platform': platform, **config}
+        self.removed.pop(object_id, None)
+        return new
+
+    def remove(self, object_id):
+        component = self.components.pop(object_id, None)
+        if component is not None:
+            self.removed[object_id] = {'platform': component['platform']}
+
+    def render(self, device):
+        """The device payload as JSON, or None if it is what was published last"""
+        payload = json.dumps({
+            'device': device,
+            'origin': ORIGIN,
+            'components': {**self.components, **self.removed}
+        })
+        return None if payload == self.published else payload
+
+    def mark_published(self, payload):
+        self.published = payload
+        self.removed.clear()
+        self.migrated.clear()
+
+    def reset(self):
+        """Publish the device payload again on the next flush (e.g. after a reconnect)"""
+        self.published = None
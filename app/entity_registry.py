@@ -0,0 +1,186 @@
+"""
+Entity lifecycle registry
+Remembers every entity published for a server, which object (container, VM,
+share, disk) it belongs to and since when that object has been missing from
+its listing. Once an object has been absent for longer than its family's grace
+period, its entities are removed from Home Assistant and the broker by
+publishing empty retained payloads. The registry is persisted so entities that
+vanish while the bridge is down are still cleaned up.
+"""
+import os
+import json
+import time
+
+# Seconds an object may be missing from its listing before its entities are removed.
+# None keeps a family forever.
+DEFAULT_GRACE = {
+    'docker': 86400,
+    'vm': 7 * 86400,
+    'share': 7 * 86400,
+    'disk': 7 * 86400,
+}
+
+# sensor_id prefix -> family, for retained configs found on the broker that we don't know yet
+FAMILY_PREFIXES = {
+    'docker_': 'docker',
+    'vm_': 'vm',
+    'share_': 'share',
+    'disk_': 'disk',
+}
+
+
+class EntityRecord:
+    __slots__ = ('sensor_type', 'family', 'key', 'topics')
+
+    def __init__(self, sensor_type, family, key, topics):
+        self.sensor_type = sensor_type
+        self.family = family
+        self.key = key
+        self.topics = topics
+
+
+class EntityRegistry:
+    def __init__(self, path, grace=None):
+        """
+        Args:
+            path: JSON file the registry is persisted to
+            grace: {family: seconds or None} overriding DEFAULT_GRACE
+        """
+        self.path = path
+        self.set_grace(grace)
+        self.entities = {}
+        self.absent = {}
+        self.dirty = False
+        self.load()
+
+    def __len__(self):
+        return len(self.entities)
+
+    def set_grace(self, grace):
+        self.grace = dict(DEFAULT_GRACE)
+        self.grace.update(grace or {})
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError):
+            # A corrupt registry only costs us cleanups, never data
+            return
+
+        for sensor_id, (sensor_type, family, key, topics) in data.get('entities', {}).items():
+            self.entities[sensor_id] = EntityRecord(sensor_type, family, key, topics)
+        self.absent = {(family, key): since for family, key, since in data.get('absent', [])}
+
+    def save(self):
+        """Write the registry if it changed since the last save"""
+        if not self.dirty:
+            return
+        data = {
+            'entities': {
+                sensor_id: (record.sensor_type, record.family, record.key, record.topics)
+                for sensor_id, record in self.entities.items()
+            },
+            'absent': [(family, key, since) for (family, key), since in self.absent.items()]
+        }
+        tmp_path = f'{self.path}.tmp'
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+    def record(self, sensor_id, sensor_type, topics, owner=None):
+        """
+        Remember an entity and the topics it was published to
+
+        Args:
+            owner: (family, key) of the object the entity belongs to, or None for
+                entities that are never garbage collected
+        """
+        family, key = owner if owner else (None, None)
+        record = self.entities.get(sensor_id)
+        if record is None:
+            self.entities[sensor_id] = EntityRecord(sensor_type, family, key, list(topics))
+            self.dirty = True
+            return
+
+        if record.family != family or record.key != key or record.sensor_type != sensor_type:
+            record.sensor_type = sensor_type
+            record.family = family
+            record.key = key
+            self.dirty = True
+        for topic in topics:
+            if topic not in record.topics:
+                record.topics.append(topic)
+                self.dirty = True
+
+    def add_topic(self, sensor_id, topic):
+        record = self.entities.get(sensor_id)
+        if record is not None and topic not in record.topics:
+            record.topics.append(topic)
+            self.dirty = True
+
+    def drop_topic(self, sensor_id, topic):
+        """Stop tracking a topic that no longer belongs to the entity (e.g. a migrated discovery config)"""
+        record = self.entities.get(sensor_id)
+        if record is not None and topic in record.topics:
+            record.topics.remove(topic)
+            self.dirty = True
+
+    def adopt(self, sensor_id, sensor_type, topics):
+        """
+        Track a retained entity found on the broker but never published by this process
+
+        Adopted entities of a collected family are removed unless a parser claims
+        them within that family's grace period.
+        """
+        if sensor_id in self.entities:
+            return False
+        family = next((family for prefix, family in FAMILY_PREFIXES.items() if sensor_id.startswith(prefix)), None)
+        if family is None:
+            return False
+        self.entities[sensor_id] = EntityRecord(sensor_type, family, None, list(topics))
+        self.absent.setdefault((family, None), time.time())
+        self.dirty = True
+        return True
+
+    def present(self, family, keys, now=None):
+        """
+        Record the full listing of a family and return entities whose grace has run out
+
+        Only call this with a complete, successful listing: every known object of
+        the family that is not in `keys` starts (or continues) its grace period.
+
+        Returns:
+            list: (sensor_id, EntityRecord) to remove, already dropped from the registry
+        """
+        now = now or time.time()
+        keys = set(keys)
+        owners = {record.key for record in self.entities.values() if record.family == family}
+        for key in owners:
+            if key in keys:
+                if self.absent.pop((family, key), None) is not None:
+                    self.dirty = True
+            elif (family, key) not in self.absent:
+                self.absent[(family, key)] = now
+                self.dirty = True
+
+        grace = self.grace.get(family)
+        if grace is None:
+            return []
+
+        expired = {key for (absent_family, key), since in self.absent.items() if absent_family == family and now - since >= grace}
+        if not expired:
+            return []
+
+        removed = [(sensor_id, record) for sensor_id, record in self.entities.items()
+                   if record.family == family and record.key in expired]
+        for sensor_id, _ in removed:
+            del self.entities[sensor_id]
+        for key in expired:
+            del self.absent[(family, key)]
+        self.dirty = True
+        return removed
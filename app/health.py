@@ -0,0 +1,156 @@
+"""
+Collector health
+Per-collector freshness for the /health and /ready endpoints of the local API:
+when each collector last completed a successful cycle, how many cycles in a
+row failed and how long the last one took. Parsers that swallow their errors
+(graphql_query returning None, UPS fetches logging at debug level) mark the
+running cycle as failed with fail_current(), so a collector that never raises
+but never delivers still goes stale.
+
+Every report is also a heartbeat: stalled() lists collectors stuck in one cycle,
+or streams that stopped reporting at all, for the server's supervisor to restart.
+"""
+import time
+import contextvars
+
+# Name of the collector whose cycle is running in the current task
+CURRENT_COLLECTOR = contextvars.ContextVar('current_collector', default=None)
+
+# A periodic collector is stale after this many intervals without a successful cycle
+STALE_FACTOR = 3
+MIN_BUDGET = 120
+# Long-running collectors (WebSocket streams, own loops) report each success themselves
+STREAM_BUDGET = 600
+
+
+class CollectorHealth:
+    __slots__ = ('budget', 'long_running', 'started', 'beat', 'running', 'last_success', 'last_attempt', 'last_duration',
+                 'failures', 'last_error', 'cycle_failed')
+
+    def __init__(self, budget, long_running, now):
+        self.budget = budget
+        self.long_running = long_running
+        self.started = now
+        self.beat = now
+        self.running = False
+        self.last_success = None
+        self.last_attempt = None
+        self.last_duration = None
+        self.failures = 0
+        self.last_error = None
+        self.cycle_failed = None
+
+    def age(self, now):
+        """Seconds since the last success (or since the collector started, before its first one)"""
+        return now - (self.last_success or self.started)
+
+    def stalled(self, now, timeout):
+        """A cycle running for longer than timeout, or a stream silent for longer than its budget"""
+        if self.long_running:
+            return now - self.beat > self.budget
+        return self.running and now - self.last_attempt > timeout
+
+    def as_dict(self, now):
+        return {
+            'last_success_age': round(now - self.last_success, 1) if self.last_success else None,
+            'consecutive_failures': self.failures,
+            'last_duration': round(self.last_duration, 3) if self.last_duration is not None else None,
+            'last_error': self.last_error,
+            'budget': self.budget,
+            'stale': self.age(now) > self.budget
+        }
+
+
+class HealthTracker:
+    def __init__(self):
+        self.collectors = {}
+        # name -> [total restarts, restarts without a success in between, time of the last restart]
+        self.restarts = {}
+
+    def register(self, name, interval=None, delay=0):
+        """
+        Start tracking a collector (again)
+
+        Args:
+            interval: Seconds between cycles, or None for long-running collectors
+            delay: Seconds until the collector's first cycle
+        """
+        budget = max(STALE_FACTOR * interval, MIN_BUDGET) if interval else STREAM_BUDGET
+        self.collectors[name] = CollectorHealth(budget, not interval, time.time() + delay)
+
+    def unregister(self, name):
+        self.collectors.pop(name, None)
+
+    def begin(self, name):
+        """Mark the start of a cycle; parsers in this task can then call fail_current()"""
+        health = self.collectors.get(name)
+        if health is not None:
+            health.cycle_failed = None
+            health.last_attempt = health.beat = time.time()
+            health.running = True
+        CURRENT_COLLECTOR.set(name)
+
+    def end(self, name, error=None):
+        """Finish the cycle begun for name; it failed if it raised or a parser flagged it"""
+        health = self.collectors.get(name)
+        if health is None:
+            return
+        now = time.time()
+        health.running = False
+        health.last_duration = now - health.last_attempt if health.last_attempt else None
+        error = error or health.cycle_failed
+        if error:
+            self.failure(name, error)
+        else:
+            self.success(name, now)
+
+    def success(self, name, now=None):
+        health = self.collectors.get(name)
+        if health is not None:
+            health.last_success = health.beat = now or time.time()
+            health.failures = 0
+
+    def failure(self, name, error):
+        health = self.collectors.get(name)
+        if health is not None:
+            health.beat = time.time()
+            health.failures += 1
+            health.last_error = str(error)[:200]
+
+    def fail_current(self, error):
+        """Flag the cycle running in this task as failed (for errors that are logged and swallowed)"""
+        health = self.collectors.get(CURRENT_COLLECTOR.get())
+        if health is not None and health.cycle_failed is None:
+            health.cycle_failed = error
+
+    def stale(self, now=None, ignore=()):
+        now = now or time.time()
+        return sorted(name for name, health in self.collectors.items() if name not in ignore and health.age(now) > health.budget)
+
+    def stalled(self, timeout, now=None):
+        now = now or time.time()
+        return [name for name, health in self.collectors.items() if health.stalled(now, timeout)]
+
+    def record_restart(self, name, now=None):
+        """
+        Count a supervisor restart of a collector
+
+        Returns:
+            int: Restarts in a row without a successful cycle in between, for the backoff
+        """
+        now = now or time.time()
+        total, streak, last = self.restarts.get(name, (0, 0, 0))
+        health = self.collectors.get(name)
+        if health is not None and health.last_success and health.last_success > last:
+            streak = 0
+        self.restarts[name] = [total + 1, streak + 1, now]
+        return streak + 1
+
+    def report(self, now=None):
+        now = now or time.time()
+        report = {name: health.as_dict(now) for name, health in self.collectors.items()}
+        for name, (total, _, last) in self.restarts.items():
+            if name in report:
+                report[name]['restarts'] = total
+                report[name]['last_restart_age'] = round(now - last, 1)
+        return report
@@ -0,0 +1,150 @@
+"""
+Fixed-size sample history for numeric sensors, used to derive trends
+(fill rates, time-until-full, progress ETAs) that Home Assistant can't
+easily compute itself.
+
+Each family of series (e.g. all disk 'used' values) lives in one SeriesTable
+whose rings share flat array('d') buffers, so memory is bounded by
+max_series * size regardless of how many entities a server has, and rates
+for the whole family are derived in a single pass.
+"""
+from array import array
+from operator import mul
+from collections import OrderedDict
+
+
+class SeriesTable:
+    def __init__(self, size=96, max_series=256, min_interval=900):
+        """
+        Args:
+            size: Samples kept per series
+            max_series: Series kept before the least recently updated is evicted
+            min_interval: Minimum seconds between stored samples of one series
+        """
+        self.size = size
+        self.max_series = max_series
+        self.min_interval = min_interval
+        self.rows = OrderedDict()
+        self.times = array('d')
+        self.values = array('d')
+        self.counts = array('l')
+        self.heads = array('l')
+        self.free_rows = []
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _row(self, key):
+        row = self.rows.get(key)
+        if row is not None:
+            self.rows.move_to_end(key)
+            return row
+
+        if self.free_rows:
+            row = self.free_rows.pop()
+        elif len(self.rows) >= self.max_series:
+            # Recycle the slot of the series that went longest without a sample
+            _, row = self.rows.popitem(last=False)
+        else:
+            row = len(self.counts)
+            zeros = array('d', bytes(8 * self.size))
+            self.times.extend(zeros)
+            self.values.extend(zeros)
+            self.counts.append(0)
+            self.heads.append(0)
+
+        self.counts[row] = 0
+        self.heads[row] = 0
+        self.rows[key] = row
+        return row
+
+    def record(self, key, timestamp, value):
+        """Append a sample unless the previous one is newer than min_interval"""
+        row = self._row(key)
+        count = self.counts[row]
+        if count:
+            last = row * self.size + (self.heads[row] - 1) % self.size
+            if timestamp - self.times[last] < self.min_interval:
+                return False
+
+        slot = row * self.size + self.heads[row]
+        self.times[slot] = timestamp
+        self.values[slot] = value
+        self.heads[row] = (self.heads[row] + 1) % self.size
+        self.counts[row] = min(count + 1, self.size)
+        return True
+
+    def reset(self, key):
+        """Drop the samples of one series, e.g. when a new parity check starts"""
+        row = self.rows.get(key)
+        if row is not None:
+            self.counts[row] = 0
+            self.heads[row] = 0
+
+    def discard(self, key):
+        row = self.rows.pop(key, None)
+        if row is not None:
+            self.free_rows.append(row)
+
+    def last(self, key):
+        row = self.rows.get(key)
+        if row is None or not self.counts[row]:
+            return None
+        return self.values[row * self.size + (self.heads[row] - 1) % self.size]
+
+    def rates(self, min_span=0, min_samples=3):
+        """
+        Least-squares slope (value units per second) of every series in one pass
+
+        Series with fewer than min_samples samples or spanning less than
+        min_span seconds are left out. The sums don't depend on sample order,
+        so each series is summed straight from its slice of the flat buffers
+        (a ring fills its slots from the start until it wraps) with the C-level
+        sum()/map() instead of walking the ring sample by sample.
+
+        Returns:
+            dict: key -> slope
+        """
+        size = self.size
+        times = self.times
+        values = self.values
+        result = {}
+
+        for key, row in self.rows.items():
+            n = self.counts[row]
+            if n < min_samples:
+                continue
+
+            base = row * size
+            row_times = times[base:base + n]
+            row_values = values[base:base + n]
+            t0 = min(row_times)
+            if max(row_times) - t0 < min_span:
+                continue
+
+            # Shift times to the oldest sample so the squares stay precise
+            shifted = array('d', map(t0.__rsub__, row_times))
+            st = sum(shifted)
+            sv = sum(row_values)
+            stt = sum(map(mul, shifted, shifted))
+            stv = sum(map(mul, shifted, row_values))
+            denom = n * stt - st * st
+            if denom <= 0:
+                continue
+            result[key] = (n * stv - st * sv) / denom
+
+        return result
+
+
+class HistoryStore:
+    """Named SeriesTables for one server"""
+
+    def __init__(self):
+        self.tables = {}
+
+    def table(self, name, **kwargs):
+        """Get or create the table for a family; kwargs only apply on creation"""
+        table = self.tables.get(name)
+        if table is None:
+            table = self.tables[name] = SeriesTable(**kwargs)
+        return table
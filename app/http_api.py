@@ -0,0 +1,157 @@
+"""
+Minimal local HTTP/JSON API for inspecting the bridge without the MQTT broker
+Plain asyncio streams so no web framework is needed in the container
+
+Endpoints:
+    GET /api/servers                  Known servers and entity counts
+    GET /api/states?server=&prefix=&type=
+                                      Latest value, attributes and age per entity
+    GET /api/startup                  Import cost per module and time to first publish
+    GET /health                       Liveness: the event loop answers
+    GET /ready?server=                Readiness per server and collector; 503 if any is stale or MQTT is down
+"""
+import json
+import time
+import asyncio
+from urllib.parse import urlsplit, parse_qs
+from utils import get_logger, normalize_str
+from collectors import STARTUP
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+
+def _json_default(value):
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    return str(value)
+
+
+class LocalApi:
+    def __init__(self, servers, host='0.0.0.0', port=8080):
+        """
+        Args:
+            servers: Mapping of server name -> UnRAIDServer, read on every request
+            host: Address to bind
+            port: TCP port to bind
+        """
+        self.servers = servers
+        self.host = host
+        self.port = port
+        self.routes = {}
+        self.logger = get_logger('api')
+        self.server = None
+        self.started = time.time()
+
+        self.route('/api/servers', self.get_servers)
+        self.route('/api/states', self.get_states)
+        self.route('/api/startup', self.get_startup)
+        self.route('/health', self.get_health)
+        self.route('/ready', self.get_ready)
+
+    def route(self, path, handler):
+        """Register handler(query) -> (status, json body) for a GET path"""
+        self.routes[path] = handler
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.logger.info(f'Local API listening on {self.host}:{self.port}')
+
+    async def stop(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+
+    def select_servers(self, query):
+        """Servers matching the ?server= filter (by name or normalized id)"""
+        wanted = query.get('server')
+        if not wanted:
+            return dict(self.servers)
+        wanted = normalize_str(wanted)
+        return {name: server for name, server in self.servers.items() if normalize_str(name) == wanted}
+
+    async def get_servers(self, query):
+        body = {
+            name: {
+                'mqtt_connected': server.mqtt_connected,
+                'entities': len(server.state_store),
+                'replay_pending': len(server.replay_buffer),
+                'capabilities': server.capabilities,
+                'breakers': server.breakers.report(),
+                'routing': server.router.report() if server.router is not None else None
+            }
+            for name, server in self.select_servers(query).items()
+        }
+        return 200, body
+
+    async def get_states(self, query):
+        prefix = normalize_str(query.get('prefix', ''))
+        sensor_type = query.get('type')
+        body = {
+            name: server.state_store.query(prefix, sensor_type)
+            for name, server in self.select_servers(query).items()
+        }
+        return 200, body
+
+    async def get_startup(self, query):
+        return 200, STARTUP.report()
+
+    async def get_health(self, query):
+        return 200, {'status': 'ok', 'uptime': round(time.time() - self.started, 1)}
+
+    async def get_ready(self, query):
+        now = time.time()
+        servers = {}
+        for name, server in self.select_servers(query).items():
+            stale = server.health.stale(now, server.health_ignore)
+            servers[name] = {
+                'ready': server.mqtt_connected and not stale,
+                'mqtt_connected': server.mqtt_connected,
+                'stale': stale,
+                'collectors': server.health.report(now)
+            }
+        ready = all(server['ready'] for server in servers.values())
+        return 200 if ready else 503, {'ready': ready, 'servers': servers}
+
+    async def handle(self, reader, writer):
+        status, body = 500, {'error': 'internal error'}
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=10)
+            # Drain headers; requests carry no body we care about
+            while True:
+                line = await asyncio.wait_for(reader.readline(), timeout=10)
+                if line in (b'\r\n', b'\n', b''):
+                    break
+
+            parts = request_line.decode('latin-1').split()
+            if len(parts) < 2:
+                status, body = 400, {'error': 'malformed request'}
+            elif parts[0] != 'GET':
+                status, body = 405, {'error': 'only GET is supported'}
+            else:
+                url = urlsplit(parts[1])
+                query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                handler = self.routes.get(url.path.rstrip('/') or '/')
+                if handler is None:
+                    status, body = 404, {'error': f'unknown path {url.path}', 'paths': sorted(self.routes)}
+                else:
+                    status, body = await handler(query)
+        except asyncio.TimeoutError:
+            writer.close()
+            return
+        except Exception:
+            self.logger.exception('Local API request failed')
+
+        payload = json.dumps(body, default=_json_default).encode()
+        head = (
+            f'HTTP/1.1 {status} {REASONS.get(status, "")}\r\n'
+            'Content-Type: application/json\r\n'
+            f'Content-Length: {len(payload)}\r\n'
+            'Connection: close\r\n\r\n'
+        )
+        try:
+            writer.write(head.encode() + payload)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
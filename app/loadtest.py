@@ -0,0 +1,286 @@
+"""
+Fleet load test: many UnRAIDServer instances in one bridge process
+
+    python loadtest.py [--steps 1x20,5x20,10x20,10x100,25x100] [--duration 60] [--warmup 20]
+                       [--output loadtest.json] [--baseline previous.json]
+
+Each step is SERVERSxCONTAINERS: that many mock Unraid servers (mock_unraid.py),
+each with that many containers, all bridged by this process to one broker
+stand-in (mock_broker.py). The mocks and the broker run in a child process so
+they don't count towards the bridge's CPU and memory.
+
+Per step the report has the bridge's CPU (% of one core), RSS, event-loop lag
+and the end-to-end latency from a container state change on a mock to the
+matching state publish arriving at the broker. Latency includes the polling
+interval (--scan-interval), as it would in production. Results are written as
+JSON; --baseline prints the change against an earlier results file.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+import multiprocessing
+import psutil
+import main as bridge
+from main import UnRAIDServer
+from utils import normalize_str
+
+LAG_INTERVAL = 0.1
+
+# Compared against --baseline; higher is worse for all but msg_per_s
+COMPARED = ('msg_per_s', 'cpu_pct', 'rss_mb', 'lag_p99_ms', 'latency_p95_s')
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def parse_steps(text):
+    steps = []
+    for step in text.split(','):
+        servers, _, containers = step.partition('x')
+        steps.append((int(servers), int(containers or 20)))
+    return steps
+
+
+async def _serve_endpoints(conn, servers, containers, options):
+    # Imported here: only the child process needs them
+    from mock_unraid import MockUnraid
+    from mock_broker import MockBroker
+
+    loop = asyncio.get_event_loop()
+    latencies = []
+    mocks = {}
+
+    def on_publish(topic, payload, now):
+        # <base>/<server id>/docker_<name>_state/state
+        parts = topic.split('/')
+        if len(parts) != 4 or parts[3] != 'state' or not parts[2].startswith('docker_'):
+            return
+        mock = mocks.get(parts[1])
+        if mock is None:
+            return
+        changed = mock.changes.pop(('docker', parts[2][len('docker_'):-len('_state')]), None)
+        if changed is not None:
+            latencies.append(now - changed)
+
+    broker = MockBroker(on_publish=on_publish)
+    broker.logger.setLevel(logging.WARNING)
+    await broker.start()
+    for i in range(servers):
+        mock = MockUnraid(f'load{i:03d}', containers=containers, disks=options['disks'], vms=options['vms'],
+                          shares=options['shares'], latency=options['latency'], churn=options['churn'], seed=i)
+        mock.logger.setLevel(logging.WARNING)
+        await mock.start()
+        mocks[normalize_str(mock.name)] = mock
+
+    conn.send({'broker': broker.port, 'servers': [mock.config() for mock in mocks.values()]})
+    while True:
+        command = await loop.run_in_executor(None, conn.recv)
+        if command == 'reset':
+            latencies.clear()
+            conn.send({'messages': broker.messages, 'requests': sum(mock.requests for mock in mocks.values())})
+        elif command == 'stats':
+            conn.send({
+                'messages': broker.messages,
+                'requests': sum(mock.requests for mock in mocks.values()),
+                'latencies': list(latencies)
+            })
+        else:
+            break
+
+    for mock in mocks.values():
+        await mock.stop()
+    await broker.stop()
+    conn.send('stopped')
+
+
+def _endpoints_main(conn, servers, containers, options):
+    asyncio.run(_serve_endpoints(conn, servers, containers, options))
+
+
+class LagMonitor:
+    """Samples how late the event loop wakes a sleeping task"""
+
+    def __init__(self):
+        self.samples = []
+        self.task = None
+
+    async def run(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            expected = loop.time() + LAG_INTERVAL
+            await asyncio.sleep(LAG_INTERVAL)
+            self.samples.append(max(0.0, loop.time() - expected))
+
+    def start(self):
+        self.task = asyncio.ensure_future(self.run())
+
+    def stop(self):
+        self.task.cancel()
+
+
+async def run_step(servers, containers, args):
+    options = {'disks': args.disks, 'vms': args.vms, 'shares': args.shares, 'latency': args.latency, 'churn': args.churn}
+    context = multiprocessing.get_context('spawn')
+    conn, child_conn = context.Pipe()
+    child = context.Process(target=_endpoints_main, args=(child_conn, servers, containers, options), daemon=True)
+    child.start()
+
+    loop = asyncio.get_event_loop()
+    endpoints = await loop.run_in_executor(None, conn.recv)
+    mqtt_config = {'host': '127.0.0.1', 'port': endpoints['broker'], 'username': 'loadtest', 'password': 'loadtest'}
+
+    bridges = []
+    for unraid_config in endpoints['servers']:
+        unraid_config.update(scan_interval=args.scan_interval, startup_stagger=args.stagger)
+        server = UnRAIDServer(mqtt_config, unraid_config, loop)
+        if not args.verbose:
+            server.logger.setLevel(logging.WARNING)
+        bridges.append(server)
+
+    await asyncio.sleep(args.warmup)
+
+    process = psutil.Process()
+    lag = LagMonitor()
+    conn.send('reset')
+    before = await loop.run_in_executor(None, conn.recv)
+    cpu_before = sum(process.cpu_times()[:2])
+    started = time.time()
+    lag.start()
+
+    await asyncio.sleep(args.duration)
+
+    lag.stop()
+    elapsed = time.time() - started
+    cpu = (sum(process.cpu_times()[:2]) - cpu_before) / elapsed * 100
+    rss = process.memory_info().rss / 1_000_000
+    conn.send('stats')
+    after = await loop.run_in_executor(None, conn.recv)
+
+    entities = sum(len(server.state_store) for server in bridges)
+    for server in bridges:
+        await server.stop()
+    conn.send('stop')
+    await loop.run_in_executor(None, conn.recv)
+    child.join(timeout=10)
+
+    latencies = after['latencies']
+    lags = lag.samples
+
+    def ms(value):
+        return round(value * 1000, 1) if value is not None else None
+
+    def s(value):
+        return round(value, 3) if value is not None else None
+
+    return {
+        'servers': servers,
+        'containers': containers,
+        'entities': entities,
+        'messages': after['messages'] - before['messages'],
+        'msg_per_s': round((after['messages'] - before['messages']) / elapsed, 1),
+        'requests_per_s': round((after['requests'] - before['requests']) / elapsed, 1),
+        'cpu_pct': round(cpu, 1),
+        'rss_mb': round(rss, 1),
+        'lag_p50_ms': ms(percentile(lags, 50)),
+        'lag_p99_ms': ms(percentile(lags, 99)),
+        'lag_max_ms': ms(max(lags) if lags else None),
+        'latency_samples': len(latencies),
+        'latency_p50_s': s(percentile(latencies, 50)),
+        'latency_p95_s': s(percentile(latencies, 95)),
+        'latency_max_s': s(max(latencies) if latencies else None)
+    }
+
+
+def describe_release():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True, text=True, timeout=5,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or 'unknown'
+    except (OSError, subprocess.SubprocessError):
+        return 'unknown'
+
+
+def print_step(step):
+    print(f"{step['servers']:>4} srv x {step['containers']:>4} ctr | {step['entities']:>6} entities | "
+          f"{step['msg_per_s']:>8} msg/s | cpu {step['cpu_pct']:>5}% | rss {step['rss_mb']:>7} MB | "
+          f"lag p99 {step['lag_p99_ms']} ms | latency p95 {step['latency_p95_s']} s ({step['latency_samples']})")
+
+
+def print_comparison(steps, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = {(step['servers'], step['containers']): step for step in baseline.get('steps', [])}
+    print(f"Against {baseline.get('release', baseline_path)}:")
+    for step in steps:
+        old = previous.get((step['servers'], step['containers']))
+        if old is None:
+            continue
+        changes = []
+        for key in COMPARED:
+            if step.get(key) is None or not old.get(key):
+                continue
+            changes.append(f'{key} {(step[key] - old[key]) / old[key] * 100:+.0f}%')
+        print(f"{step['servers']:>4} srv x {step['containers']:>4} ctr | {', '.join(changes)}")
+
+
+async def run(args):
+    # Keep the load test's entity registries out of the real data directory
+    bridge.DATA_PATH = tempfile.mkdtemp(prefix='loadtest_')
+    steps = []
+    for servers, containers in parse_steps(args.steps):
+        print(f'Step {servers} server(s) x {containers} container(s): {args.warmup}s warm-up, {args.duration}s measured')
+        step = await run_step(servers, containers, args)
+        print_step(step)
+        steps.append(step)
+
+    results = {
+        'release': args.release or describe_release(),
+        'started': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'settings': {key: getattr(args, key) for key in (
+            'duration', 'warmup', 'scan_interval', 'stagger', 'churn', 'latency', 'disks', 'vms', 'shares'
+        )},
+        'steps': steps
+    }
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'Results written to {args.output}')
+
+    if args.baseline:
+        print_comparison(steps, args.baseline)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Ramp up simulated Unraid servers in one bridge process and measure it')
+    parser.add_argument('--steps', default='1x20,5x20,10x20,10x100,25x100', help='comma separated SERVERSxCONTAINERS')
+    parser.add_argument('--duration', type=float, default=60, help='measured seconds per step')
+    parser.add_argument('--warmup', type=float, default=20, help='seconds per step before measuring')
+    parser.add_argument('--scan-interval', type=int, default=10, help='scan_interval of the simulated servers')
+    parser.add_argument('--stagger', type=float, default=5, help='startup_stagger of the simulated servers')
+    parser.add_argument('--churn', type=float, default=5, help='seconds between container state flips per server')
+    parser.add_argument('--latency', type=float, default=0.0, help='mock response latency in seconds')
+    parser.add_argument('--disks', type=int, default=6)
+    parser.add_argument('--vms', type=int, default=2)
+    parser.add_argument('--shares', type=int, default=8)
+    parser.add_argument('--output', default='loadtest.json', help='results file')
+    parser.add_argument('--baseline', help='earlier results file to compare against')
+    parser.add_argument('--release', help='label stored in the results file (default: git describe)')
+    parser.add_argument('--verbose', action='store_true', help='keep the per-server INFO logs')
+    args = parser.parse_args(argv)
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
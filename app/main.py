@@ -1,21 +1,66 @@
 import os
-import re
-import sys
 import time
 import json
 import httpx
 import signal
 import asyncio
 import logging
-import websockets
+import contextlib
 import unraid_parsers as parsers
-from lxml import etree
-from utils import load_file, normalize_str, handle_sigterm
+from utils import load_file, normalize_str, handle_sigterm, get_logger
+from parsers.nchan import parse_frame, frame_text
+from replay_buffer import ReplayBuffer
+from state_store import StateStore
+from entity_registry import EntityRegistry
+from records import Sensor, forget_sensors
+from attributes import AttributeFilter
+from health import HealthTracker
+from breakers import Breakers, BreakerTransport, RETRY_BUDGET
+from state_bundles import StateBundles, FLAT, GROUP_NAMES, group_of, value_template
+import discovery
+from discovery import ComponentRegistry
+from history import HistoryStore
+from http_api import LocalApi
+from config_reload import ConfigWatcher
+from capture import CaptureWriter, RecordingTransport, CAPTURE_CONTEXT
+from collectors import collectors_for, STARTUP
+from startup import plan_startup
+from routing import Router
 from gmqtt import Client as MQTTClient, Message
 
+DATA_PATH = '../data'
+
+# Seconds to collect retained discovery configs from the broker after connecting
+ADOPT_WINDOW = 30
+
+# Seconds bundled state publishes are collected before their group documents go out
+BUNDLE_WINDOW = 1.0
+
+# Seconds entity configs are collected before the device discovery payload is republished
+DISCOVERY_WINDOW = 2.0
+
+MIGRATE_PAYLOAD = json.dumps({'migrate_discovery': True})
+
+# Seconds between stall checks, and the restart backoff of a collector that keeps stalling
+SUPERVISOR_INTERVAL = 15
+RESTART_BACKOFF = 10
+RESTART_BACKOFF_MAX = 600
+
+COLLECTOR_RESTARTS = Sensor('Collector Restarts', {
+    'icon': 'mdi:restart-alert',
+    'state_class': 'total_increasing',
+    'entity_category': 'diagnostic'
+})
+
+OPEN_CIRCUITS = Sensor('Open Circuits', {
+    'icon': 'mdi:electric-switch',
+    'state_class': 'measurement',
+    'entity_category': 'diagnostic'
+})
+
 
 class UnRAIDServer(object):
-    def __init__(self, mqtt_config, unraid_config, loop: asyncio.AbstractEventLoop):
+    def __init__(self, mqtt_config, unraid_config, loop: asyncio.AbstractEventLoop, start=True):
         unraid_host = unraid_config.get('host')
         unraid_port = unraid_config.get('port')
         unraid_ssl = unraid_config.get('ssl', False)
@@ -29,123 +74,467 @@ class UnRAIDServer(object):
         self.unraid_api_key = unraid_config.get('api_key')
         self.unraid_url = f'{unraid_protocol}{unraid_address}'
         self.unraid_ws = f'wss://{unraid_address}' if unraid_ssl else f'ws://{unraid_address}'
-        self.scan_interval = unraid_config.get('scan_interval', 30)
-        # Support environment variable overrides for faster real-time updates
-        self.ups_scan_interval = int(os.getenv('UPS_SCAN_INTERVAL', unraid_config.get('ups_scan_interval', 30)))
-        self.system_scan_interval = int(os.getenv('SYSTEM_SCAN_INTERVAL', unraid_config.get('system_scan_interval', 30)))
+        self.unraid_config = unraid_config
+        self.apply_settings(unraid_config)
         self.share_parser_lastrun = 0
         self.share_parser_interval = 3600
+        self.docker_deltas = {}
+        self.disk_counters = {}
+        self.disk_spin = {}
+        self.array_state = None
+        self.parity_history_fetched = 0
+        self.parity_history_due = False
+        self.parity_check_running = None
+        self.smart_last_scan = 0
         self.csrf_token = ''
         self.unraid_cookie = ''
         self.cookie_last_refresh = 0
         self.cookie_refresh_interval = 1800  # Refresh session every 30 minutes
+        self.session_lock = asyncio.Lock()
 
         self.mqtt_connected = False
         self.mqtt_config = mqtt_config  # Store config for reconnection
         self.base_topic = mqtt_config.get('base_topic', 'unraid')
         self.reconnect_task = None
-        self.vm_task = None
-        self.unraid_task = None
-        self.sensor_task = None
         self.watchdog_task = None
-        self.ups_task = None
-        self.graphql_disk_task = None
-        self.graphql_docker_task = None
-        self.graphql_vms_task = None
-        self.graphql_array_task = None
-        self.graphql_shares_task = None
-        self.graphql_ups_task = None
-        self.graphql_system_task = None
-        self.http_memory_task = None
-        self.http_ups_task = None
+        self.supervisor_task = None
+        self.collectors = ()
+        self.collector_tasks = {}
+        self.startup_task = None
+        self.capabilities = {}
+        self.connect_task = None
+        self.stopping = False
         self.watchdog_failures = 0
         self.last_ups_payload = None
         self.last_ups_time = 0
+        self.replay_buffer = ReplayBuffer(mqtt_config.get('replay_max_topics', 5000))
+        self.replay_task = None
+        self.mqtt_history = {}
+        self.state_store = StateStore()
+        self.health = HealthTracker()
+        # Per-endpoint circuit breakers and the retry budget shared by all collectors of this server
+        self.breakers = Breakers(unraid_config.get('retry_budget', RETRY_BUDGET), on_change=self.on_breaker_change)
+        self.history = HistoryStore()
+        self.attribute_filter = AttributeFilter(unraid_config.get('attributes'), self.attribute_interval)
+        self.state_bundles = StateBundles()
+        self.bundle_flush = None
+        # 'entity': one config per entity, 'device': one config per device (Home Assistant 2024.11+)
+        self.device_discovery = unraid_config.get('discovery', 'entity') == 'device'
+        self.components = ComponentRegistry()
+        self.discovery_flush = None
 
         unraid_id = normalize_str(self.unraid_name)
+        self.entities = EntityRegistry(os.path.join(DATA_PATH, f'entities_{unraid_id}.json'), unraid_config.get('entity_grace'))
+        # In 'auto' mode each capability runs from the cheapest source the server offers (routing.py)
+        self.router = Router(os.path.join(DATA_PATH, f'routes_{unraid_id}.json')) if self.collector_mode() == 'auto' else None
         will_message = Message(f'{self.base_topic}/{unraid_id}/connectivity/state', 'OFF', retain=True)
         self.mqtt_client = MQTTClient(self.unraid_name, will_message=will_message)
-        asyncio.ensure_future(self.mqtt_connect(mqtt_config))
-
-        self.logger = logging.getLogger(self.unraid_name)
-        self.logger.setLevel(logging.INFO)
-        unraid_logger = logging.StreamHandler(sys.stdout)
-        unraid_logger_formatter = logging.Formatter(f'%(asctime)s [%(levelname)s] [{self.unraid_name}] %(message)s')
-        unraid_logger.setFormatter(unraid_logger_formatter)
-        self.logger.addHandler(unraid_logger)
+        self.logger = get_logger(self.unraid_name)
 
         self.loop = loop
 
+        # Optional traffic capture for replay.py; playback is set by replay.py only
+        capture_path = unraid_config.get('capture')
+        self.capture = CaptureWriter(capture_path, self.unraid_name, self.collector_mode()) if capture_path else None
+        self.playback = None
+        if self.capture:
+            self.logger.info(f'Capturing Unraid traffic to {capture_path}')
+
+        if not start:
+            return
+        self.connect_task = asyncio.ensure_future(self.mqtt_connect(mqtt_config))
+
+        # Data collection runs for the lifetime of the server, independent of the broker;
+        # the MQTT connection only pauses and resumes the publishing sink
+        self.start_collectors()
+
+    def apply_settings(self, unraid_config):
+        """Intervals and options that can change while the server runs (see config_reload)"""
+        self.scan_interval = unraid_config.get('scan_interval', 30)
+        # Support environment variable overrides for faster real-time updates
+        self.ups_scan_interval = int(os.getenv('UPS_SCAN_INTERVAL', unraid_config.get('ups_scan_interval', 30)))
+        self.system_scan_interval = int(os.getenv('SYSTEM_SCAN_INTERVAL', unraid_config.get('system_scan_interval', 30)))
+        self.docker_status_interval = unraid_config.get('docker_status_interval', 600)
+        self.docker_refresh_interval = unraid_config.get('docker_refresh_interval', 3600)
+        self.docker_load_interval = unraid_config.get('docker_load_interval', 0)
+        self.standby_disk_interval = unraid_config.get('standby_disk_interval', 1800)
+        self.parity_history_ttl = unraid_config.get('parity_history_ttl', 21600)
+        self.smart_scan_interval = unraid_config.get('smart_scan_interval', 3600)
+        self.attribute_interval = unraid_config.get('attribute_interval', 900)
+        # 'flat': one state topic per entity, 'bundled': one JSON document per device group
+        self.bundle_states = unraid_config.get('state_topics', 'flat') == 'bundled'
+        self.startup_stagger = float(unraid_config.get('startup_stagger', 5))
+        # Collectors that may stay stale without failing readiness (e.g. VMs on a server without libvirt)
+        self.health_ignore = frozenset(unraid_config.get('health_ignore') or ())
+        # Seconds a collector cycle may run before the supervisor cancels and restarts it
+        self.collector_stall_timeout = unraid_config.get('collector_stall_timeout', 300)
+
+    def reload(self, unraid_config):
+        """
+        Apply a changed config entry without touching the MQTT connection or Unraid session
+
+        Polling collectors whose interval changed are restarted so the new interval applies
+        now rather than after their current sleep; collectors switched on or off by an
+        option are started or stopped.
+        """
+        before = {collector.name: getattr(self, collector.interval) for collector in self.collectors}
+        self.unraid_config = unraid_config
+        self.apply_settings(unraid_config)
+        self.entities.set_grace(unraid_config.get('entity_grace'))
+        self.attribute_filter.configure(unraid_config.get('attributes'), self.attribute_interval)
+
+        wanted = tuple(collector for collector in collectors_for(self.collector_mode(), self) if self.is_routed(collector))
+        wanted_names = {collector.name for collector in wanted}
+        for collector in self.collectors:
+            if collector.name not in wanted_names:
+                self.logger.info(f'Config reload: stopping {collector.name}')
+                self.stop_collector(collector)
+        for collector in wanted:
+            restart = (collector.name in before and not (collector.method or collector.streaming)
+                       and before[collector.name] != getattr(self, collector.interval))
+            if restart:
+                self.logger.info(f'Config reload: {collector.name} interval now {getattr(self, collector.interval)}s')
+                self.stop_collector(collector)
+            if restart or collector.name not in before:
+                self.start_collector(collector, force=True)
+        self.collectors = wanted
+
+    async def stop(self):
+        """Stop collecting and leave the broker cleanly (server removed from the config)"""
+        self.stopping = True
+        self.stop_collectors()
+        if self.bundle_flush:
+            self.bundle_flush.cancel()
+            self.flush_state_bundles()
+        if self.discovery_flush:
+            self.discovery_flush.cancel()
+            self.flush_discovery()
+        for task in (self.connect_task, self.reconnect_task, self.watchdog_task, self.replay_task, self.supervisor_task):
+            if task and not task.done():
+                task.cancel()
+        if self.mqtt_connected:
+            self.mqtt_status(connected=False)
+            try:
+                await self.mqtt_client.disconnect()
+            except Exception:
+                self.logger.exception('Error disconnecting from mqtt server')
+        self.mqtt_connected = False
+        self.entities.save()
+        if self.capture:
+            self.capture.close()
+        self.logger.info('Server stopped')
+
+    def http_client(self, **kwargs):
+        """httpx.AsyncClient for requests to Unraid; recorded when capturing, served from the capture on replay"""
+        if self.playback:
+            kwargs['transport'] = self.playback
+            return httpx.AsyncClient(**kwargs)
+        if self.capture:
+            inner = RecordingTransport(self.capture, verify=kwargs.get('verify', True))
+        else:
+            inner = httpx.AsyncHTTPTransport(verify=kwargs.get('verify', True))
+        kwargs['transport'] = BreakerTransport(self.breakers, inner)
+        return httpx.AsyncClient(**kwargs)
+
+    @contextlib.asynccontextmanager
+    async def nchan_subscribe(self, channels, **kwargs):
+        """WebSocket subscription to nchan channels, through the '/sub' circuit breaker"""
+        import websockets
+
+        self.breakers.before('/sub')
+        try:
+            websocket = await websockets.connect(f'{self.unraid_ws}/sub/{",".join(channels)}', subprotocols=['ws+meta.nchan'],
+                                                 extra_headers={'Cookie': self.unraid_cookie}, **kwargs)
+        except asyncio.CancelledError:
+            self.breakers.release('/sub')
+            raise
+        except Exception as e:
+            self.breakers.failure('/sub', e)
+            raise
+        self.breakers.success('/sub')
+        try:
+            yield websocket
+        finally:
+            await websocket.close()
+
+    def on_breaker_change(self, endpoint, breaker):
+        if breaker.state == 'open':
+            self.logger.warning(f'Circuit for {endpoint} opened after {breaker.failures} failures '
+                                f'(retry in {breaker.open_until - time.time():.0f}s): {breaker.last_error}')
+        else:
+            self.logger.info(f'Circuit for {endpoint} closed')
+        states = {endpoint: breaker.state for endpoint, breaker in self.breakers.breakers.items()}
+        self.mqtt_publish(OPEN_CIRCUITS, 'sensor', len(self.breakers.open()), json_attributes=states, create_config=True,
+                          retain=True)
+
     def on_connect(self, client, flags, rc, properties):
         self.logger.info('Successfully connected to mqtt server')
         self.mqtt_connected = True
         self.watchdog_failures = 0
+        # The broker may have come back without its retained attributes
+        self.attribute_filter.reset()
+        self.state_bundles.mark_all()
+        self.schedule_bundle_flush()
+        self.components.reset()
+        self.schedule_discovery_flush()
         mover_payload = {'name': 'Mover'}
         self.mqtt_publish(mover_payload, 'button', state_value='OFF', create_config=True)
         self.mqtt_status(connected=True, create_config=True)
 
-        # Start background tasks
-        self.start_background_tasks()
+        # Resume the publishing sink: replay whatever the collectors produced while paused
+        if len(self.replay_buffer):
+            self.ensure_task('replay_task', self.flush_replay_buffer)
+
+        self.ensure_task('watchdog_task', self.mqtt_watchdog_loop)
+
+        # Pick up retained entities of earlier runs so vanished ones can still be removed
+        self.mqtt_client.subscribe('homeassistant/+/+/config', qos=0)
+        asyncio.get_event_loop().call_later(ADOPT_WINDOW, self.stop_adopting)
 
     def on_message(self, client, topic, payload, qos, properties):
-        pass
+        if topic.startswith('homeassistant/') and topic.endswith('/config'):
+            self.adopt_entity(topic, payload)
+
+    def adopt_entity(self, topic, payload):
+        unraid_id = normalize_str(self.unraid_name)
+        _, sensor_type, unique_id, _ = topic.split('/', 3)
+        if not payload or payload == MIGRATE_PAYLOAD.encode():
+            return
+        if sensor_type == 'device':
+            # A device config of an earlier run with discovery: device; its entities are published
+            # per entity again now, so hand them over and clear it once adopting ends
+            if topic == self.device_topic() and not self.device_discovery:
+                self.logger.info('Migrating device discovery back to per-entity discovery')
+                self.mqtt_send(topic, MIGRATE_PAYLOAD, retain=True)
+                self.components.migrated.append(topic)
+            return
+        if not unique_id.startswith(f'{unraid_id}_'):
+            return
+        try:
+            config = json.loads(payload)
+        except ValueError:
+            return
+        # Servers named 'tower' and 'tower_2' share a unique_id prefix, the device doesn't
+        if not isinstance(config, dict) or config.get('device', {}).get('identifiers') != f'unraid_{unraid_id}':
+            return
+
+        sensor_id = unique_id[len(unraid_id) + 1:]
+        if self.device_discovery and sensor_id in self.components.components:
+            self.migrate_entity_config(sensor_id, topic)
+            return
+        # A bundled state_topic is the group document of all sibling entities, never the entity's own
+        group_topics = self.group_topics()
+        topics = [topic] + [config[key] for key in ('state_topic', 'json_attributes_topic')
+                            if config.get(key) and config[key] not in group_topics]
+        if self.entities.adopt(sensor_id, sensor_type, topics):
+            self.logger.debug(f'Adopted retained entity {unique_id}')
+
+    def stop_adopting(self):
+        if self.mqtt_connected:
+            self.mqtt_client.unsubscribe('homeassistant/+/+/config')
+        if not self.device_discovery:
+            for topic in self.components.migrated:
+                self.mqtt_send(topic, '', retain=True)
+            self.components.migrated.clear()
+        self.entities.save()
+
+    def sweep_entities(self, family, keys):
+        """
+        Report the complete current listing of a family (container, VM, share or disk names)
+        and remove entities whose object has been gone for longer than the family's grace period
+        """
+        removed = self.entities.present(family, keys)
+        group_topics = self.group_topics()
+        for sensor_id, record in removed:
+            for topic in record.topics:
+                # Registries saved by earlier runs may still list a shared group document
+                if topic not in group_topics:
+                    self.mqtt_send(topic, '', retain=True)
+            self.state_store.remove(sensor_id)
+            self.attribute_filter.forget(sensor_id)
+            self.state_bundles.remove(sensor_id)
+            self.components.remove(sensor_id)
+        forget_sensors(family, {record.key for _, record in removed})
+        self.schedule_bundle_flush()
+        self.schedule_discovery_flush()
+        if removed:
+            self.logger.info(f'Removed {len(removed)} vanished {family} entities: {", ".join(sorted(s for s, _ in removed))}')
+        self.entities.save()
 
     def on_disconnect(self, client, packet, exc=None):
-        self.logger.error('Disconnected from mqtt server')
         self.mqtt_connected = False
+        if self.stopping:
+            return
+        self.logger.error('Disconnected from mqtt server')
 
-        # Cancel all background tasks before attempting reconnection
-        self.cancel_background_tasks()
-
-        # Wait a moment for tasks to finish cancelling before reconnecting
+        # Pause the publishing sink only; collectors, sessions and WebSockets stay up and
+        # their publishes go to the replay buffer until reconnect
         asyncio.get_event_loop().call_later(2, lambda: self.schedule_mqtt_reconnect('disconnect callback'))
 
-    def start_background_tasks(self):
-        """Start all background tasks for data collection"""
-        self.logger.info('Starting background tasks...')
-
-        # Choose between WebSocket or GraphQL mode
-        # Set USE_GRAPHQL=true in environment to use GraphQL instead of WebSocket
-        use_graphql = os.getenv('USE_GRAPHQL', 'true').lower() == 'true'
-
-        if use_graphql:
-            self.logger.info('Using GraphQL mode for data collection')
-            # GraphQL-based data collection
-            self.graphql_disk_task = asyncio.ensure_future(self.graphql_disk_loop())
-            self.graphql_docker_task = asyncio.ensure_future(self.graphql_docker_loop())
-            self.graphql_vms_task = asyncio.ensure_future(self.graphql_vms_loop())
-            self.graphql_array_task = asyncio.ensure_future(self.graphql_array_loop())
-            self.graphql_shares_task = asyncio.ensure_future(self.graphql_shares_loop())
-            self.graphql_ups_task = asyncio.ensure_future(self.graphql_ups_loop())
-            self.graphql_system_task = asyncio.ensure_future(self.graphql_system_loop())
-        else:
-            self.logger.info('Using WebSocket mode for data collection')
-            # Legacy WebSocket-based data collection
-            self.unraid_task = asyncio.ensure_future(self.ws_connect())
-            self.vm_task = asyncio.ensure_future(self.vm_sensor_loop())
-            self.graphql_disk_task = asyncio.ensure_future(self.graphql_disk_loop())
-            self.http_ups_task = asyncio.ensure_future(self.http_ups_loop())
-
-        # System sensors always run (uses local psutil)
-        self.sensor_task = asyncio.ensure_future(self.system_sensor_loop())
-        self.watchdog_task = asyncio.ensure_future(self.mqtt_watchdog_loop())
-
-    def cancel_background_tasks(self):
-        """Cancel all background tasks"""
-        self.logger.info('Cancelling background tasks...')
-        tasks = [
-            self.vm_task, self.unraid_task, self.sensor_task, self.watchdog_task,
-            self.graphql_disk_task, self.graphql_docker_task, self.graphql_vms_task,
-            self.graphql_array_task, self.graphql_shares_task, self.graphql_ups_task,
-            self.graphql_system_task, self.http_ups_task
-        ]
-        for task in tasks:
+    def ensure_task(self, attr, coro_factory):
+        """Start the task stored in attr unless it is still running"""
+        task = getattr(self, attr)
+        if task is None or task.done():
+            setattr(self, attr, asyncio.ensure_future(coro_factory()))
+
+    def collector_mode(self):
+        # Choose between WebSocket, GraphQL or per-capability (auto) mode
+        # The server's 'sources' option wins over USE_GRAPHQL (true, false or auto) in the environment
+        sources = self.unraid_config.get('sources')
+        if sources in ('graphql', 'websocket', 'auto'):
+            return sources
+        use_graphql = os.getenv('USE_GRAPHQL', 'true').lower()
+        if use_graphql == 'auto':
+            return 'auto'
+        return 'graphql' if use_graphql == 'true' else 'websocket'
+
+    def is_routed(self, collector):
+        """False for collectors of sources the router didn't pick (always True outside auto mode)"""
+        return self.router is None or self.router.wants(collector)
+
+    def start_collectors(self):
+        """Plan and start all data collection tasks that are not already running"""
+        mode = self.collector_mode()
+        self.logger.info(f'Starting collectors ({mode} mode)...')
+        self.collectors = collectors_for(mode, self)
+        if self.startup_task is None or self.startup_task.done():
+            self.startup_task = asyncio.ensure_future(self.startup())
+        self.ensure_task('supervisor_task', self.collector_supervisor_loop)
+
+    async def startup(self):
+        """One warm-up login and capability probe, then staggered collector starts"""
+        try:
+            plan = await plan_startup(self, self.collectors)
+        except Exception:
+            self.logger.exception('Startup planning failed; starting all collectors')
+            plan = [(collector, 0) for collector in self.collectors if self.is_routed(collector)]
+        if self.router is not None:
+            self.collectors = tuple(collector for collector in self.collectors if self.is_routed(collector))
+
+        for collector, delay in plan:
+            self.start_collector(collector, delay)
+
+    def start_collector(self, collector, delay=0, force=False):
+        """Start a collector unless it is running; force also starts it after a cancel that hasn't finished yet"""
+        task = self.collector_tasks.get(collector.name)
+        if force or task is None or task.done():
+            # First start imports the collector's parser modules; disabled or unrouted ones never load them
+            collector.resolve()
+            long_running = collector.method or collector.streaming
+            self.health.register(collector.name, None if long_running else getattr(self, collector.interval), delay)
+            self.collector_tasks[collector.name] = asyncio.ensure_future(self.run_collector(collector, delay))
+
+    def stop_collector(self, collector):
+        self.health.unregister(collector.name)
+        task = self.collector_tasks.pop(collector.name, None)
+        if task and not task.done():
+            task.cancel()
+
+    def stop_collectors(self):
+        """Cancel all data collection tasks (shutdown only; broker outages don't stop collection)"""
+        self.logger.info('Stopping collectors...')
+        if self.startup_task and not self.startup_task.done():
+            self.startup_task.cancel()
+        for task in self.collector_tasks.values():
             if task and not task.done():
                 try:
                     task.cancel()
                 except Exception as e:
                     self.logger.warning(f'Error cancelling task: {e}')
 
+    async def collector_supervisor_loop(self):
+        """Cancel and restart collectors that stopped making progress, backing off while they keep stalling"""
+        try:
+            while True:
+                await asyncio.sleep(SUPERVISOR_INTERVAL)
+                collectors = {collector.name: collector for collector in self.collectors}
+                for name in self.health.stalled(self.collector_stall_timeout):
+                    collector = collectors.get(name)
+                    if collector is None:
+                        continue
+                    streak = self.health.record_restart(name)
+                    delay = min(RESTART_BACKOFF * 2 ** (streak - 1), RESTART_BACKOFF_MAX)
+                    self.logger.warning(f'{name} collector stalled, restarting it in {delay}s '
+                                        f'({self.health.restarts[name][0]} restarts so far)')
+                    self.stop_collector(collector)
+                    self.start_collector(collector, delay, force=True)
+                    self.publish_restarts()
+                if self.router is not None:
+                    # Failing sources are re-routed, and routes are re-evaluated when a demotion or the probe runs out
+                    failing = self.router.failing(self.health)
+                    if failing or self.router.due():
+                        await self.reroute(failing)
+        except asyncio.CancelledError:
+            self.logger.info('Collector supervisor cancelled')
+            raise
+
+    async def reroute(self, failing):
+        """Probe again (for failing capabilities, or because the routes are due) and switch the collectors that changed"""
+        channels = self.router.channels()
+        if not await self.router.reroute(self, failing):
+            return
+        wanted = tuple(collector for collector in collectors_for('auto', self) if self.is_routed(collector))
+        wanted_names = {collector.name for collector in wanted}
+        running = {collector.name for collector in self.collectors}
+        for collector in self.collectors:
+            if collector.name not in wanted_names:
+                self.logger.info(f'Routing: stopping {collector.name}')
+                self.stop_collector(collector)
+        for collector in wanted:
+            # The WebSocket stream subscribes once, so a changed channel set needs a new connection
+            if collector.name == 'websocket' and collector.name in running and self.router.channels() != channels:
+                self.stop_collector(collector)
+                running.discard(collector.name)
+            if collector.name not in running:
+                self.logger.info(f'Routing: starting {collector.name}')
+                self.start_collector(collector, force=True)
+        self.collectors = wanted
+
+    def publish_restarts(self):
+        restarts = {name: total for name, (total, _, _) in self.health.restarts.items()}
+        self.mqtt_publish(COLLECTOR_RESTARTS, 'sensor', sum(restarts.values()), json_attributes=restarts, create_config=True,
+                          retain=True)
+
+    async def run_collector(self, collector, delay=0):
+        """Run a registered collector: either its own loop method, or its functions every interval"""
+        if delay:
+            await asyncio.sleep(delay)
+
+        # Long-running collectors report their own successes and failures
+        self.health.begin(collector.name)
+        if collector.method:
+            await getattr(self, collector.method)()
+            return
+        if collector.streaming:
+            await collector.functions[0](self)
+            return
+
+        cycle = 0
+        try:
+            while True:
+                cycle += 1
+                CAPTURE_CONTEXT.set((collector.name, cycle))
+                self.health.begin(collector.name)
+                error = None
+                try:
+                    # Refresh session cookie if needed (every 30 minutes)
+                    current_time = time.time()
+                    if collector.needs_session and current_time - self.cookie_last_refresh > self.cookie_refresh_interval:
+                        await self.refresh_unraid_session()
+
+                    for collect in collector.functions:
+                        await collect(self, create_config=True)
+
+                except Exception as e:
+                    self.logger.exception(f"Failed to fetch {collector.description}")
+                    error = e
+                self.health.end(collector.name, error)
+
+                await asyncio.sleep(getattr(self, collector.interval))
+        except asyncio.CancelledError:
+            self.logger.info(f'{collector.name} collector cancelled')
+            raise
+
     async def mqtt_reconnect(self):
         """Reconnect to MQTT broker with exponential backoff"""
         retry_delay = 5
@@ -161,7 +550,7 @@ class UnRAIDServer(object):
 
                 self.logger.info('Reconnecting to mqtt server...')
                 await self.mqtt_client.connect(mqtt_host, mqtt_port)
-                # on_connect callback will set mqtt_connected = True and restart tasks
+                # on_connect callback will set mqtt_connected = True and replay buffered state
                 break
 
             except ConnectionRefusedError:
@@ -179,76 +568,202 @@ class UnRAIDServer(object):
         state_value = 'ON' if connected else 'OFF'
         self.mqtt_publish(status_payload, 'binary_sensor', state_value, create_config=create_config, retain=True)
 
-    def mqtt_publish(self, payload, sensor_type, state_value, json_attributes=None, create_config=False, retain=False):
-        # Validate MQTT connection before publishing
+    def mqtt_send(self, topic, payload, retain=False):
+        """
+        Publish a raw message, or hold it in the replay buffer while disconnected
+
+        Returns:
+            bool: True if the message went to the broker
+        """
         if not self.mqtt_connected:
-            self.logger.warning(f'Skipping publish for {payload.get("name")} - MQTT not connected')
-            return
+            self.replay_buffer.put(topic, payload, retain)
+            return False
 
+        try:
+            self.mqtt_client.publish(topic, payload, retain=retain)
+        except Exception:
+            self.logger.exception(f'MQTT publish failed for {topic}')
+            self.replay_buffer.put(topic, payload, retain)
+            self.mqtt_connected = False
+            self.schedule_mqtt_reconnect('publish failure')
+            return False
+
+        # A live value supersedes anything still waiting to be replayed
+        self.replay_buffer.discard(topic)
+        if self.unraid_name not in STARTUP.first_publish:
+            elapsed = STARTUP.mark_first_publish(self.unraid_name)
+            self.logger.info(f'First publish {elapsed:.2f}s after process start; startup profile: {STARTUP.report()["imports_ms"]}')
+        return True
+
+    async def flush_replay_buffer(self):
+        """Replay messages buffered during a broker outage as a paced burst"""
+        pending = len(self.replay_buffer)
+        started = time.time()
+        sent = await self.replay_buffer.flush(self.mqtt_send)
+        self.logger.info(f'Replayed {sent}/{pending} buffered MQTT messages in {time.time() - started:.2f}s')
+        if self.replay_buffer.dropped:
+            self.logger.warning(f'Replay buffer overflowed; {self.replay_buffer.dropped} oldest topics were dropped')
+            self.replay_buffer.dropped = 0
+
+    def mqtt_publish(self, payload, sensor_type, state_value, json_attributes=None, create_config=False, retain=False, owner=None):
+        """
+        Args:
+            payload: Discovery payload, a records.Sensor descriptor or a dict with at least 'name'
+            owner: (family, key) of the container, VM, share or disk the entity belongs to,
+                so it can be removed once that object is gone (see sweep_entities)
+        """
         unraid_id = normalize_str(self.unraid_name)
-        sensor_id = normalize_str(payload["name"])
+        if isinstance(payload, Sensor):
+            sensor_name, sensor_id = payload.name, payload.sensor_id
+        else:
+            sensor_name, sensor_id = payload['name'], normalize_str(payload['name'])
         unraid_sensor_id = f'{unraid_id}_{sensor_id}'
+        state_topic = f'{self.base_topic}/{unraid_id}/{sensor_id}/state'
+        bundled = self.bundle_states and sensor_type != 'button' and sensor_id not in FLAT
+        if bundled:
+            state_topic = f'{self.base_topic}/{unraid_id}/state/{group_of(sensor_id)}'
+        topics = []
+        if json_attributes:
+            json_attributes = self.attribute_filter.project(owner[0] if owner else None, json_attributes)
 
-        if create_config:
-            device = {
-                'name': self.unraid_name,
-                'identifiers': f'unraid_{unraid_id}'.lower(),
-                'model': 'Unraid',
-                'manufacturer': 'Lime Technology'
-            }
-            if self.unraid_version:
-                device['sw_version'] = self.unraid_version
+        if state_value is not None:
+            self.state_store.update(sensor_id, sensor_name, sensor_type, state_value, json_attributes)
 
-            create_config = payload
+        if create_config:
+            # Descriptors are shared between cycles; never write into them
+            create_config = dict(payload.config if isinstance(payload, Sensor) else payload)
             if state_value is not None:
-                create_config['state_topic'] = f'{self.base_topic}/{unraid_id}/{sensor_id}/state'
+                create_config['state_topic'] = state_topic
+                if bundled:
+                    create_config['value_template'] = value_template(sensor_id)
             if json_attributes:
                 create_config['json_attributes_topic'] = f'{self.base_topic}/{unraid_id}/{sensor_id}/attributes'
             if sensor_type == 'button':
                 create_config['command_topic'] = f'{self.base_topic}/{unraid_id}/{sensor_id}/commands'
 
-            if not sensor_id.startswith(('connectivity', 'array', 'share_', 'disk_', 'ups_')):
+            # Delta-published entities (docker_, last_parity) are retained and may stay quiet for a long time
+            if not sensor_id.startswith(('connectivity', 'array', 'share_', 'disk_', 'ups_', 'docker_', 'last_parity',
+                                         'collector_restarts', 'open_circuits')):
                 expire_in_seconds = self.scan_interval * 4
                 create_config['expire_after'] = expire_in_seconds if expire_in_seconds > 120 else 120
 
             config_fields = {
-                'name': f'{payload["name"]}',
+                'name': sensor_name,
                 'attribution': 'Data provided by UNRAID',
-                'unique_id': unraid_sensor_id,
-                'device': device
+                'unique_id': unraid_sensor_id
             }
             create_config.update(config_fields)
 
-            try:
-                self.mqtt_client.publish(f'homeassistant/{sensor_type}/{unraid_sensor_id}/config', json.dumps(create_config), retain=True)
-            except Exception:
-                self.logger.exception('MQTT publish failed during discovery config')
-                self.mqtt_connected = False
-                self.schedule_mqtt_reconnect('publish failure')
-                return
-
-        if state_value is not None:
-            try:
-                self.mqtt_client.publish(f'{self.base_topic}/{unraid_id}/{sensor_id}/state', state_value, retain=retain)
-            except Exception:
-                self.logger.exception('MQTT publish failed for state')
-                self.mqtt_connected = False
-                self.schedule_mqtt_reconnect('publish failure')
-                return
+            if self.device_discovery:
+                # The device payload is assembled from all components and only sent when it changed
+                if self.components.add(sensor_id, sensor_type, create_config):
+                    record = self.entities.entities.get(sensor_id)
+                    for topic in [t for t in record.topics if t.startswith('homeassistant/')] if record else ():
+                        self.migrate_entity_config(sensor_id, topic)
+                self.schedule_discovery_flush()
+            else:
+                create_config['device'] = self.device_info()
+                self.mqtt_send(f'homeassistant/{sensor_type}/{unraid_sensor_id}/config', json.dumps(create_config), retain=True)
+                topics.append(f'homeassistant/{sensor_type}/{unraid_sensor_id}/config')
+
+        if state_value is not None and bundled:
+            # The group document is shared, so it is never in the entity's own topics
+            self.state_bundles.put(sensor_id, state_value)
+            self.schedule_bundle_flush()
+        elif state_value is not None:
+            self.mqtt_send(state_topic, state_value, retain=retain)
+            topics.append(state_topic)
 
         if json_attributes:
-            try:
-                self.mqtt_client.publish(f'{self.base_topic}/{unraid_id}/{sensor_id}/attributes', json.dumps(json_attributes), retain=retain)
-            except Exception:
-                self.logger.exception('MQTT publish failed for attributes')
-                self.mqtt_connected = False
-                self.schedule_mqtt_reconnect('publish failure')
-                return
+            # Unchanged attributes only go out every attribute_interval
+            attributes_json = json.dumps(json_attributes)
+            if self.attribute_filter.due(sensor_id, attributes_json):
+                self.mqtt_send(f'{self.base_topic}/{unraid_id}/{sensor_id}/attributes', attributes_json, retain=retain)
+            topics.append(f'{self.base_topic}/{unraid_id}/{sensor_id}/attributes')
 
-        if sensor_type == 'button':
+        self.entities.record(sensor_id, sensor_type, topics, owner)
+
+        if sensor_type == 'button' and self.mqtt_connected:
             self.mqtt_client.subscribe(f'{self.base_topic}/{unraid_id}/{sensor_id}/commands', qos=0, retain=retain)
 
+    def schedule_bundle_flush(self):
+        if self.state_bundles.dirty and self.bundle_flush is None:
+            self.bundle_flush = asyncio.get_event_loop().call_later(BUNDLE_WINDOW, self.flush_state_bundles)
+
+    def group_topics(self):
+        """The bundled state documents of this server (see state_bundles)"""
+        unraid_id = normalize_str(self.unraid_name)
+        return {f'{self.base_topic}/{unraid_id}/state/{group}' for group in GROUP_NAMES}
+
+    def flush_state_bundles(self):
+        """Publish the group documents of bundled state topics that were reported since the last flush"""
+        self.bundle_flush = None
+        unraid_id = normalize_str(self.unraid_name)
+        for group, values in self.state_bundles.pop_dirty():
+            self.mqtt_send(f'{self.base_topic}/{unraid_id}/state/{group}', json.dumps(values), retain=True)
+
+    def device_info(self):
+        device = {
+            'name': self.unraid_name,
+            'identifiers': f'unraid_{normalize_str(self.unraid_name)}'.lower(),
+            'model': 'Unraid',
+            'manufacturer': 'Lime Technology'
+        }
+        if self.unraid_version:
+            device['sw_version'] = self.unraid_version
+        return device
+
+    def device_topic(self):
+        return f'homeassistant/device/unraid_{normalize_str(self.unraid_name)}/config'
+
+    def migrate_entity_config(self, sensor_id, topic):
+        """Hand a retained per-entity config over to the device config; it is cleared once that is published"""
+        self.mqtt_send(topic, MIGRATE_PAYLOAD, retain=True)
+        self.components.migrated.append(topic)
+        self.entities.drop_topic(sensor_id, topic)
+
+    def schedule_discovery_flush(self):
+        if self.device_discovery and self.components and self.discovery_flush is None:
+            self.discovery_flush = asyncio.get_event_loop().call_later(DISCOVERY_WINDOW, self.flush_discovery)
+
+    def flush_discovery(self):
+        """Publish the device discovery payload if a component or the device changed"""
+        self.discovery_flush = None
+        if not self.device_discovery:
+            return
+        payload = self.components.render(self.device_info())
+        if payload is None:
+            return
+        if len(payload) > discovery.MAX_PAYLOAD_BYTES:
+            self.fall_back_to_entity_discovery(len(payload))
+            return
+        self.mqtt_send(self.device_topic(), payload, retain=True)
+        for topic in self.components.migrated:
+            self.mqtt_send(topic, '', retain=True)
+        self.components.mark_published(payload)
+
+    def fall_back_to_entity_discovery(self, size):
+        """Publish every component as its own config, for device payloads too large for the broker"""
+        self.logger.warning(f'Device discovery payload of {len(self.components)} entities is {size} bytes '
+                            f'(limit {discovery.MAX_PAYLOAD_BYTES}); falling back to per-entity discovery')
+        self.device_discovery = False
+        unraid_id = normalize_str(self.unraid_name)
+        # The device config may be retained from an earlier run, so always hand it over
+        self.mqtt_send(self.device_topic(), MIGRATE_PAYLOAD, retain=True)
+        device = self.device_info()
+        for sensor_id, component in self.components.components.items():
+            config = dict(component)
+            sensor_type = config.pop('platform')
+            config['device'] = device
+            topic = f'homeassistant/{sensor_type}/{unraid_id}_{sensor_id}/config'
+            self.mqtt_send(topic, json.dumps(config), retain=True)
+            self.entities.add_topic(sensor_id, topic)
+        self.mqtt_send(self.device_topic(), '', retain=True)
+        self.components = ComponentRegistry()
+
     def schedule_mqtt_reconnect(self, reason):
+        if self.stopping:
+            return
         if self.reconnect_task is None or self.reconnect_task.done():
             self.logger.info(f'Scheduling MQTT reconnection ({reason})...')
             self.reconnect_task = asyncio.ensure_future(self.mqtt_reconnect())
@@ -278,274 +793,38 @@ class UnRAIDServer(object):
             self.logger.info('Watchdog loop cancelled')
             raise
 
-    async def http_memory_loop(self):
-        """Poll Unraid HTTP endpoints for memory usage data (RAM, Flash, Log, Docker)"""
-        try:
-            # Wait for session to establish
-            await asyncio.sleep(10)
-
-            while self.mqtt_connected:
-                try:
-                    # Refresh session cookie if needed
-                    current_time = time.time()
-                    if current_time - self.cookie_last_refresh > self.cookie_refresh_interval:
-                        await self.refresh_unraid_session()
-
-                    # Import parser
-                    from parsers.http_memory import fetch_memory_http
-
-                    # Fetch and publish memory data
-                    await fetch_memory_http(self, create_config=True)
-
-                except Exception:
-                    self.logger.exception("Failed to fetch HTTP memory data")
-
-                await asyncio.sleep(self.scan_interval)
-        except asyncio.CancelledError:
-            self.logger.info('HTTP memory loop cancelled')
-            raise
-
-    async def http_ups_loop(self):
-        """Poll Unraid HTTP endpoints for UPS data"""
-        try:
-            # Wait for session to establish
-            await asyncio.sleep(12)
-
-            while self.mqtt_connected:
-                try:
-                    # Refresh session cookie if needed
-                    current_time = time.time()
-                    if current_time - self.cookie_last_refresh > self.cookie_refresh_interval:
-                        await self.refresh_unraid_session()
-
-                    # Import parser
-                    from parsers.http_ups import fetch_ups_http
-
-                    # Fetch and publish UPS data
-                    await fetch_ups_http(self, create_config=True)
-
-                except Exception:
-                    self.logger.exception("Failed to fetch HTTP UPS data")
-
-                await asyncio.sleep(self.scan_interval)
-        except asyncio.CancelledError:
-            self.logger.info('HTTP UPS loop cancelled')
-            raise
-
-    async def system_sensor_loop(self):
-        try:
-            while self.mqtt_connected:
-                try:
-                    await parsers.system_uptime(self, create_config=True)
-                    await parsers.cpu_temperature_avg(self, create_config=True)
-                    await parsers.cpu_utilization(self, create_config=True)
-                except Exception:
-                    self.logger.exception("Failed to publish system sensors.")
-                await asyncio.sleep(self.scan_interval)
-        except asyncio.CancelledError:
-            self.logger.info('System sensor loop cancelled')
-            raise
-
     async def refresh_unraid_session(self):
-        """Refresh the Unraid session cookie"""
-        try:
-            payload = {
-                'username': self.unraid_username,
-                'password': self.unraid_password
-            }
-            async with httpx.AsyncClient() as http:
-                r = await http.post(f'{self.unraid_url}/login', data=payload, timeout=120)
-                self.unraid_cookie = r.headers.get('set-cookie')
-                self.cookie_last_refresh = time.time()
-                self.logger.info('Unraid session cookie refreshed')
+        """Refresh the Unraid session cookie (concurrent callers share one login)"""
+        requested = time.time()
+        async with self.session_lock:
+            if self.cookie_last_refresh >= requested:
+                # Another collector logged in while we were waiting
                 return True
-        except Exception:
-            self.logger.exception('Failed to refresh Unraid session')
-            return False
-
-    async def graphql_disk_loop(self):
-        """Fetch disk usage data from GraphQL API (Unraid 7.2+)"""
-        try:
-            # Wait a bit before first run to let session establish
-            await asyncio.sleep(5)
-
-            while self.mqtt_connected:
-                try:
-                    # Refresh session cookie if needed (every 30 minutes)
-                    current_time = time.time()
-                    if current_time - self.cookie_last_refresh > self.cookie_refresh_interval:
-                        await self.refresh_unraid_session()
-
-                    # Import here to avoid circular imports
-                    from parsers.graphql_disks import fetch_disk_data_graphql
-
-                    # Fetch disk data from GraphQL
-                    ini_data = await fetch_disk_data_graphql(self)
-
-                    if ini_data:
-                        # Parse using existing disk parser
-                        await parsers.disks(self, ini_data, create_config=True)
-                    else:
-                        self.logger.debug("GraphQL disk data fetch returned no data")
-
-                except Exception:
-                    self.logger.exception("Failed to fetch GraphQL disk info")
-
-                await asyncio.sleep(self.scan_interval)
-        except asyncio.CancelledError:
-            self.logger.info('GraphQL disk loop cancelled')
-            raise
-
-    async def graphql_docker_loop(self):
-        """Fetch Docker container data from GraphQL API (Unraid 7.2+)"""
-        try:
-            await asyncio.sleep(5)
-
-            while self.mqtt_connected:
-                try:
-                    current_time = time.time()
-                    if current_time - self.cookie_last_refresh > self.cookie_refresh_interval:
-                        await self.refresh_unraid_session()
-
-                    from parsers.graphql_docker import docker_containers
-
-                    await docker_containers(self, create_config=True)
-
-                except Exception:
-                    self.logger.exception("Failed to fetch GraphQL Docker info")
-
-                await asyncio.sleep(self.scan_interval)
-        except asyncio.CancelledError:
-            self.logger.info('GraphQL Docker loop cancelled')
-            raise
-
-    async def graphql_vms_loop(self):
-        """Fetch VM data from GraphQL API (Unraid 7.2+)"""
-        try:
-            await asyncio.sleep(5)
-
-            while self.mqtt_connected:
-                try:
-                    current_time = time.time()
-                    if current_time - self.cookie_last_refresh > self.cookie_refresh_interval:
-                        await self.refresh_unraid_session()
-
-                    from parsers.graphql_vms import vms_graphql
-
-                    await vms_graphql(self, create_config=True)
-
-                except Exception:
-                    self.logger.exception("Failed to fetch GraphQL VM info")
-
-                await asyncio.sleep(self.scan_interval)
-        except asyncio.CancelledError:
-            self.logger.info('GraphQL VMs loop cancelled')
-            raise
-
-    async def graphql_array_loop(self):
-        """Fetch array status and parity data from GraphQL API (Unraid 7.2+)"""
-        try:
-            await asyncio.sleep(5)
-
-            while self.mqtt_connected:
-                try:
-                    current_time = time.time()
-                    if current_time - self.cookie_last_refresh > self.cookie_refresh_interval:
-                        await self.refresh_unraid_session()
-
-                    from parsers.graphql_array import array_status_graphql, parity_history_graphql
-
-                    await array_status_graphql(self, create_config=True)
-                    await parity_history_graphql(self, create_config=True)
-
-                except Exception:
-                    self.logger.exception("Failed to fetch GraphQL array info")
-
-                await asyncio.sleep(self.scan_interval)
-        except asyncio.CancelledError:
-            self.logger.info('GraphQL array loop cancelled')
-            raise
-
-    async def graphql_shares_loop(self):
-        """Fetch shares data from GraphQL API (Unraid 7.2+)"""
-        try:
-            await asyncio.sleep(5)
-
-            while self.mqtt_connected:
-                try:
-                    current_time = time.time()
-                    if current_time - self.cookie_last_refresh > self.cookie_refresh_interval:
-                        await self.refresh_unraid_session()
-
-                    from parsers.graphql_shares import shares_graphql
-
-                    await shares_graphql(self, create_config=True)
-
-                except Exception:
-                    self.logger.exception("Failed to fetch GraphQL shares info")
-
-                # Shares update less frequently (once per hour like the original)
-                await asyncio.sleep(self.share_parser_interval)
-        except asyncio.CancelledError:
-            self.logger.info('GraphQL shares loop cancelled')
-            raise
-
-    async def graphql_ups_loop(self):
-        """Fetch UPS data from GraphQL API (Unraid 7.2+)"""
-        try:
-            await asyncio.sleep(5)
-
-            while self.mqtt_connected:
-                try:
-                    current_time = time.time()
-                    if current_time - self.cookie_last_refresh > self.cookie_refresh_interval:
-                        await self.refresh_unraid_session()
-
-                    from parsers.graphql_ups import ups_graphql
-
-                    await ups_graphql(self, create_config=True)
-
-                except Exception:
-                    self.logger.exception("Failed to fetch GraphQL UPS info")
-
-                await asyncio.sleep(self.ups_scan_interval)
-        except asyncio.CancelledError:
-            self.logger.info('GraphQL UPS loop cancelled')
-            raise
-
-    async def graphql_system_loop(self):
-        """Fetch system metrics (RAM, Flash, Temps, Fans) via HTTP (Unraid 7.2+)"""
-        try:
-            await asyncio.sleep(5)
-
-            while self.mqtt_connected:
-                try:
-                    current_time = time.time()
-                    if current_time - self.cookie_last_refresh > self.cookie_refresh_interval:
-                        await self.refresh_unraid_session()
-
-                    from parsers.graphql_system import system_metrics_graphql
-
-                    await system_metrics_graphql(self, create_config=True)
-
-                except Exception:
-                    self.logger.exception("Failed to fetch system metrics")
-
-                await asyncio.sleep(self.system_scan_interval)
-        except asyncio.CancelledError:
-            self.logger.info('GraphQL system loop cancelled')
-            raise
+            try:
+                payload = {
+                    'username': self.unraid_username,
+                    'password': self.unraid_password
+                }
+                async with self.http_client() as http:
+                    r = await http.post(f'{self.unraid_url}/login', data=payload, timeout=120)
+                    self.unraid_cookie = r.headers.get('set-cookie')
+                    self.cookie_last_refresh = time.time()
+                    self.logger.info('Unraid session cookie refreshed')
+                    return True
+            except Exception:
+                self.logger.exception('Failed to refresh Unraid session')
+                return False
 
     async def vm_sensor_loop(self):
         try:
-            while self.mqtt_connected:
+            while True:
                 try:
                     # Refresh session cookie if needed (every 30 minutes)
                     current_time = time.time()
                     if current_time - self.cookie_last_refresh > self.cookie_refresh_interval:
                         await self.refresh_unraid_session()
 
-                    async with httpx.AsyncClient() as http:
+                    async with self.http_client() as http:
                         headers = {'Cookie': self.unraid_cookie}
                         r = await http.get(f'{self.unraid_url}/VMMachines.php', headers=headers, timeout=30)
 
@@ -558,8 +837,10 @@ class UnRAIDServer(object):
                                 r = await http.get(f'{self.unraid_url}/VMMachines.php', headers=headers, timeout=30)
 
                         await parsers.vms(self, r.text, create_config=False)
-                except Exception:
+                    self.health.success('vm_sensors')
+                except Exception as e:
                     self.logger.exception("Failed to fetch VM info")
+                    self.health.failure('vm_sensors', e)
                 await asyncio.sleep(self.scan_interval)
         except asyncio.CancelledError:
             self.logger.info('VM sensor loop cancelled')
@@ -571,8 +852,6 @@ class UnRAIDServer(object):
         mqtt_username = mqtt_config.get('username')
         mqtt_password = mqtt_config.get('password')
 
-        self.mqtt_history = {}
-        self.share_parser_lastrun = 0
         self.mqtt_client.on_connect = self.on_connect
         self.mqtt_client.on_message = self.on_message
         self.mqtt_client.on_disconnect = self.on_disconnect
@@ -590,9 +869,71 @@ class UnRAIDServer(object):
                 self.logger.exception('Exception connecting to mqtt...')
                 await asyncio.sleep(30)
 
+    def ws_channels(self):
+        """nchan channel -> parser for the legacy WebSocket mode (in auto mode only the channels routed to it)"""
+        channels = {
+            'update2': parsers.array_status,
+            'session': parsers.session,
+            'cpuload': parsers.cpuload,
+            'disks': parsers.disks,
+            'parity': parsers.parity,
+            'shares': parsers.shares,
+            'update1': parsers.update1,
+            'temperature': parsers.temperature,
+            'apcups': parsers.apcups
+        }
+        if self.router is None:
+            return channels
+        # The session channel carries the CSRF token and cpuload has no other source, so both stay
+        routed = self.router.channels() | {'session', 'cpuload'}
+        return {channel: parser for channel, parser in channels.items() if channel in routed}
+
+    def handle_ws_frame(self, data, sub_channels, now=None):
+        """
+        Dispatch one nchan frame to its channel parser, throttled to scan_interval per channel
+
+        Args:
+            now: Frame time; replay.py passes the captured time so throttling matches the original run
+        """
+        now = now or time.time()
+        try:
+            sub_channel, msg_id, body = parse_frame(data, tuple(sub_channels))
+        except ValueError as e:
+            self.logger.warning(f'Error parsing websocket message: {e}')
+            self.logger.debug(f'Problematic message: {data[:200]}')
+            return
+
+        if not sub_channel:
+            self.logger.debug(f'Could not identify channel for message id: {msg_id}')
+            return
+
+        msg_parser = sub_channels.get(sub_channel, parsers.default)
+
+        if not body or body in ('[]', b'[]'):
+            return
+
+        if sub_channel == 'shares':
+            time_passed = now - self.share_parser_lastrun
+            if time_passed <= self.share_parser_interval:
+                return
+            self.share_parser_lastrun = now
+
+        msg_data = frame_text(body)
+
+        if sub_channel not in self.mqtt_history:
+            self.mqtt_history[sub_channel] = (now - self.scan_interval)
+            self.loop.create_task(msg_parser(self, msg_data, create_config=True))
+
+        if self.scan_interval <= (now - self.mqtt_history.get(sub_channel, now)):
+            self.mqtt_history[sub_channel] = now
+            self.loop.create_task(msg_parser(self, msg_data, create_config=False))
+
     async def ws_connect(self):
+        # Legacy mode only; keep it out of the GraphQL-mode import path
+        from lxml import etree
+
         try:
-            while self.mqtt_connected:
+            while True:
                 self.logger.info('Connecting to unraid...')
                 last_msg = ''
                 try:
@@ -601,7 +942,7 @@ class UnRAIDServer(object):
                         'password': self.unraid_password
                     }
 
-                    async with httpx.AsyncClient() as http:
+                    async with self.http_client() as http:
                         r = await http.post(f'{self.unraid_url}/login', data=payload, timeout=120)
                         self.unraid_cookie = r.headers.get('set-cookie')
                         r = await http.get(f'{self.unraid_url}/Dashboard', follow_redirects=True, timeout=120)
@@ -609,85 +950,35 @@ class UnRAIDServer(object):
                         version_elem = tree.xpath('.//div[@class="logo"]/text()[preceding-sibling::a]')
                         self.unraid_version = ''.join(c for c in ''.join(version_elem) if c.isdigit() or c == '.')
 
-                    headers = {'Cookie': self.unraid_cookie}
-                    subprotocols = ['ws+meta.nchan']
-
-                    sub_channels = {
-                        'update2': parsers.array_status,
-                        'session': parsers.session,
-                        'cpuload': parsers.cpuload,
-                        'disks': parsers.disks,
-                        'parity': parsers.parity,
-                        'shares': parsers.shares,
-                        'update1': parsers.update1,
-                        'temperature': parsers.temperature,
-                        'apcups': parsers.apcups
-                    }
-
-                    websocket_url = f'{self.unraid_ws}/sub/{",".join(sub_channels)}'
-                    async with websockets.connect(websocket_url, subprotocols=subprotocols, extra_headers=headers) as websocket:
+                    sub_channels = self.ws_channels()
+                    channel_names = tuple(sub_channels)
+                    async with self.nchan_subscribe(channel_names) as websocket:
                         self.logger.info('Successfully connected to unraid')
 
-                        while self.mqtt_connected:
+                        while True:
                             try:
                                 data = await asyncio.wait_for(websocket.recv(), timeout=120)
                                 last_msg = data
-
-                                # Parse message data with error handling
-                                try:
-                                    parts = data.replace('\00', ' ').split('\n\n', 1)
-                                    if len(parts) < 2:
-                                        self.logger.warning(f'Invalid message format: {data[:100]}')
-                                        continue
-                                    msg_data = parts[1].strip()
-
-                                    msg_ids = re.findall(r'([-\[\d\],]+,[-\[\d\],]*)|$', data)[0].split(',')
-                                    sub_channel = next((sub for (sub, msg) in zip(sub_channels, msg_ids) if msg.startswith('[')), None)
-
-                                    if not sub_channel:
-                                        self.logger.debug(f'Could not identify channel for message: {data[:100]}')
-                                        continue
-
-                                    msg_parser = sub_channels.get(sub_channel, parsers.default)
-
-                                    if msg_data in ('', '[]'):
-                                        continue
-
-                                    if sub_channel == 'shares':
-                                        current_time = time.time()
-                                        time_passed = current_time - self.share_parser_lastrun
-                                        if time_passed <= self.share_parser_interval:
-                                            continue
-                                        self.share_parser_lastrun = current_time
-
-                                    if sub_channel not in self.mqtt_history:
-                                        self.mqtt_history[sub_channel] = (time.time() - self.scan_interval)
-                                        self.loop.create_task(msg_parser(self, msg_data, create_config=True))
-
-                                    if self.scan_interval <= (time.time() - self.mqtt_history.get(sub_channel, time.time())):
-                                        self.mqtt_history[sub_channel] = time.time()
-                                        self.loop.create_task(msg_parser(self, msg_data, create_config=False))
-
-                                except (ValueError, IndexError, StopIteration) as e:
-                                    self.logger.warning(f'Error parsing websocket message: {e}')
-                                    self.logger.debug(f'Problematic message: {data[:200]}')
-                                    continue
+                                if self.capture:
+                                    self.capture.nchan(channel_names, data)
+                                self.handle_ws_frame(data, sub_channels)
+                                self.health.success('websocket')
 
                             except asyncio.TimeoutError:
                                 self.logger.warning('WebSocket recv timeout, connection may be stale')
                                 continue
 
-                except (httpx.ConnectTimeout, httpx.ConnectError):
-                    if self.mqtt_connected:
-                        self.logger.error('Unraid WebSocket connection timeout, will retry...')
-                        # Don't set connectivity to False - we have HTTP polling as backup
+                except (httpx.ConnectTimeout, httpx.ConnectError) as e:
+                    self.logger.error('Unraid WebSocket connection timeout, will retry...')
+                    self.health.failure('websocket', e)
+                    # Don't set connectivity to False - we have HTTP polling as backup
                     await asyncio.sleep(30)
-                except Exception:
-                    if self.mqtt_connected:
-                        self.logger.exception('Unraid WebSocket connection failed, will retry...')
-                        self.logger.error('Last message received:')
-                        self.logger.error(last_msg)
-                        # Don't set connectivity to False - we have HTTP polling as backup
+                except Exception as e:
+                    self.logger.exception('Unraid WebSocket connection failed, will retry...')
+                    self.health.failure('websocket', e)
+                    self.logger.error('Last message received:')
+                    self.logger.error(last_msg)
+                    # Don't set connectivity to False - we have HTTP polling as backup
                     await asyncio.sleep(30)
         except asyncio.CancelledError:
             self.logger.info('WebSocket connection loop cancelled')
@@ -700,15 +991,30 @@ if __name__ == '__main__':
     for log in loggers:
         logging.getLogger(log.name).disabled = True
 
-    data_path = '../data'
-    config = load_file(os.path.join(data_path, 'config.yaml'))
+    config_path = os.path.join(DATA_PATH, 'config.yaml')
+    config = load_file(config_path)
 
     if os.name == 'nt':
         asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 
     loop = asyncio.get_event_loop()
 
+    def create_server(mqtt_config, unraid_config):
+        return UnRAIDServer(mqtt_config, unraid_config, loop)
+
+    servers = {}
     for unraid_config in config.get('unraid'):
-        UnRAIDServer(config.get('mqtt'), unraid_config, loop)
+        servers[unraid_config.get('name')] = create_server(config.get('mqtt'), unraid_config)
+
+    # Apply config.yaml edits without restarting the container
+    watcher = ConfigWatcher(config_path, config, servers, create_server)
+    asyncio.ensure_future(watcher.run())
+
+    # Optional local HTTP/JSON API (config 'api:' section or API_PORT env var)
+    api_config = config.get('api') or {}
+    api_port = os.getenv('API_PORT', api_config.get('port'))
+    if api_port:
+        api = LocalApi(servers, api_config.get('host', '0.0.0.0'), int(api_port))
+        loop.run_until_complete(api.start())
 
     loop.run_forever()
@@ -0,0 +1,197 @@
+"""
+Minimal MQTT broker stand-in for integration and scale tests
+
+    python mock_broker.py [--port 1883]
+
+Speaks enough MQTT 3.1.1 and 5 for the bridge: CONNECT, PUBLISH (QoS 0-2),
+SUBSCRIBE, UNSUBSCRIBE, PINGREQ and DISCONNECT. Publishes are acknowledged
+and counted, never routed to subscribers; retained messages are kept so tests
+can inspect what Home Assistant would see.
+"""
+import sys
+import time
+import struct
+import asyncio
+import argparse
+from utils import get_logger
+
+CONNECT, CONNACK, PUBLISH, PUBACK, PUBREC, PUBREL, PUBCOMP = 1, 2, 3, 4, 5, 6, 7
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK, PINGREQ, PINGRESP, DISCONNECT = 8, 9, 10, 11, 12, 13, 14
+
+
+def _encode_length(length):
+    out = bytearray()
+    while True:
+        length, digit = divmod(length, 128)
+        out.append(digit | 0x80 if length else digit)
+        if not length:
+            return bytes(out)
+
+
+def _decode_length(data, offset):
+    """Variable byte integer at data[offset]; returns (value, next offset)"""
+    value = shift = 0
+    while True:
+        digit = data[offset]
+        offset += 1
+        value |= (digit & 0x7f) << shift
+        if not digit & 0x80:
+            return value, offset
+        shift += 7
+
+
+def _packet(packet_type, body, flags=0):
+    return bytes([packet_type << 4 | flags]) + _encode_length(len(body)) + body
+
+
+async def _read_packet(reader):
+    """Returns (packet type, flags, body)"""
+    first = (await reader.readexactly(1))[0]
+    length = shift = 0
+    while True:
+        digit = (await reader.readexactly(1))[0]
+        length |= (digit & 0x7f) << shift
+        if not digit & 0x80:
+            break
+        shift += 7
+    return first >> 4, first & 0x0f, await reader.readexactly(length)
+
+
+def _read_string(body, offset):
+    length = struct.unpack_from('!H', body, offset)[0]
+    return body[offset + 2:offset + 2 + length].decode('utf-8', 'replace'), offset + 2 + length
+
+
+class MockBroker:
+    def __init__(self, host='127.0.0.1', port=0, on_publish=None):
+        """
+        Args:
+            host, port: Address to bind; port 0 picks a free one (see .port after start())
+            on_publish: Optional callable (topic, payload bytes, receive time) called for every publish
+        """
+        self.host = host
+        self.port = port
+        self.on_publish = on_publish
+        self.logger = get_logger('mock-broker')
+        self.server = None
+        self.clients = 0
+        self.messages = 0
+        self.bytes = 0
+        self.retained = {}
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.logger.info(f'Mock MQTT broker listening on {self.host}:{self.port}')
+
+    async def stop(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+
+    def publish(self, flags, body, version):
+        topic, offset = _read_string(body, 0)
+        qos = (flags >> 1) & 0x03
+        packet_id = None
+        if qos:
+            packet_id = struct.unpack_from('!H', body, offset)[0]
+            offset += 2
+        if version == 5:
+            properties, offset = _decode_length(body, offset)
+            offset += properties
+        payload = body[offset:]
+
+        now = time.time()
+        self.messages += 1
+        self.bytes += len(payload)
+        if flags & 0x01:
+            if payload:
+                self.retained[topic] = payload
+            else:
+                self.retained.pop(topic, None)
+        if self.on_publish:
+            self.on_publish(topic, payload, now)
+
+        if qos == 1:
+            return _packet(PUBACK, struct.pack('!H', packet_id))
+        if qos == 2:
+            return _packet(PUBREC, struct.pack('!H', packet_id))
+        return None
+
+    @staticmethod
+    def subscribe_ack(body, version, unsubscribe=False):
+        packet_id = struct.unpack_from('!H', body, 0)[0]
+        offset = 2
+        if version == 5:
+            properties, offset = _decode_length(body, offset)
+            offset += properties
+        filters = 0
+        while offset < len(body):
+            _, offset = _read_string(body, offset)
+            if not unsubscribe:
+                offset += 1
+            filters += 1
+
+        ack = struct.pack('!H', packet_id)
+        if version == 5:
+            ack += b'\x00' + bytes(filters)
+        elif not unsubscribe:
+            ack += bytes(filters)
+        return _packet(UNSUBACK if unsubscribe else SUBACK, ack)
+
+    async def handle(self, reader, writer):
+        version = 4
+        self.clients += 1
+        try:
+            while True:
+                packet_type, flags, body = await _read_packet(reader)
+                reply = None
+                if packet_type == CONNECT:
+                    _, offset = _read_string(body, 0)
+                    version = body[offset]
+                    reply = _packet(CONNACK, b'\x00\x00\x00' if version == 5 else b'\x00\x00')
+                elif packet_type == PUBLISH:
+                    reply = self.publish(flags, body, version)
+                elif packet_type == PUBREL:
+                    reply = _packet(PUBCOMP, body[:2])
+                elif packet_type == SUBSCRIBE:
+                    reply = self.subscribe_ack(body, version)
+                elif packet_type == UNSUBSCRIBE:
+                    reply = self.subscribe_ack(body, version, unsubscribe=True)
+                elif packet_type == PINGREQ:
+                    reply = _packet(PINGRESP, b'')
+                elif packet_type == DISCONNECT:
+                    break
+                if reply:
+                    writer.write(reply)
+                    await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception:
+            self.logger.exception('Mock broker connection failed')
+        finally:
+            self.clients -= 1
+            writer.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve a minimal MQTT broker that acknowledges and counts publishes')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=1883)
+    args = parser.parse_args(argv)
+
+    async def serve():
+        broker = MockBroker(args.host, args.port)
+        await broker.start()
+        while True:
+            await asyncio.sleep(10)
+            broker.logger.info(f'{broker.clients} client(s), {broker.messages} messages, {len(broker.retained)} retained')
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    sys.exit(main())
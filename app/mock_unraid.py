@@ -0,0 +1,529 @@
+"""
+Local mock Unraid server for integration and scale tests
+
+    python mock_unraid.py [--port 8081] [--disks 8] [--containers 40] [--vms 4] [--shares 10]
+                          [--latency 0.05] [--push-interval 1] [--churn 0]
+
+Serves what the collectors talk to, from generated data:
+    POST /login                       Session cookie
+    GET  /Dashboard                   Version banner and the UPS widget text
+    POST /graphql                     array, docker, vms, shares, parityHistory, disks, __type
+    GET  /sub/<channels>              nchan WebSocket with 'ws+meta.nchan' framing
+    GET  /VMMachines.php              VM table
+    GET  /webGui/include/ShareList.php
+    GET  /plugins/dynamix.apcupsd/include/UPSstatus.php
+
+Plain asyncio streams, like http_api.py; no new dependencies. The GraphQL
+endpoint understands just enough of the language for the bridge's own queries
+(selections, aliases, arguments). Authentication is not checked.
+"""
+import sys
+import json
+import time
+import base64
+import random
+import struct
+import asyncio
+import hashlib
+import argparse
+from urllib.parse import urlsplit
+from utils import get_logger
+
+REASONS = {101: 'Switching Protocols', 200: 'OK', 302: 'Found', 400: 'Bad Request', 404: 'Not Found',
+           405: 'Method Not Allowed'}
+
+WS_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+KB_PER_TB = 1_000_000_000
+
+# ParityCheck fields the mock schema offers (see parsers.graphql_array.PARITY_FIELDS and PARITY_STATUS_FIELDS)
+PARITY_FIELDS = ('date', 'duration', 'speed', 'status', 'errors', 'progress', 'running')
+ARRAY_FIELDS = ('state', 'capacity', 'parities', 'parityCheckStatus', 'disks', 'caches')
+
+
+def _tokenize(query):
+    tokens = []
+    i = 0
+    length = len(query)
+    while i < length:
+        c = query[i]
+        if c.isspace() or c == ',':
+            i += 1
+        elif c == '#':
+            while i < length and query[i] != '\n':
+                i += 1
+        elif c == '"':
+            end = query.index('"', i + 1)
+            tokens.append(query[i:end + 1])
+            i = end + 1
+        elif c.isalnum() or c in '_-.':
+            start = i
+            while i < length and (query[i].isalnum() or query[i] in '_-.'):
+                i += 1
+            tokens.append(query[start:i])
+        else:
+            tokens.append(c)
+            i += 1
+    return tokens
+
+
+def _parse_selection(tokens, i):
+    """Parse '{ ... }' at tokens[i]; returns ([(key, field, args, sub)], next index)"""
+    if tokens[i] != '{':
+        raise ValueError(f'expected {{, got {tokens[i]!r}')
+    i += 1
+    fields = []
+    while tokens[i] != '}':
+        key = field = tokens[i]
+        i += 1
+        if tokens[i] == ':':
+            field = tokens[i + 1]
+            i += 2
+        args = {}
+        if tokens[i] == '(':
+            i += 1
+            while tokens[i] != ')':
+                name, value = tokens[i], tokens[i + 2]
+                args[name] = value.strip('"')
+                i += 3
+            i += 1
+        sub = None
+        if tokens[i] == '{':
+            sub, i = _parse_selection(tokens, i)
+        fields.append((key, field, args, sub))
+    return fields, i + 1
+
+
+def parse_query(query):
+    """Selection set of a query document; the operation type and name are skipped"""
+    tokens = _tokenize(query)
+    return _parse_selection(tokens, tokens.index('{'))[0]
+
+
+def project(value, selection):
+    """Keep only the selected fields of a (nested) value, GraphQL style"""
+    if selection is None or value is None:
+        return value
+    if isinstance(value, list):
+        return [project(item, selection) for item in value]
+    return {key: project(value.get(field) if isinstance(value, dict) else None, sub) for key, field, _, sub in selection}
+
+
+def _accept_key(key):
+    return base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+
+
+def ws_frame(payload, opcode=0x1):
+    """Unmasked server-to-client WebSocket frame"""
+    length = len(payload)
+    if length < 126:
+        head = struct.pack('!BB', 0x80 | opcode, length)
+    elif length < 65536:
+        head = struct.pack('!BBH', 0x80 | opcode, 126, length)
+    else:
+        head = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+    return head + payload
+
+
+async def read_ws_frame(reader):
+    """Read one client frame; returns (opcode, unmasked payload)"""
+    b0, b1 = await reader.readexactly(2)
+    length = b1 & 0x7f
+    if length == 126:
+        length = struct.unpack('!H', await reader.readexactly(2))[0]
+    elif length == 127:
+        length = struct.unpack('!Q', await reader.readexactly(8))[0]
+    mask = await reader.readexactly(4) if b1 & 0x80 else None
+    payload = await reader.readexactly(length)
+    if mask:
+        payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+    return b0 & 0x0f, payload
+
+
+def _block_device(index):
+    """0 -> 'sda', 25 -> 'sdz', 26 -> 'sdaa', like the kernel names them"""
+    name = ''
+    index += 1
+    while index:
+        index, rest = divmod(index - 1, 26)
+        name = chr(ord('a') + rest) + name
+    return f'sd{name}'
+
+
+def nchan_frame(channel, channels, body):
+    """ws+meta.nchan text frame for `channel` on a subscription to `channels`"""
+    stamp = int(time.time())
+    if len(channels) == 1:
+        msg_id = f'{stamp}:0'
+    else:
+        msg_id = f'{stamp}:' + ','.join('[0]' if name == channel else '-' for name in channels)
+    return f'id: {msg_id}\ncontent-type: text/plain\n\n{body}'
+
+
+class MockUnraid:
+    def __init__(self, name='mock', disks=6, containers=20, vms=2, shares=8, latency=0.0, host='127.0.0.1', port=0,
+                 push_interval=1.0, churn=0.0, seed=0):
+        """
+        Args:
+            name: Server name, shown in the Dashboard banner
+            disks, containers, vms, shares: How many of each to generate (plus one parity and one cache disk)
+            latency: Seconds added before every HTTP response and WebSocket push
+            host, port: Address to bind; port 0 picks a free one (see .port after start())
+            push_interval: Seconds between pushes on open nchan subscriptions
+            churn: Seconds between container state flips, 0 to keep the containers still
+            seed: Seed of the generated data, so runs are comparable
+        """
+        self.name = name
+        self.latency = latency
+        self.host = host
+        self.port = port
+        self.push_interval = push_interval
+        self.churn = churn
+        self.logger = get_logger(f'mock-{name}')
+        self.random = random.Random(seed)
+        self.server = None
+        self.churn_task = None
+        self.requests = 0
+        self.subscribers = 0
+        # (family, key) -> time of the last data change, for end-to-end latency measurements
+        self.changes = {}
+
+        self.disks = [self._disk('parity', _block_device(1), 12)]
+        self.disks += [self._disk(f'disk{i}', _block_device(i + 1), 12) for i in range(1, disks + 1)]
+        self.disks.append(self._disk('cache', 'nvme0n1', 1))
+        self.containers = [self._container(i) for i in range(1, containers + 1)]
+        self.vms = [self._vm(i) for i in range(1, vms + 1)]
+        self.shares = [self._share(i) for i in range(1, shares + 1)]
+        # Set progress and running (and status 'RUNNING') to simulate a parity check
+        self.parity_check = {'date': None, 'duration': 0, 'speed': None, 'status': 'COMPLETED', 'errors': 0, 'progress': 0,
+                             'running': False}
+
+    def _disk(self, name, device, size_tb):
+        size = size_tb * KB_PER_TB
+        used = int(size * self.random.uniform(0.2, 0.9))
+        return {
+            'id': f'{device}-mock', 'name': name, 'device': device, 'size': size, 'status': 'DISK_OK',
+            'temp': self.random.randint(28, 42), 'fsType': None if name == 'parity' else 'xfs',
+            'fsSize': size, 'fsUsed': used, 'fsFree': size - used,
+            'numReads': self.random.randint(0, 10 ** 6), 'numWrites': self.random.randint(0, 10 ** 6), 'numErrors': 0,
+            'isSpinning': True
+        }
+
+    def _container(self, i):
+        return {
+            'id': hashlib.sha256(f'{self.name}-{i}'.encode()).hexdigest(),
+            'names': [f'/app{i:03d}'],
+            'image': f'mock/app{i:03d}:latest',
+            'state': 'RUNNING' if self.random.random() < 0.8 else 'EXITED',
+            'status': 'Up 3 hours',
+            'autoStart': True,
+            'ports': [{'ip': '0.0.0.0', 'privatePort': 80, 'publicPort': 8000 + i, 'type': 'TCP'}]
+        }
+
+    def _vm(self, i):
+        return {
+            'id': f'vm-{i}', 'uuid': f'00000000-0000-0000-0000-{i:012d}', 'name': f'VM {i}',
+            'state': 'RUNNING' if i % 2 else 'SHUTOFF', 'vcpus': 2 * i, 'memory_mb': 2048 * i
+        }
+
+    def _share(self, i):
+        size = 4 * 10 ** 12
+        used = int(size * self.random.uniform(0.05, 0.8))
+        return {
+            'name': f'share{i:02d}', 'comment': '', 'allocator': 'highwater', 'splitLevel': '', 'include': [],
+            'exclude': [], 'cache': i % 2 == 0, 'floor': '0', 'size': size, 'free': size - used, 'used': used
+        }
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        if self.churn:
+            self.churn_task = asyncio.ensure_future(self.churn_loop())
+        self.logger.info(f'Mock Unraid listening on {self.host}:{self.port} ({len(self.disks)} disks, '
+                         f'{len(self.containers)} containers, {len(self.vms)} VMs, {len(self.shares)} shares)')
+
+    async def stop(self):
+        if self.churn_task:
+            self.churn_task.cancel()
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+
+    def config(self, **overrides):
+        """unraid: entry of config.yaml pointing at this mock"""
+        entry = {'name': self.name, 'host': self.host, 'port': self.port, 'ssl': False,
+                 'username': 'root', 'password': 'mock', 'api_key': 'mock'}
+        entry.update(overrides)
+        return entry
+
+    def set_container_state(self, index, running):
+        container = self.containers[index]
+        container['state'] = 'RUNNING' if running else 'EXITED'
+        self.changes[('docker', container['names'][0].lstrip('/'))] = time.time()
+
+    async def churn_loop(self):
+        while True:
+            await asyncio.sleep(self.churn)
+            if self.containers:
+                index = self.random.randrange(len(self.containers))
+                self.set_container_state(index, self.containers[index]['state'] != 'RUNNING')
+
+    def tick(self):
+        """Advance the counters and gauges the way a busy server would"""
+        for disk in self.disks:
+            disk['numReads'] += self.random.randint(0, 500)
+            disk['numWrites'] += self.random.randint(0, 500)
+            disk['temp'] = max(25, min(55, disk['temp'] + self.random.choice((-1, 0, 0, 1))))
+
+    # GraphQL
+
+    def graphql_root(self, field, args):
+        if field == 'array':
+            used = sum(disk['fsUsed'] for disk in self.disks if disk['name'].startswith('disk'))
+            total = sum(disk['fsSize'] for disk in self.disks if disk['name'].startswith('disk'))
+            return {
+                'state': 'STARTED',
+                'capacity': {
+                    'kilobytes': {'free': str(total - used), 'used': str(used), 'total': str(total)},
+                    'disks': {'free': '0', 'used': str(len(self.disks) - 2), 'total': str(len(self.disks) - 2)}
+                },
+                'parities': [disk for disk in self.disks if disk['name'] == 'parity'],
+                'disks': [disk for disk in self.disks if disk['name'].startswith('disk')],
+                'caches': [disk for disk in self.disks if disk['name'] == 'cache'],
+                'parityCheckStatus': self.parity_check
+            }
+        if field == 'docker':
+            return {'containers': self.containers}
+        if field == 'vms':
+            return {'id': 'vms', 'domains': self.vms}
+        if field == 'shares':
+            return self.shares
+        if field == 'parityHistory':
+            return [{'date': '2026-10-01T02:00:00Z', 'duration': 86400, 'speed': '138.9 MB/s', 'status': 'OK', 'errors': 0}]
+        if field == 'disks':
+            return [{'device': f'/dev/{disk["device"]}', 'name': f'MOCK {disk["name"].upper()}', 'vendor': 'MOCK',
+                     'serialNum': f'MOCK{index:06d}', 'interfaceType': 'SATA', 'smartStatus': 'OK'}
+                    for index, disk in enumerate(self.disks)]
+        if field == '__type':
+            if args.get('name') == 'Query':
+                names = ('array', 'docker', 'vms', 'shares', 'parityHistory', 'disks')
+            elif args.get('name') == 'ParityCheck':
+                names = PARITY_FIELDS
+            elif args.get('name') == 'UnraidArray':
+                names = ARRAY_FIELDS
+            else:
+                return None
+            return {'fields': [{'name': name} for name in names]}
+        raise KeyError(field)
+
+    def graphql(self, body):
+        try:
+            selection = parse_query(json.loads(body)['query'])
+            data = {key: project(self.graphql_root(field, args), sub) for key, field, args, sub in selection}
+        except KeyError as e:
+            return {'errors': [{'message': f'Cannot query field {e} on type "Query"'}]}
+        except (ValueError, IndexError) as e:
+            return {'errors': [{'message': f'Syntax error: {e}'}]}
+        return {'data': data}
+
+    # Pages
+
+    def dashboard(self):
+        return (f'<html><body><div class="logo"><a href="/Main"></a>Version 7.2.0</div>'
+                f'{self.ups_status()}</body></html>')
+
+    def ups_status(self):
+        return ('<table><tr><td>Model: Back-UPS XS 1500M</td></tr><tr><td>Status: Online</td></tr>'
+                '<tr><td>Battery Charge: 100 %</td></tr><tr><td>Time Left: 45 minutes</td></tr>'
+                '<tr><td>Load: 180 W (20 %)</td></tr><tr><td>Nominal Power: 900 W</td></tr></table>')
+
+    def vm_machines(self):
+        rows = ''.join(
+            f'<tr class="sortable"><td><span class="inner"><a href="#">{vm["name"]}</a></span>'
+            f'<span class="state">{"started" if vm["state"] == "RUNNING" else "stopped"}</span></td>'
+            f'<td><a class="vcpu-{vm["id"]}">{vm["vcpus"]}</a></td><td></td><td>{vm["memory_mb"]} MB</td></tr>'
+            for vm in self.vms
+        )
+        return f'<table>{rows}</table>'
+
+    def share_list(self):
+        rows = ''.join(
+            f'<tr><td><a>{share["name"]}</a></td><td></td><td></td><td></td><td></td>'
+            f'<td>{share["used"] / 10 ** 9:.1f} GB</td><td>{share["free"] / 10 ** 9:.1f} GB</td></tr>'
+            f'<tr><td>Disk 1</td><td></td><td></td><td></td><td></td><td></td><td></td></tr>'
+            for share in self.shares
+        )
+        return f'<table>{rows}</table>'
+
+    # nchan channels
+
+    def channel_body(self, channel):
+        """Current message of a channel, or None for a channel with nothing published"""
+        if channel == 'update1':
+            return json.dumps({'name': ['RAM', 'Flash', 'Log', 'Docker'], 'ram': ['31 %', '4 %', '2 %', '27 %']})
+        if channel == 'temperature':
+            return ('<span title="CPU">47 C</span><span title="Mainboard">38 C</span>'
+                    '<span title="Fan 1">1200 rpm</span>')
+        if channel == 'cpuload':
+            return f'[cpu]\nhost="{self.random.randint(2, 40)}"\n'
+        if channel == 'session':
+            return 'MOCKCSRFTOKEN'
+        if channel == 'apcups':
+            values = ('Online', '100 %', '45 minutes', '900 W', '180 W (20 %)')
+            return json.dumps(['Back-UPS XS 1500M'] + [f"<span class='green-text'>{value}</span>" for value in values]
+                              + ['<span>-</span>'])
+        if channel == 'disks':
+            return '\n'.join(
+                f'[{disk["name"]}]\nname="{disk["name"]}"\ndevice="{disk["device"]}"\ntemp="{disk["temp"]}"\n'
+                f'sizesb="{disk["size"]}"\nfsused="{disk["fsUsed"]}"\nfsfree="{disk["fsFree"]}"\n'
+                + ('' if disk['isSpinning'] else 'spundown="1"\n')
+                for disk in self.disks
+            )
+        if channel == 'shares':
+            return '\n'.join(
+                f'[{share["name"]}]\nname="{share["name"]}"\nnameorig="{share["name"]}"\ninclude=""\nfloor="0"\n'
+                f'usecache="{"yes" if share["cache"] else "no"}"\ncachepool="cache"\n'
+                for share in self.shares
+            )
+        if channel == 'update2':
+            rows = ''.join(f'<tr><td><a href="Device?name={disk["name"]}">{disk["name"]}</a></td>'
+                           f'<td>{disk["temp"]} C</td><td><span class=\'load\'>3%</span></td></tr>'
+                           for disk in self.disks)
+            return json.dumps({'disk': [f'<span id="text-parity">Valid</span><table>{rows}</table>']})
+        if channel == 'dockerload':
+            return '\n'.join(
+                f'{container["id"][:12]};{self.random.uniform(0, 5):.2f}%;{self.random.randint(50, 900)}MiB / 31.27GiB'
+                for container in self.containers if container['state'] == 'RUNNING'
+            )
+        return None
+
+    async def subscribe(self, reader, writer, channels):
+        """Replay the current message of each channel, then push new ones every push_interval"""
+        self.subscribers += 1
+        pusher = asyncio.ensure_future(self.push(writer, channels))
+        try:
+            while True:
+                opcode, payload = await read_ws_frame(reader)
+                if opcode == 0x8:
+                    writer.write(ws_frame(payload[:2], 0x8))
+                    break
+                if opcode == 0x9:
+                    writer.write(ws_frame(payload, 0xA))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.subscribers -= 1
+            pusher.cancel()
+
+    async def push(self, writer, channels):
+        try:
+            while True:
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                self.tick()
+                for channel in channels:
+                    body = self.channel_body(channel)
+                    if body is not None:
+                        writer.write(ws_frame(nchan_frame(channel, channels, body).encode()))
+                await writer.drain()
+                await asyncio.sleep(self.push_interval)
+        except ConnectionError:
+            pass
+
+    # HTTP
+
+    def route(self, method, path, body):
+        """Returns (status, extra headers, body text)"""
+        if path == '/login':
+            return 302, {'Set-Cookie': f'unraid_{self.name}=mock; path=/', 'Location': '/Main'}, ''
+        if path == '/graphql':
+            if method != 'POST':
+                return 405, {}, ''
+            self.tick()
+            return 200, {'Content-Type': 'application/json'}, json.dumps(self.graphql(body))
+        if path in ('/Dashboard', '/Main'):
+            return 200, {}, self.dashboard()
+        if path in ('/plugins/dynamix.apcupsd/include/UPSstatus.php', '/Settings/UPSsettings'):
+            return 200, {}, self.ups_status()
+        if path == '/VMMachines.php':
+            return 200, {}, self.vm_machines()
+        if path == '/webGui/include/ShareList.php':
+            return 200, {}, self.share_list()
+        if path == '/update.htm':
+            return 200, {}, ''
+        return 404, {}, 'not found'
+
+    async def handle(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get('content-length') or 0))
+
+            parts = request_line.decode('latin-1').split()
+            if len(parts) < 2:
+                return
+            method, path = parts[0], urlsplit(parts[1]).path
+            self.requests += 1
+            if self.latency:
+                await asyncio.sleep(self.latency)
+
+            if path.startswith('/sub/') and headers.get('upgrade', '').lower() == 'websocket':
+                head = ('HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                        f'Sec-WebSocket-Accept: {_accept_key(headers.get("sec-websocket-key", ""))}\r\n')
+                if 'ws+meta.nchan' in headers.get('sec-websocket-protocol', ''):
+                    head += 'Sec-WebSocket-Protocol: ws+meta.nchan\r\n'
+                writer.write((head + '\r\n').encode())
+                await self.subscribe(reader, writer, tuple(path[len('/sub/'):].split(',')))
+                return
+
+            status, extra, text = self.route(method, path, body)
+            payload = text.encode()
+            head = f'HTTP/1.1 {status} {REASONS.get(status, "")}\r\n'
+            head += ''.join(f'{name}: {value}\r\n' for name, value in extra.items())
+            if 'Content-Type' not in extra:
+                head += 'Content-Type: text/html\r\n'
+            head += f'Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n'
+            writer.write(head.encode() + payload)
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception:
+            self.logger.exception('Mock request failed')
+        finally:
+            writer.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve a mock Unraid server for integration and scale tests')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--name', default='mock')
+    parser.add_argument('--disks', type=int, default=6, help='array data disks (plus one parity and one cache)')
+    parser.add_argument('--containers', type=int, default=20)
+    parser.add_argument('--vms', type=int, default=2)
+    parser.add_argument('--shares', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0, help='seconds added to every response')
+    parser.add_argument('--push-interval', type=float, default=1, help='seconds between nchan pushes')
+    parser.add_argument('--churn', type=float, default=0, help='seconds between container state flips, 0 for none')
+    args = parser.parse_args(argv)
+
+    async def serve():
+        mock = MockUnraid(args.name, args.disks, args.containers, args.vms, args.shares, args.latency, args.host,
+                          args.port, args.push_interval, args.churn)
+        await mock.start()
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""
+GraphQL disk telemetry for Unraid 7.2+
+Read/write activity for every array disk from one bulk query, with SMART
+health folded into the same request at a much slower cadence
+"""
+import time
+from .graphql_client import graphql_query
+from records import SensorTemplate, disk_display_name
+
+DISK_FIELDS = """
+              name
+              device
+              numReads
+              numWrites
+              numErrors
+"""
+
+COUNTERS_QUERY = f"""
+        array {{
+          parities {{{DISK_FIELDS}}}
+          disks {{{DISK_FIELDS}}}
+          caches {{{DISK_FIELDS}}}
+        }}
+"""
+
+SMART_QUERY = """
+        disks {
+          device
+          name
+          vendor
+          serialNum
+          interfaceType
+          smartStatus
+        }
+"""
+
+READ_RATE = SensorTemplate('Disk {} Read Rate', family='disk', unit_of_measurement='ops/s', icon='mdi:download', state_class='measurement')
+WRITE_RATE = SensorTemplate('Disk {} Write Rate', family='disk', unit_of_measurement='ops/s', icon='mdi:upload', state_class='measurement')
+SMART = SensorTemplate('Disk {} SMART', family='disk', icon='mdi:harddisk-plus')
+
+# SMART reads can wake spun-down disks, so they wait for the array to be fully
+# spun up, but never longer than this
+SMART_MAX_DEFER = 86400
+
+
+class DiskCounters:
+    """Last read/write counters seen for one disk"""
+    __slots__ = ('time', 'reads', 'writes')
+
+    def __init__(self, now, reads, writes):
+        self.time = now
+        self.reads = reads
+        self.writes = writes
+
+
+def _device(path):
+    return (path or '').rsplit('/', 1)[-1]
+
+
+async def fetch_disk_telemetry_graphql(server, with_smart):
+    """
+    Fetch counters for all array disks, plus SMART health if requested
+
+    Returns:
+        (array disks list, physical disks list or None) or None on error
+    """
+    data = None
+    if with_smart:
+        data = await graphql_query(server, f"query {{{COUNTERS_QUERY}{SMART_QUERY}}}", "disk_telemetry", optional=True)
+        if data is None:
+            server.logger.debug("GraphQL: SMART query failed, fetching counters only")
+    if data is None:
+        data = await graphql_query(server, f"query {{{COUNTERS_QUERY}}}", "disk_counters")
+        if data is None:
+            return None
+
+    array_data = data.get('array') or {}
+    disks = []
+    for group in ('parities', 'disks', 'caches'):
+        disks.extend(array_data.get(group) or [])
+    return disks, data.get('disks')
+
+
+def _publish_rates(server, disk_name, disk, now, create_config, standby=False):
+    try:
+        reads = int(disk.get('numReads') or 0)
+        writes = int(disk.get('numWrites') or 0)
+    except (ValueError, TypeError):
+        return
+
+    key = disk.get('name')
+    counters = server.disk_counters.get(key)
+    if counters is None:
+        server.disk_counters[key] = DiskCounters(now, reads, writes)
+        return
+    # Updated in place: one DiskCounters per disk for the life of the bridge
+    last_time, last_reads, last_writes = counters.time, counters.reads, counters.writes
+    counters.time, counters.reads, counters.writes = now, reads, writes
+    # A sleeping disk has nothing to report; the baseline keeps the next rate right.
+    # Counters were cleared (reboot, "Clear Statistics"): just take a new baseline
+    if standby or reads < last_reads or writes < last_writes or now <= last_time:
+        return
+
+    elapsed = now - last_time
+    attributes = {'reads': reads, 'writes': writes, 'errors': disk.get('numErrors') or 0}
+
+    server.mqtt_publish(READ_RATE(disk_name), 'sensor', round((reads - last_reads) / elapsed, 1), json_attributes=attributes,
+                        create_config=create_config, owner=('disk', disk_name))
+    server.mqtt_publish(WRITE_RATE(disk_name), 'sensor', round((writes - last_writes) / elapsed, 1),
+                        create_config=create_config, owner=('disk', disk_name))
+
+
+def _publish_smart(server, disk_name, physical, create_config):
+    attributes = {
+        'model': physical.get('name', ''),
+        'vendor': physical.get('vendor', ''),
+        'serial': physical.get('serialNum', ''),
+        'interface': physical.get('interfaceType', ''),
+        'device': _device(physical.get('device'))
+    }
+    server.mqtt_publish(SMART(disk_name), 'sensor', physical.get('smartStatus') or 'UNKNOWN', json_attributes=attributes,
+                        create_config=create_config, retain=True, owner=('disk', disk_name))
+
+
+async def disk_telemetry(server, create_config=True):
+    """
+    Publish per-disk read/write rates every cycle and SMART health every smart_scan_interval
+
+    Rates are derived from the deltas of the cumulative read/write counters
+    between two cycles, so the first cycle only records a baseline. Disks the
+    disk parser saw in standby are skipped.
+    """
+    now = time.time()
+    standby = {name for name, spin in server.disk_spin.items() if not spin.spinning}
+    if standby and not server.smart_last_scan:
+        # Start the deferral clock rather than reading SMART right after startup
+        server.smart_last_scan = now - server.smart_scan_interval
+    smart_age = now - server.smart_last_scan
+    smart_due = smart_age >= server.smart_scan_interval and (not standby or smart_age >= SMART_MAX_DEFER)
+
+    result = await fetch_disk_telemetry_graphql(server, smart_due)
+    if result is None:
+        return
+    disks, physical_disks = result
+    if smart_due:
+        # Also on failure: don't retry the heavier query every cycle
+        server.smart_last_scan = now
+
+    physical_by_device = {_device(disk.get('device')): disk for disk in physical_disks or [] if isinstance(disk, dict)}
+    for disk in disks:
+        if not disk.get('name'):
+            continue
+        disk_name = disk_display_name(disk['name'])
+        _publish_rates(server, disk_name, disk, now, create_config, standby=disk_name in standby)
+
+        physical = physical_by_device.get(_device(disk.get('device')))
+        if physical and disk_name not in standby:
+            _publish_smart(server, disk_name, physical, create_config)
+
+    server.logger.debug(f"Disk telemetry: {len(disks)} disk(s){', with SMART' if physical_disks else ''}")
@@ -1,76 +1,85 @@
-import re
+import time
 from utils import Preferences
-from humanfriendly import parse_size
+from records import Disk, SensorTemplate
+from .trends import publish_fill_trends
+
+BYTES_PER_SECTOR = 1024
+BYTES_IN_TB = 1_000_000_000_000
+
+SPIN_ACTIVE = SensorTemplate('Disk {} Spin State', family='disk', icon='mdi:harddisk')
+SPIN_STANDBY = SensorTemplate('Disk {} Spin State', family='disk', icon='mdi:sleep')
+TEMPERATURE = SensorTemplate('Disk {} Temperature', family='disk', unit_of_measurement='°C', device_class='temperature',
+                             icon='mdi:harddisk', state_class='measurement')
+SIZE = SensorTemplate('Disk {} Size', family='disk', unit_of_measurement='TB', icon='mdi:database', state_class='measurement')
+USED = SensorTemplate('Disk {} Used', family='disk', unit_of_measurement='TB', icon='mdi:database-arrow-down', state_class='measurement')
+FREE = SensorTemplate('Disk {} Free', family='disk', unit_of_measurement='TB', icon='mdi:database-arrow-up', state_class='measurement')
+
+
+class DiskSpin:
+    """Spin state of one disk and when it was last published"""
+    __slots__ = ('spinning', 'published')
+
+    def __init__(self, spinning, now):
+        self.spinning = spinning
+        self.published = now
+
+
+def _publish_spin_state(self, disk_name, spinning, create_config):
+    sensor = SPIN_ACTIVE(disk_name) if spinning else SPIN_STANDBY(disk_name)
+    self.mqtt_publish(sensor, 'sensor', 'active' if spinning else 'standby', create_config=create_config, retain=True,
+                      owner=('disk', disk_name))
+
 
 async def disks(self, msg_data, create_config):
     prefs = Preferences(msg_data)
-    disks = prefs.as_dict()
+    sections = prefs.as_dict()
 
-    if not disks:
+    if not sections:
         self.logger.debug("No disk data received in message")
         return
 
-    for n in disks:
-        disk = disks[n]
-        disk_name = disk['name']
-        disk_temp = int(disk['temp']) if str(disk['temp']).isnumeric() else 0
-
-        match = re.match(r'([a-z_]+)([0-9]+)', disk_name, re.I)
-        if match:
-            disk_num = match[2]
-            disk_name = match[1] if match[1] != 'disk' else None
-            disk_name = ' '.join(filter(None, [disk_name, disk_num]))
-        disk_name = disk_name.title().replace('_', ' ')
-
-        payload_temp = {
-            'name': f'Disk {disk_name} Temperature',
-            'unit_of_measurement': '°C',
-            'device_class': 'temperature',
-            'icon': 'mdi:harddisk',
-            'state_class': 'measurement'
-        }
-        self.mqtt_publish(payload_temp, 'sensor', disk_temp, json_attributes=disk, create_config=create_config, retain=True)
-
-        try:
-            BYTES_PER_SECTOR = 1024
-            BYTES_IN_TB = 1_000_000_000_000
-
-            # Try multiple field name variations
-            # Old WebSocket format: sizesb, fsused, fsfree (lowercase)
-            # GraphQL format: sizesb, fsused, fsfree (converted from GraphQL)
-            # Some versions may use camelCase: sizeSb, fsUsed, fsFree
-            size_sb = disk.get('sizesb') or disk.get('sizeSb') or disk.get('size') or 0
-            fs_used = disk.get('fsused') or disk.get('fsUsed') or 0
-            fs_free = disk.get('fsfree') or disk.get('fsFree') or 0
-
-            disk_size_tb = round((int(size_sb) * BYTES_PER_SECTOR) / BYTES_IN_TB, 2)
-            disk_used_tb = round((int(fs_used) * BYTES_PER_SECTOR) / BYTES_IN_TB, 2)
-            disk_free_tb = round((int(fs_free) * BYTES_PER_SECTOR) / BYTES_IN_TB, 2)
-        except (ValueError, TypeError) as e:
-            self.logger.debug(f"Error calculating disk sizes for {disk_name}: {e}")
-            disk_size_tb = disk_used_tb = disk_free_tb = 0
+    now = time.time()
+    fill_samples = {}
+    disk_names = set()
+    for section in sections.values():
+        disk = Disk(section)
+        disk_name = disk.display_name
+        disk_names.add(disk_name)
+
+        # Spun-down disks only get a spin state and a slow size/usage refresh
+        spinning = not disk.standby
+        spin = self.disk_spin.get(disk_name)
+        due = spin is None or spin.spinning != spinning or now - spin.published >= self.standby_disk_interval
+        if due:
+            _publish_spin_state(self, disk_name, spinning, create_config)
+            if spin is None:
+                spin = self.disk_spin[disk_name] = DiskSpin(spinning, now)
+            spin.spinning = spinning
+            spin.published = now
+        if not (spinning or due):
+            continue
+
+        owner = ('disk', disk_name)
+        if spinning:
+            self.mqtt_publish(TEMPERATURE(disk_name), 'sensor', disk.temp, json_attributes=disk.attributes,
+                              create_config=create_config, retain=True, owner=owner)
+
+        disk_size_tb = round((disk.size_kb * BYTES_PER_SECTOR) / BYTES_IN_TB, 2)
+        disk_used_tb = round((disk.used_kb * BYTES_PER_SECTOR) / BYTES_IN_TB, 2)
+        disk_free_tb = round((disk.free_kb * BYTES_PER_SECTOR) / BYTES_IN_TB, 2)
+        if disk_size_tb and disk.used_kb:
+            fill_samples[disk_name] = ((disk.used_kb * BYTES_PER_SECTOR) / BYTES_IN_TB, (disk.free_kb * BYTES_PER_SECTOR) / BYTES_IN_TB)
 
         if disk_size_tb:
-            payload_size = {
-                'name': f'Disk {disk_name} Size',
-                'unit_of_measurement': 'TB',
-                'icon': 'mdi:database',
-                'state_class': 'measurement'
-            }
-            self.mqtt_publish(payload_size, 'sensor', disk_size_tb, create_config=create_config, retain=True)
+            self.mqtt_publish(SIZE(disk_name), 'sensor', disk_size_tb, create_config=create_config, retain=True, owner=owner)
         if disk_used_tb:
-            payload_used = {
-                'name': f'Disk {disk_name} Used',
-                'unit_of_measurement': 'TB',
-                'icon': 'mdi:database-arrow-down',
-                'state_class': 'measurement'
-            }
-            self.mqtt_publish(payload_used, 'sensor', disk_used_tb, create_config=create_config, retain=True)
+            self.mqtt_publish(USED(disk_name), 'sensor', disk_used_tb, create_config=create_config, retain=True, owner=owner)
         if disk_free_tb:
-            payload_free = {
-                'name': f'Disk {disk_name} Free',
-                'unit_of_measurement': 'TB',
-                'icon': 'mdi:database-arrow-up',
-                'state_class': 'measurement'
-            }
-            self.mqtt_publish(payload_free, 'sensor', disk_free_tb, create_config=create_config, retain=True)
+            self.mqtt_publish(FREE(disk_name), 'sensor', disk_free_tb, create_config=create_config, retain=True, owner=owner)
+
+    if fill_samples:
+        publish_fill_trends(self, 'disk_used', 'Disk {}', fill_samples, 'TB', create_config, owner='disk')
+
+    for disk_name in set(self.disk_spin) - disk_names:
+        del self.disk_spin[disk_name]
+    self.sweep_entities('disk', disk_names)
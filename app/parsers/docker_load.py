@@ -0,0 +1,167 @@
+"""
+Per-container CPU and memory streamed from Unraid's 'dockerload' nchan channel
+
+Each frame carries one line per running container, as produced by
+`docker stats --no-stream --format '{{.ID}};{{.CPUPerc}};{{.MemUsage}}'`:
+    1a2b3c4d5e6f;0.15%;120.5MiB / 31.27GiB
+
+Frames are folded into rolling per-container aggregates as they arrive and
+published at our own cadence (docker_load_interval), independent of how
+often the dashboard pushes.
+"""
+import time
+import asyncio
+from humanfriendly import parse_size
+from .nchan import parse_frame, frame_text
+
+CHANNELS = ('dockerload',)
+
+
+class ContainerLoad:
+    __slots__ = ('samples', 'cpu_sum', 'cpu_max', 'mem_sum', 'mem_max')
+
+    def __init__(self):
+        self.samples = 0
+        self.cpu_sum = 0.0
+        self.cpu_max = 0.0
+        self.mem_sum = 0.0
+        self.mem_max = 0.0
+
+    def add(self, cpu_pct, mem_bytes):
+        self.samples += 1
+        self.cpu_sum += cpu_pct
+        self.mem_sum += mem_bytes
+        if cpu_pct > self.cpu_max:
+            self.cpu_max = cpu_pct
+        if mem_bytes > self.mem_max:
+            self.mem_max = mem_bytes
+
+
+class DockerLoadAggregator:
+    def __init__(self):
+        self.containers = {}
+
+    def add(self, text):
+        """Fold one frame body into the running aggregates; returns lines accepted"""
+        accepted = 0
+        start = 0
+        length = len(text)
+        while start < length:
+            end = text.find('\n', start)
+            if end == -1:
+                end = length
+            line = text[start:end]
+            start = end + 1
+
+            fields = line.split(';')
+            if len(fields) < 3:
+                continue
+            try:
+                cpu_pct = float(fields[1].strip().rstrip('%') or 0)
+                mem_bytes = parse_size(fields[2].split('/', 1)[0].strip())
+            except Exception:
+                continue
+
+            container_id = fields[0].strip()[:12]
+            load = self.containers.get(container_id)
+            if load is None:
+                load = self.containers[container_id] = ContainerLoad()
+            load.add(cpu_pct, mem_bytes)
+            accepted += 1
+        return accepted
+
+    def drain(self):
+        """Return the aggregates of the window that just ended and start a new one"""
+        containers, self.containers = self.containers, {}
+        return containers
+
+
+def publish_docker_load(server, aggregates, create_config=True):
+    """Publish avg/max CPU % and memory per container for one window"""
+    names = {docker_id[:12]: delta.name for docker_id, delta in server.docker_deltas.items()}
+
+    for container_id, load in aggregates.items():
+        if not load.samples:
+            continue
+        name = names.get(container_id, container_id)
+
+        payload_cpu = {
+            'name': f'Docker {name} CPU',
+            'unit_of_measurement': '%',
+            'icon': 'mdi:chip',
+            'state_class': 'measurement'
+        }
+        server.mqtt_publish(
+            payload_cpu,
+            'sensor',
+            round(load.cpu_sum / load.samples, 2),
+            json_attributes={'max': round(load.cpu_max, 2), 'samples': load.samples},
+            create_config=create_config,
+            owner=('docker', name)
+        )
+
+        payload_mem = {
+            'name': f'Docker {name} Memory',
+            'unit_of_measurement': 'MB',
+            'icon': 'mdi:memory',
+            'state_class': 'measurement'
+        }
+        server.mqtt_publish(
+            payload_mem,
+            'sensor',
+            round(load.mem_sum / load.samples / 1_000_000, 1),
+            json_attributes={'max_mb': round(load.mem_max / 1_000_000, 1), 'samples': load.samples},
+            create_config=create_config,
+            owner=('docker', name)
+        )
+
+    server.logger.debug(f"Docker load: published {len(aggregates)} container(s)")
+
+
+async def _publish_windows(server, aggregator):
+    while True:
+        await asyncio.sleep(server.docker_load_interval)
+        aggregates = aggregator.drain()
+        if aggregates:
+            publish_docker_load(server, aggregates)
+
+
+async def docker_load_stream(server):
+    """
+    Keep a subscription to 'dockerload' open and publish rolling aggregates
+
+    Unraid only runs the dockerload publisher while a client is subscribed,
+    so this subscription is also what keeps the numbers flowing.
+    """
+    aggregator = DockerLoadAggregator()
+    publisher = asyncio.ensure_future(_publish_windows(server, aggregator))
+    try:
+        while True:
+            try:
+                if time.time() - server.cookie_last_refresh > server.cookie_refresh_interval:
+                    await server.refresh_unraid_session()
+
+                async with server.nchan_subscribe(CHANNELS) as ws:
+                    server.logger.info('Docker load: subscribed to dockerload channel')
+                    while True:
+                        try:
+                            data = await asyncio.wait_for(ws.recv(), timeout=300)
+                        except asyncio.TimeoutError:
+                            # Channel is idle; keep the subscription open
+                            server.health.success('docker_load')
+                            continue
+                        try:
+                            _, _, body = parse_frame(data, CHANNELS)
+                        except ValueError:
+                            continue
+                        if body:
+                            aggregator.add(frame_text(body))
+                        server.health.success('docker_load')
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                server.logger.warning(f"Docker load stream failed, will retry: {e}")
+                server.health.failure('docker_load', e)
+                await asyncio.sleep(30)
+    finally:
+        publisher.cancel()
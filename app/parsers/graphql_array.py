@@ -2,39 +2,91 @@
 GraphQL Array status data fetcher for Unraid 7.2+
 Fetches array status, parity, and disk information
 """
+import time
 from .graphql_client import graphql_query
+from .trends import publish_fill_trends, publish_parity_eta
+
+# Fields of the running parity check (array.parityCheckStatus, newer API versions)
+PARITY_STATUS_FIELDS = ('status', 'progress', 'running', 'errors')
+
+PARITY_STATUS_PROBE_QUERY = """
+    query {
+      array: __type(name: "UnraidArray") {
+        fields {
+          name
+        }
+      }
+      check: __type(name: "ParityCheck") {
+        fields {
+          name
+        }
+      }
+    }
+"""
+
+
+def _field_names(type_data):
+    return {field['name'] for field in (type_data or {}).get('fields') or [] if isinstance(field, dict)}
+
+
+async def probe_parity_status(server):
+    """
+    Return the parityCheckStatus fields this server supports (empty if it has none)
+
+    The result is kept in server.capabilities so the probe runs once per process.
+    """
+    fields = server.capabilities.get('parity_status')
+    if fields is not None:
+        return fields
+
+    data = await graphql_query(server, PARITY_STATUS_PROBE_QUERY, "parity_status_probe", optional=True)
+    if data is None:
+        # Probe failed (server down?), try again next time
+        return ()
+    offered = _field_names(data.get('check'))
+    if 'parityCheckStatus' in _field_names(data.get('array')) and 'progress' in offered:
+        fields = tuple(field for field in PARITY_STATUS_FIELDS if field in offered)
+    else:
+        fields = ()
+
+    server.capabilities['parity_status'] = fields
+    server.logger.info(f"GraphQL: parity check progress {'available' if fields else 'not available'}")
+    return fields
 
 
 async def fetch_array_data_graphql(server):
     """
     Fetch array status and disk data from Unraid GraphQL API
-    Returns comprehensive array information including parity
+    Returns comprehensive array information including parity and, where offered, the running check
     """
-    query = """
-        query {
-          array {
+    parity_status = await probe_parity_status(server)
+    parity_status_query = f"parityCheckStatus {{ {' '.join(parity_status)} }}" if parity_status else ''
+    query = f"""
+        query {{
+          array {{
             state
-            capacity {
-              kilobytes {
+            {parity_status_query}
+            capacity {{
+              kilobytes {{
                 free
                 used
                 total
-              }
-              disks {
+              }}
+              disks {{
                 free
                 used
                 total
-              }
-            }
-            parities {
+              }}
+            }}
+            parities {{
               id
               name
               device
               size
               status
               temp
-            }
-            disks {
+            }}
+            disks {{
               id
               name
               device
@@ -45,8 +97,8 @@ async def fetch_array_data_graphql(server):
               fsSize
               fsUsed
               fsFree
-            }
-            caches {
+            }}
+            caches {{
               id
               name
               device
@@ -57,9 +109,9 @@ async def fetch_array_data_graphql(server):
               fsSize
               fsUsed
               fsFree
-            }
-          }
-        }
+            }}
+          }}
+        }}
     """
 
     data = await graphql_query(server, query, "array_status")
@@ -86,6 +138,10 @@ async def array_status_graphql(server, create_config=True):
 
     # Array state
     state = array_data.get('state', 'UNKNOWN')
+    if server.array_state is not None and state != server.array_state:
+        # Checks start and end around array state changes; refresh parity history
+        server.parity_history_due = True
+    server.array_state = state
     payload_state = {
         'name': 'Array State',
         'icon': 'mdi:server'
@@ -130,6 +186,10 @@ async def array_status_graphql(server, create_config=True):
             create_config=create_config
         )
 
+        if total_kb:
+            samples = {'': (used_kb / (1024 ** 3), free_kb / (1024 ** 3))}
+            publish_fill_trends(server, 'array_used', 'Array', samples, 'TB', create_config)
+
     # Parity disks
     parities = array_data.get('parities', [])
     for parity in parities:
@@ -157,55 +217,181 @@ async def array_status_graphql(server, create_config=True):
             }
             server.mqtt_publish(payload_parity_temp, 'sensor', temp, create_config=create_config)
 
+    parity_check = array_data.get('parityCheckStatus')
+    if isinstance(parity_check, dict):
+        publish_parity_check(server, parity_check, create_config)
+
     server.logger.debug(f"Array status: {state}, Usage: {usage_pct if kilobytes else 'N/A'}%")
 
 
+def publish_parity_check(server, parity_check, create_config):
+    """Progress of the running parity check and its ETA, like the 'parity' channel in WebSocket mode"""
+    status = parity_check.get('status') or 'UNKNOWN'
+    running = parity_check.get('running')
+    if running is None:
+        running = status in ('RUNNING', 'PAUSED')
+    running = bool(running)
+    if server.parity_check_running and not running:
+        # A check just ended; refresh parity history this cycle instead of after parity_history_ttl
+        server.parity_history_due = True
+    server.parity_check_running = running
+    try:
+        progress = float(parity_check.get('progress') or 0)
+    except (TypeError, ValueError):
+        progress = 0.0
+
+    payload = {
+        'name': 'Parity Check',
+        'unit_of_measurement': '%',
+        'icon': 'mdi:database-eye',
+        'state_class': 'measurement'
+    }
+    attributes = {'status': status, 'running': running, 'errors': parity_check.get('errors')}
+    server.mqtt_publish(payload, 'sensor', progress if running else 0, json_attributes=attributes, create_config=create_config)
+
+    publish_parity_eta(server, progress if running else 0, create_config)
+
+
+# ParityCheck fields we know how to publish; the set a server offers varies by API version
+PARITY_FIELDS = ('date', 'duration', 'speed', 'status', 'errors')
+
+PARITY_PROBE_QUERY = """
+    query {
+      check: __type(name: "ParityCheck") {
+        fields {
+          name
+        }
+      }
+    }
+"""
+
+
+async def probe_parity_history(server):
+    """
+    Return the ParityCheck fields this server supports (empty if it has no parity history, None if the probe failed)
+
+    The result is kept in server.capabilities so the probe runs once per process.
+    """
+    fields = server.capabilities.get('parity_history')
+    if fields is not None:
+        return fields
+
+    root_fields = server.capabilities.get('graphql')
+    if root_fields is not None and 'parityHistory' not in root_fields:
+        fields = ()
+    else:
+        data = await graphql_query(server, PARITY_PROBE_QUERY, "parity_probe")
+        if data is None:
+            # Probe failed (server down?), try again next time
+            return None
+        offered = {field['name'] for field in (data.get('check') or {}).get('fields') or [] if isinstance(field, dict)}
+        fields = tuple(field for field in PARITY_FIELDS if field in offered)
+
+    server.capabilities['parity_history'] = fields
+    server.logger.info(f"GraphQL: parity history {'fields: ' + ', '.join(fields) if fields else 'not available'}")
+    return fields
+
+
 async def fetch_parity_history_graphql(server):
     """
     Fetch parity check history from Unraid GraphQL API
-    Note: Parity history schema is not well-documented, disabling for now
+    Only asks for the fields the schema probe found, as they vary between Unraid versions
+
+    Returns:
+        list: Parity checks (empty if the server keeps no history), or None if the probe or query failed
+    """
+    fields = await probe_parity_history(server)
+    if fields is None:
+        return None
+    if not fields:
+        return []
+
+    query = f"""
+        query {{
+          parityHistory {{
+            {' '.join(fields)}
+          }}
+        }}
     """
-    # The parityHistory schema varies significantly between Unraid versions
-    # and is not reliably available. Commenting out to avoid errors.
-    # Users can still see parity status from array_status_graphql
-    return None
+    data = await graphql_query(server, query, "parity_history")
+    if not data:
+        return None
+    return data.get('parityHistory') or []
+
+
+def _speed_mb_s(speed):
+    """'150.3 MB/s' or 150.3 -> 150.3"""
+    try:
+        return round(float(str(speed).split()[0]), 1)
+    except (ValueError, IndexError):
+        return None
 
 
 async def parity_history_graphql(server, create_config=True):
     """
     Parse parity history and publish latest check info to MQTT
+
+    History only changes when a check ends, so it is fetched when the array
+    state changes or a running check ends (see array_status_graphql) or after
+    parity_history_ttl, not every scan.
     """
+    now = time.time()
+    if not server.parity_history_due and now - server.parity_history_fetched < server.parity_history_ttl:
+        return
+
     history = await fetch_parity_history_graphql(server)
+    if history is None:
+        # Keep a pending 'check just ended' refresh and retry next cycle
+        return
+    server.parity_history_fetched = now
+    server.parity_history_due = False
     if not history:
         return
 
-    # Get most recent parity check
-    if history:
-        latest = history[0] if isinstance(history, list) else history
+    # Most recent check first
+    if isinstance(history, list):
+        latest = max(history, key=lambda check: str(check.get('date') or '')) if 'date' in history[0] else history[0]
+    else:
+        latest = history
 
-        status = latest.get('status', 'UNKNOWN')
-        duration = latest.get('duration', 0)
-        speed = latest.get('speed', 0)
-        errors = latest.get('errors', 0)
+    status = latest.get('status', 'UNKNOWN')
+    duration = latest.get('duration')
+    speed = _speed_mb_s(latest.get('speed'))
+    errors = latest.get('errors')
 
-        attributes = {
-            'duration_seconds': duration,
-            'speed_mb_s': speed,
-            'errors': errors,
-            'start_time': latest.get('startTime', ''),
-            'end_time': latest.get('endTime', '')
-        }
+    attributes = {
+        'date': latest.get('date', ''),
+        'duration_seconds': duration,
+        'speed_mb_s': speed,
+        'errors': errors,
+        'checks': len(history) if isinstance(history, list) else 1
+    }
+    payload_parity = {
+        'name': 'Last Parity Check',
+        'icon': 'mdi:shield-sync'
+    }
+    server.mqtt_publish(payload_parity, 'sensor', status, json_attributes=attributes, create_config=create_config, retain=True)
 
-        payload_parity = {
-            'name': 'Last Parity Check',
-            'icon': 'mdi:shield-sync'
+    if duration is not None:
+        payload_duration = {
+            'name': 'Last Parity Check Duration',
+            'unit_of_measurement': 's',
+            'device_class': 'duration',
+            'icon': 'mdi:timer-outline'
         }
-        server.mqtt_publish(
-            payload_parity,
-            'sensor',
-            status,
-            json_attributes=attributes,
-            create_config=create_config
-        )
+        server.mqtt_publish(payload_duration, 'sensor', duration, create_config=create_config, retain=True)
+    if speed is not None:
+        payload_speed = {
+            'name': 'Last Parity Check Speed',
+            'unit_of_measurement': 'MB/s',
+            'icon': 'mdi:speedometer'
+        }
+        server.mqtt_publish(payload_speed, 'sensor', speed, create_config=create_config, retain=True)
+    if errors is not None:
+        payload_errors = {
+            'name': 'Last Parity Check Errors',
+            'icon': 'mdi:alert-circle-outline'
+        }
+        server.mqtt_publish(payload_errors, 'sensor', errors, create_config=create_config, retain=True)
 
-        server.logger.debug(f"Parity check: {status}, Errors: {errors}")
+    server.logger.debug(f"Parity check: {status}, Errors: {errors}")
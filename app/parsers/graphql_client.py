@@ -4,9 +4,23 @@ Provides shared functionality for all GraphQL queries
 """
 import json
 import httpx
+from breakers import CircuitOpenError
 
+# Client errors that say nothing about what the server offers (credentials, throttling)
+TRANSIENT_STATUS = (401, 403, 408, 429)
 
-async def graphql_query(server, query_string, operation_name=""):
+
+class GraphQLAbsent(Exception):
+    """The server definitely lacks what was asked for: /graphql answered 4xx or the schema rejected a field"""
+
+
+def is_absence(errors):
+    """True if GraphQL errors only reject fields the schema doesn't have"""
+    return bool(errors) and all(isinstance(error, dict) and 'Cannot query field' in str(error.get('message', ''))
+                                for error in errors)
+
+
+async def graphql_query(server, query_string, operation_name="", optional=False, raise_absent=False):
     """
     Execute a GraphQL query against Unraid server
 
@@ -14,10 +28,27 @@ async def graphql_query(server, query_string, operation_name=""):
         server: Server instance with connection details
         query_string: GraphQL query string
         operation_name: Optional operation name for logging
+        optional: The caller retries with a smaller query on failure, so a failure
+            doesn't count against the running collector
+        raise_absent: Raise GraphQLAbsent when the server definitely lacks the endpoint
+            or a queried field, instead of returning None as for any other failure
 
     Returns:
         dict: GraphQL response data, or None on error
     """
+    try:
+        data = await _graphql_request(server, query_string, operation_name)
+    except GraphQLAbsent:
+        if raise_absent:
+            raise
+        data = None
+    if data is None and not optional:
+        # Callers log and carry on; make the failed cycle visible on /ready
+        server.health.fail_current(f'GraphQL {operation_name or "query"} failed')
+    return data
+
+
+async def _graphql_request(server, query_string, operation_name):
     graphql_request = {
         "query": query_string
     }
@@ -34,7 +65,7 @@ async def graphql_query(server, query_string, operation_name=""):
         else:
             headers['Cookie'] = server.unraid_cookie
 
-        async with httpx.AsyncClient(verify=False) as http:
+        async with server.http_client(verify=False) as http:
             response = await http.post(
                 f'{server.unraid_url}/graphql',
                 json=graphql_request,
@@ -58,6 +89,8 @@ async def graphql_query(server, query_string, operation_name=""):
                 # Check for GraphQL errors
                 if 'errors' in data:
                     server.logger.error(f"GraphQL ({operation_name}): Errors: {data['errors']}")
+                    if is_absence(data['errors']):
+                        raise GraphQLAbsent(f"GraphQL ({operation_name}): fields not in the schema")
                     return None
 
                 # Return the data payload
@@ -70,8 +103,15 @@ async def graphql_query(server, query_string, operation_name=""):
                     return None
             else:
                 server.logger.error(f"GraphQL ({operation_name}): HTTP {response.status_code}: {response.text[:500]}")
+                if 400 <= response.status_code < 500 and response.status_code not in TRANSIENT_STATUS:
+                    raise GraphQLAbsent(f"GraphQL ({operation_name}): HTTP {response.status_code}")
                 return None
 
+    except GraphQLAbsent:
+        raise
+    except CircuitOpenError as e:
+        server.logger.debug(f"GraphQL ({operation_name}): {e}")
+        return None
     except httpx.ConnectError:
         server.logger.error(f"GraphQL ({operation_name}): Could not connect to /graphql endpoint")
         return None
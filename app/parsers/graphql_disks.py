@@ -3,28 +3,9 @@ GraphQL disk data fetcher for Unraid 7.2+
 Fetches disk usage information from Unraid's GraphQL API
 """
 from .graphql_client import graphql_query
+from .disks import disks as parse_disks
 
-
-async def fetch_disk_data_graphql(server):
-    """
-    Fetch disk data from Unraid GraphQL API
-    Returns INI-formatted string compatible with existing disk parser
-    """
-    query = """
-        query {
-          array {
-            disks {
-              name
-              device
-              size
-              status
-              temp
-              fsType
-              fsSize
-              fsUsed
-              fsFree
-            }
-            caches {
+DISK_FIELDS = """
               name
               device
               size
@@ -34,12 +15,40 @@ async def fetch_disk_data_graphql(server):
               fsSize
               fsUsed
               fsFree
-            }
-          }
-        }
+"""
+
+# Lets the disk parser skip standby disks; not every API version has it
+SPIN_FIELD = """
+              isSpinning
+"""
+
+
+def _disks_query(with_spin):
+    fields = DISK_FIELDS + SPIN_FIELD if with_spin else DISK_FIELDS
+    return f"""
+        query {{
+          array {{
+            parities {{{fields}}}
+            disks {{{fields}}}
+            caches {{{fields}}}
+          }}
+        }}
     """
 
-    data = await graphql_query(server, query, "disks")
+
+async def fetch_disk_data_graphql(server):
+    """
+    Fetch disk data from Unraid GraphQL API
+    Returns INI-formatted string compatible with existing disk parser
+    """
+    with_spin = server.capabilities.get('disk_spin', True)
+    data = await graphql_query(server, _disks_query(with_spin), "disks", optional=with_spin)
+    if not data and with_spin:
+        data = await graphql_query(server, _disks_query(with_spin=False), "disks")
+        if data:
+            # Only the spin field failed, not the server
+            server.logger.info("GraphQL: disk spin state not available, polling all disks at full rate")
+            server.capabilities['disk_spin'] = False
     if not data:
         return None
 
@@ -50,11 +59,10 @@ async def fetch_disk_data_graphql(server):
 
     all_disks = []
 
-    # Combine regular disks and cache disks
-    if 'disks' in array_data and array_data['disks']:
-        all_disks.extend(array_data['disks'])
-    if 'caches' in array_data and array_data['caches']:
-        all_disks.extend(array_data['caches'])
+    # Combine parity, regular and cache disks: the listing is also what the disk entity sweep keeps,
+    # and disk telemetry publishes parity rates and SMART under the disk family
+    for group in ('parities', 'disks', 'caches'):
+        all_disks.extend(array_data.get(group) or [])
 
     if all_disks:
         server.logger.debug(f"GraphQL: Successfully fetched data for {len(all_disks)} disk(s)")
@@ -64,6 +72,19 @@ async def fetch_disk_data_graphql(server):
         return None
 
 
+async def disks_graphql(server, create_config=True):
+    """
+    Fetch disk data from GraphQL and publish it through the disk parser
+    """
+    ini_data = await fetch_disk_data_graphql(server)
+
+    if ini_data:
+        # Parse using existing disk parser
+        await parse_disks(server, ini_data, create_config=create_config)
+    else:
+        server.logger.debug("GraphQL disk data fetch returned no data")
+
+
 def convert_graphql_to_ini(disks):
     """
     Convert GraphQL disk array to INI format expected by disk parser
@@ -99,6 +120,8 @@ def convert_graphql_to_ini(disks):
         section += f'fssize="{fssize}"\n'
         section += f'fsused="{fsused}"\n'
         section += f'fsfree="{fsfree}"\n'
+        if disk.get('isSpinning') is False:
+            section += 'spundown="1"\n'
 
         ini_sections.append(section)
 
@@ -2,14 +2,19 @@
 GraphQL Docker container data fetcher for Unraid 7.2+
 Fetches Docker container information including running state
 """
+import time
+from records import Container, SensorTemplate
 from .graphql_client import graphql_query
-from utils import normalize_str
+
+STATE = SensorTemplate('Docker {} State', family='docker', device_class='running', icon='mdi:docker')
 
 
 async def fetch_docker_data_graphql(server):
     """
     Fetch Docker container data from Unraid GraphQL API
-    Publishes binary sensors for running state and additional metrics
+
+    Returns:
+        list: Containers (empty when none exist), or None if the query failed
     """
     query = """
         query {
@@ -36,78 +41,101 @@ async def fetch_docker_data_graphql(server):
     if not data:
         return None
 
-    # Extract containers from response
-    containers = data.get('docker', {}).get('containers', [])
-    if not containers:
-        server.logger.warning("GraphQL: No Docker containers found")
+    # Extract containers from response; a missing listing is a failure, an empty one is not
+    containers = (data.get('docker') or {}).get('containers')
+    if not isinstance(containers, list):
+        server.logger.warning("GraphQL: No Docker container listing in response")
         return None
+    if not containers:
+        server.logger.debug("GraphQL: No Docker containers found")
 
     server.logger.debug(f"GraphQL: Found {len(containers)} Docker container(s)")
     return containers
 
 
+class ContainerDelta:
+    """Last published view of one container, keyed by Docker container id"""
+    __slots__ = ('name', 'fingerprint', 'published', 'status_published')
+
+    def __init__(self, name, fingerprint, now):
+        self.name = name
+        self.fingerprint = fingerprint
+        self.published = now
+        self.status_published = now
+
+
 async def docker_containers(server, create_config=True):
     """
     Parse Docker container data and publish to MQTT
     Creates binary sensors for running state
+
+    Only publishes a container when its state, image or ports change, or when
+    the periodic full refresh is due. The 'status' attribute ("Up 3 hours")
+    changes every scan, so it is republished on its own slower cadence.
     """
     containers = await fetch_docker_data_graphql(server)
-    if not containers:
+    if containers is None:
         return
 
-    for container in containers:
-        # Extract container name (remove leading slash if present)
-        names = container.get('names', [])
-        if not names:
+    now = time.time()
+    seen = set()
+    published = 0
+
+    for data in containers:
+        container = Container(data)
+        name = container.name
+        if not name:
             continue
+        docker_id = container.id
+        power_state = 'ON' if container.running else 'OFF'
 
-        # Container names come as array, typically ["/container_name"]
-        name = names[0].lstrip('/') if isinstance(names, list) else str(names).lstrip('/')
-        container_id = normalize_str(name)
-
-        # Determine running state
-        state = container.get('state', '').lower()
-        is_running = state == 'running'
-        power_state = 'ON' if is_running else 'OFF'
-
-        # Extract additional info
-        image = container.get('image', '')
-        status = container.get('status', '')
-        auto_start = container.get('autoStart', False)
-        ports = container.get('ports', [])
-
-        # Format port mappings for attributes
-        port_mappings = []
-        for port in ports:
-            if isinstance(port, dict):
-                private = port.get('privatePort', '')
-                public = port.get('publicPort', '')
-                port_type = port.get('type', 'tcp')
-                if private and public:
-                    port_mappings.append(f"{public}:{private}/{port_type}")
+        seen.add(docker_id)
+        fingerprint = (name, container.state, container.image, container.auto_start, container.ports)
+        delta = server.docker_deltas.get(docker_id)
+
+        changed = delta is None or delta.fingerprint != fingerprint
+        refresh_due = delta is not None and now - delta.published >= server.docker_refresh_interval
+        status_due = delta is not None and now - delta.status_published >= server.docker_status_interval
+        if not (changed or refresh_due or status_due):
+            continue
 
         # Build attributes
         attributes = {
-            'container_id': container.get('id', '')[:12],  # Short ID
-            'image': image,
-            'status': status,
-            'state': state,
-            'auto_start': auto_start,
-            'port_mappings': port_mappings
+            'container_id': data.get('id', '')[:12],  # Short ID
+            'image': container.image,
+            'status': container.status,
+            'state': container.state,
+            'auto_start': container.auto_start,
+            'port_mappings': list(container.ports)
         }
+        payload_state = STATE(name)
 
-        # Publish binary sensor for running state
-        payload_state = {
-            'name': f'Docker {name} State',
-            'device_class': 'running',
-            'icon': 'mdi:docker'
-        }
-        server.mqtt_publish(
-            payload_state,
-            'binary_sensor',
-            power_state,
-            json_attributes=attributes,
-            create_config=create_config
-        )
-
-        server.logger.debug(f"Docker container '{name}': {power_state} ({state})")
+        if changed or refresh_due:
+            # Publish binary sensor for running state
+            server.mqtt_publish(
+                payload_state,
+                'binary_sensor',
+                power_state,
+                json_attributes=attributes,
+                create_config=create_config,
+                retain=True,
+                owner=('docker', name)
+            )
+            if delta is None:
+                server.docker_deltas[docker_id] = delta = ContainerDelta(name, fingerprint, now)
+            delta.name = name
+            delta.fingerprint = fingerprint
+            delta.published = delta.status_published = now
+            server.logger.debug(f"Docker container '{name}': {power_state} ({container.state})")
+        else:
+            # Only the uptime text moved on; refresh the attributes alone
+            server.mqtt_publish(payload_state, 'binary_sensor', None, json_attributes=attributes, retain=True,
+                                owner=('docker', name))
+            delta.status_published = now
+        published += 1
+
+    for docker_id in set(server.docker_deltas) - seen:
+        del server.docker_deltas[docker_id]
+    server.sweep_entities('docker', {delta.name for delta in server.docker_deltas.values()})
+
+    server.logger.debug(f"Docker: {published}/{len(containers)} container(s) published")
@@ -3,7 +3,10 @@ GraphQL Shares data fetcher for Unraid 7.2+
 Fetches user share information and usage
 """
 from .graphql_client import graphql_query
-from utils import normalize_str
+from records import Share, SensorTemplate
+from .trends import publish_fill_trends
+
+USAGE = SensorTemplate('Share {} Usage', family='share', unit_of_measurement='%', icon='mdi:folder-network', state_class='measurement')
 
 
 async def fetch_shares_data_graphql(server):
@@ -54,56 +57,43 @@ async def shares_graphql(server, create_config=True):
     if shares is None:
         return
 
-    for share in shares:
-        name = share.get('name', '')
+    fill_samples = {}
+    for data in shares:
+        share = Share(data)
+        name = share.name
         if not name:
             continue
 
-        share_id = normalize_str(name)
-
-        # Extract usage data - try both bytes and string formats
-        size_bytes = float(share.get('size', 0) or 0)
-        used_bytes = float(share.get('used', 0) or 0)
-        free_bytes = float(share.get('free', 0) or 0)
-
         # If no size data, skip this share (don't publish 0%)
-        if size_bytes == 0:
+        if share.size == 0:
             server.logger.debug(f"Share '{name}': No size data available, skipping")
             continue
 
         # Convert to GB
-        size_gb = round(size_bytes / (1024 ** 3), 2)
-        used_gb = round(used_bytes / (1024 ** 3), 2)
-        free_gb = round(free_bytes / (1024 ** 3), 2)
+        size_gb = round(share.size / (1024 ** 3), 2)
+        used_gb = round(share.used / (1024 ** 3), 2)
+        free_gb = round(share.free / (1024 ** 3), 2)
 
         # Calculate usage percentage
-        usage_pct = round((used_bytes / size_bytes * 100), 2)
+        usage_pct = round((share.used / share.size * 100), 2)
 
-        # Build attributes
         attributes = {
-            'comment': share.get('comment', ''),
-            'allocator': share.get('allocator', ''),
-            'cache': share.get('cache', ''),
+            'comment': share.comment,
+            'allocator': share.allocator,
+            'cache': share.cache,
             'size_gb': size_gb,
             'used_gb': used_gb,
             'free_gb': free_gb,
-            'include': share.get('include', ''),
-            'exclude': share.get('exclude', '')
+            'include': share.include,
+            'exclude': share.exclude
         }
-
-        # Publish usage percentage sensor
-        payload_usage = {
-            'name': f'Share {name} Usage',
-            'unit_of_measurement': '%',
-            'icon': 'mdi:folder-network',
-            'state_class': 'measurement'
-        }
-        server.mqtt_publish(
-            payload_usage,
-            'sensor',
-            usage_pct,
-            json_attributes=attributes,
-            create_config=create_config
-        )
+        server.mqtt_publish(USAGE(name), 'sensor', usage_pct, json_attributes=attributes, create_config=create_config,
+                            owner=('share', name))
 
         server.logger.debug(f"Share '{name}': {usage_pct}% used ({used_gb}/{size_gb} GB)")
+        fill_samples[name] = (share.used / (1024 ** 3), share.free / (1024 ** 3))
+
+    if fill_samples:
+        publish_fill_trends(server, 'share_used', 'Share {}', fill_samples, 'GB', create_config, publish_rate=False, owner='share')
+
+    server.sweep_entities('share', {share.get('name') for share in shares if share.get('name')})
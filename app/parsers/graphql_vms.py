@@ -2,8 +2,16 @@
 GraphQL VM data fetcher for Unraid 7.2+
 Fetches virtual machine information including running state
 """
+import re
+from lxml import etree
 from .graphql_client import graphql_query
-from utils import normalize_str
+from . import vms as vms_http_parser
+from records import VM, SensorTemplate
+from breakers import CircuitOpenError
+
+STATE = SensorTemplate('VM {} State', family='vm', device_class='running', icon='mdi:monitor')
+VCPUS = SensorTemplate('VM {} vCPUs', family='vm', unit_of_measurement='', icon='mdi:chip', state_class='measurement')
+MEMORY = SensorTemplate('VM {} Memory', family='vm', unit_of_measurement='MB', icon='mdi:memory', state_class='measurement')
 
 
 async def fetch_vm_data_graphql(server):
@@ -49,6 +57,20 @@ async def fetch_vm_data_graphql(server):
     return domains
 
 
+async def fetch_vm_page(server):
+    """VMMachines.php, or None if it can't be fetched (the circuit may be open)"""
+    try:
+        async with server.http_client(verify=False) as http:
+            headers = {'Cookie': server.unraid_cookie}
+            r = await http.get(f'{server.unraid_url}/VMMachines.php', headers=headers, timeout=30)
+            return r.text
+    except CircuitOpenError as e:
+        server.logger.debug(f"VMMachines.php skipped: {e}")
+    except Exception as e:
+        server.logger.warning(f"Could not fetch VMMachines.php: {e}")
+    return None
+
+
 async def vms_graphql(server, create_config=True):
     """
     Parse VM data from GraphQL and publish to MQTT
@@ -59,16 +81,15 @@ async def vms_graphql(server, create_config=True):
     """
     # Get basic VM state from GraphQL
     vms = await fetch_vm_data_graphql(server)
+    # The HTTP page is fetched once per cycle: either as the fallback or for the specs
+    page = await fetch_vm_page(server)
     if vms is None:
         # Fall back to HTTP parser if GraphQL fails
+        if page is None:
+            return
         server.logger.info("GraphQL VMs failed, using HTTP parser fallback")
-        from . import vms as vms_http_parser
-        import httpx
         try:
-            async with httpx.AsyncClient(verify=False) as http:
-                headers = {'Cookie': server.unraid_cookie}
-                r = await http.get(f'{server.unraid_url}/VMMachines.php', headers=headers, timeout=30)
-                await vms_http_parser.vms(server, r.text, create_config=create_config)
+            await vms_http_parser.vms(server, page, create_config=create_config)
         except Exception:
             server.logger.exception("HTTP VM parser also failed")
         return
@@ -77,13 +98,8 @@ async def vms_graphql(server, create_config=True):
     # (GraphQL schema doesn't always include vCPU/memory fields)
     vm_specs = {}
     try:
-        import httpx
-        from lxml import etree
-        import re
-        async with httpx.AsyncClient(verify=False) as http:
-            headers = {'Cookie': server.unraid_cookie}
-            r = await http.get(f'{server.unraid_url}/VMMachines.php', headers=headers, timeout=30)
-            tree = etree.HTML(r.text)
+        if page:
+            tree = etree.HTML(page)
             vm_rows = tree.xpath('//tr[contains(@class, "sortable")]')
 
             for row in vm_rows:
@@ -100,72 +116,34 @@ async def vms_graphql(server, create_config=True):
                 mem_text = ''.join(row.xpath('./td[4]/text()')).strip()
                 mem_mb = int(re.sub(r'[^\d]', '', mem_text)) if mem_text else 0
 
-                vm_specs[vm_name] = {'vcpus': vcpus, 'memory_mb': mem_mb}
+                vm_specs[vm_name] = (vcpus, mem_mb)
     except Exception:
-        server.logger.warning("Could not fetch VM specs from HTTP, will publish without vCPU/memory data")
+        server.logger.warning("Could not parse VM specs from HTTP, will publish without vCPU/memory data")
 
-    for vm in vms:
-        name = vm.get('name', '')
+    for data in vms:
+        # vCPU and memory come from the HTTP page, GraphQL doesn't always have them
+        vm = VM(data, *vm_specs.get(data.get('name', ''), (0, 0)))
+        name = vm.name
         if not name:
             continue
+        power_state = 'ON' if vm.running else 'OFF'
 
-        vm_id = normalize_str(name)
-
-        # Determine running state
-        # GraphQL returns state like: 'running', 'shut off', 'paused', etc.
-        state = vm.get('state', '').lower()
-        is_running = 'running' in state
-        power_state = 'ON' if is_running else 'OFF'
-
-        uuid = vm.get('uuid', '')
-
-        # Get vCPU and memory from HTTP fallback
-        specs = vm_specs.get(name, {})
-        vcpus = specs.get('vcpus', 0)
-        memory_mb = specs.get('memory_mb', 0)
-
-        # Build attributes
         attributes = {
-            'uuid': uuid,
-            'state': state
-        }
-        if vcpus:
-            attributes['vcpus'] = vcpus
-        if memory_mb:
-            attributes['memory_mb'] = memory_mb
-
-        # Publish binary sensor for running state
-        payload_power = {
-            'name': f'VM {name} State',
-            'device_class': 'running',
-            'icon': 'mdi:monitor'
+            'uuid': vm.uuid,
+            'state': vm.state
         }
-        server.mqtt_publish(
-            payload_power,
-            'binary_sensor',
-            power_state,
-            json_attributes=attributes,
-            create_config=create_config
-        )
-
-        # Publish vCPU count sensor if available
-        if vcpus:
-            payload_vcpu = {
-                'name': f'VM {name} vCPUs',
-                'unit_of_measurement': '',
-                'icon': 'mdi:chip',
-                'state_class': 'measurement'
-            }
-            server.mqtt_publish(payload_vcpu, 'sensor', vcpus, create_config=create_config)
-
-        # Publish memory sensor if available
-        if memory_mb:
-            payload_mem = {
-                'name': f'VM {name} Memory',
-                'unit_of_measurement': 'MB',
-                'icon': 'mdi:memory',
-                'state_class': 'measurement'
-            }
-            server.mqtt_publish(payload_mem, 'sensor', memory_mb, create_config=create_config)
+        if vm.vcpus:
+            attributes['vcpus'] = vm.vcpus
+        if vm.memory_mb:
+            attributes['memory_mb'] = vm.memory_mb
+
+        server.mqtt_publish(STATE(name), 'binary_sensor', power_state, json_attributes=attributes, create_config=create_config,
+                            owner=('vm', name))
+        if vm.vcpus:
+            server.mqtt_publish(VCPUS(name), 'sensor', vm.vcpus, create_config=create_config, owner=('vm', name))
+        if vm.memory_mb:
+            server.mqtt_publish(MEMORY(name), 'sensor', vm.memory_mb, create_config=create_config, owner=('vm', name))
+
+        server.logger.debug(f"VM '{name}': {power_state} ({vm.state}){f', {vm.vcpus} vCPU, {vm.memory_mb} MB' if vm.vcpus else ''}")
 
-        server.logger.debug(f"VM '{name}': {power_state} ({state}){f', {vcpus} vCPU, {memory_mb} MB' if vcpus else ''}")
+    server.sweep_entities('vm', {vm.get('name') for vm in vms if vm.get('name')})
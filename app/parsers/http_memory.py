@@ -20,7 +20,7 @@ async def fetch_memory_http(server, create_config: bool = False):
         server.logger.debug("HTTP memory: Skipping - data not available via HTTP, using WebSocket instead")
         return
 
-        async with httpx.AsyncClient(verify=False) as client:
+        async with server.http_client(verify=False) as client:
             headers = {'Cookie': server.unraid_cookie}
 
             # Try the main dashboard first
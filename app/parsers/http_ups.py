@@ -5,6 +5,7 @@ Polls UPS status pages to extract UPS data when WebSocket isn't sending updates.
 import httpx
 import re
 from typing import Optional, Dict
+from .ups import handle_ups
 
 
 async def fetch_ups_http(server, create_config: bool = False):
@@ -13,7 +14,7 @@ async def fetch_ups_http(server, create_config: bool = False):
     This works even when WebSocket isn't sending updates.
     """
     try:
-        async with httpx.AsyncClient(verify=False) as client:
+        async with server.http_client(verify=False) as client:
             headers = {'Cookie': server.unraid_cookie}
 
             # Try multiple possible UPS endpoints
@@ -48,7 +49,6 @@ async def fetch_ups_http(server, create_config: bool = False):
 
             if ups_data:
                 # Use the existing UPS handler from parsers.ups
-                from parsers.ups import handle_ups
                 handle_ups(server, ups_data, create_config)
                 server.logger.debug(f"HTTP UPS: Published {len(ups_data)} fields")
             else:
@@ -56,8 +56,10 @@ async def fetch_ups_http(server, create_config: bool = False):
 
     except httpx.RequestError as e:
         server.logger.error(f"HTTP UPS request failed: {e}")
-    except Exception:
+        server.health.fail_current(e)
+    except Exception as e:
         server.logger.exception("Failed to fetch UPS data via HTTP")
+        server.health.fail_current(e)
 
 
 def extract_ups_from_html(server, html: str) -> Optional[Dict[str, any]]:
@@ -0,0 +1,105 @@
+"""
+Decoder for nchan 'ws+meta.nchan' WebSocket frames
+Shared by the legacy WebSocket loop and the GraphQL-mode WebSocket helpers
+
+A frame looks like:
+    id: 1700000000:-,-,[3],-\n
+    content-type: text/plain\n
+    \n
+    <body>
+
+On a multiplexed subscription (/sub/a,b,c,d) the message id carries one tag
+per channel and the tag wrapped in brackets marks the channel the frame
+belongs to. A single-channel subscription has a plain id without tags.
+
+Only the short header is inspected; the body is never scanned or rewritten.
+"""
+
+# Headers are a couple of short lines; anything longer is not a meta frame
+HEADER_LIMIT = 1024
+
+_PAD = ' \t\r\n\x00'
+_PAD_BYTES = frozenset(_PAD.encode())
+
+
+def _find_header_end(head, sep):
+    end = head.find(sep)
+    if end == -1:
+        raise ValueError('nchan frame has no header terminator')
+    return end
+
+
+def _parse_header(header):
+    """Return the message id from the header lines"""
+    for line in header.split('\n'):
+        key, _, value = line.partition(':')
+        if key.strip(_PAD).lower() == 'id':
+            return value.strip(_PAD)
+    return ''
+
+
+def _channel_from_id(msg_id, channels):
+    """
+    Pick the channel whose tag is bracketed in a multiplexed message id
+
+    '1700000000:-,-,[3],-' with channels (a, b, c, d) -> 'c'
+    """
+    if len(channels) == 1:
+        return channels[0]
+
+    _, _, tags = msg_id.partition(':')
+    if ',' not in tags:
+        return None
+
+    for channel, tag in zip(channels, tags.split(',')):
+        if tag.startswith('['):
+            return channel
+    return None
+
+
+def _trim(data, start, end, is_pad):
+    while start < end and is_pad(data[start]):
+        start += 1
+    while end > start and is_pad(data[end - 1]):
+        end -= 1
+    return start, end
+
+
+def parse_frame(frame, channels):
+    """
+    Split a ws+meta.nchan frame into its channel, message id and body
+
+    Args:
+        frame: Frame as received (str, bytes, bytearray or memoryview)
+        channels: Sequence of subscribed channel names, in subscription order
+
+    Returns:
+        tuple: (channel, message id, body). The channel is None when the id
+        does not identify one. For str input the body is a str; for binary
+        input it is a memoryview into the original buffer (no copy).
+
+    Raises:
+        ValueError: The frame has no header terminator
+    """
+    if isinstance(frame, str):
+        head = frame[:HEADER_LIMIT]
+        end = _find_header_end(head, '\n\n')
+        msg_id = _parse_header(head[:end])
+        start, stop = _trim(frame, end + 2, len(frame), _PAD.__contains__)
+        body = frame[start:stop]
+    else:
+        view = frame if isinstance(frame, memoryview) else memoryview(frame)
+        head = view[:HEADER_LIMIT].tobytes()
+        end = _find_header_end(head, b'\n\n')
+        msg_id = _parse_header(head[:end].decode('ascii', 'replace'))
+        start, stop = _trim(view, end + 2, len(view), _PAD_BYTES.__contains__)
+        body = view[start:stop]
+
+    return _channel_from_id(msg_id, channels), msg_id, body
+
+
+def frame_text(body):
+    """Decode a frame body returned by parse_frame to str"""
+    if isinstance(body, str):
+        return body
+    return str(body, 'utf-8', 'replace')
@@ -1,5 +1,6 @@
 import re
 from humanfriendly import parse_size
+from .trends import publish_parity_eta
 
 async def parity(self, msg_data, create_config):
     data = msg_data.split(';')
@@ -40,3 +41,5 @@ async def parity(self, msg_data, create_config):
         'device_class': 'safety'
     }
     self.mqtt_publish(payload_valid, 'binary_sensor', valid, json_attributes={'parity_progress': state_value}, create_config=create_config)
+
+    publish_parity_eta(self, state_value, create_config)
@@ -3,11 +3,13 @@ import httpx
 from lxml import etree
 from utils import Preferences
 from humanfriendly import parse_size
+from .trends import publish_fill_trends
 
 async def shares(self, msg_data, create_config):
     prefs = Preferences(msg_data)
     shares = prefs.as_dict()
 
+    fill_samples = {}
     for n in shares:
         share = shares[n]
         share_name = share['name']
@@ -18,7 +20,7 @@ async def shares(self, msg_data, create_config):
         share_cachepool = share['cachepool']
 
         if share_use_cache in ['no', 'yes', 'prefer']:
-            async with httpx.AsyncClient() as http:
+            async with self.http_client() as http:
                 if self.unraid_version.startswith('6.11'):
                     headers = {'Cookie': self.unraid_cookie + ';ssz=ssz'}
                     params = {
@@ -87,4 +89,12 @@ async def shares(self, msg_data, create_config):
             'state_class': 'measurement'
         }
 
-        self.mqtt_publish(payload, 'sensor', share_used_pct, json_attributes=share, create_config=create_config, retain=True)
+        self.mqtt_publish(payload, 'sensor', share_used_pct, json_attributes=share, create_config=create_config, retain=True,
+                          owner=('share', share_name.title()))
+        fill_samples[share_name.title()] = (share['used'] / 1000 / 1000, share['free'] / 1000 / 1000)
+
+    if fill_samples:
+        publish_fill_trends(self, 'share_used', 'Share {}', fill_samples, 'GB', create_config, publish_rate=False, owner='share')
+
+    if shares:
+        self.sweep_entities('share', {share['name'].title() for share in shares.values()})
@@ -0,0 +1,99 @@
+"""
+Trend sensors derived from sampled history
+Fill rate and time-until-full for disks, the array and shares, and a
+parity check ETA from observed progress.
+"""
+import time
+
+SECONDS_PER_DAY = 86400
+
+# Fill rates need a few hours of samples before they mean anything
+FILL_MIN_SPAN = 3 * 3600
+FILL_SAMPLE_INTERVAL = 900
+
+PARITY_MIN_SPAN = 300
+PARITY_SAMPLE_INTERVAL = 60
+
+
+def _fill_table(server, family):
+    return server.history.table(family, size=96, max_series=256, min_interval=FILL_SAMPLE_INTERVAL)
+
+
+def _days_until_full(rate_per_day, free):
+    if rate_per_day is None or rate_per_day <= 0:
+        return 'None'
+    return round(free / rate_per_day, 1)
+
+
+def publish_fill_trends(server, family, label, samples, unit, create_config, publish_rate=True, owner=None):
+    """
+    Record usage samples for a family and publish derived trend sensors
+
+    Args:
+        family: History table name, e.g. 'disk_used'
+        label: Entity name template, e.g. 'Disk {}' or 'Array'
+        samples: {key: (used, free)} in `unit`; key fills the label template
+        unit: Unit of used/free, the rate is published as <unit>/day
+        publish_rate: Also publish '<label> Fill Rate', not only time until full
+        owner: Entity family the keys belong to ('disk', 'share'), for entity cleanup
+    """
+    table = _fill_table(server, family)
+    now = time.time()
+    for key, (used, _) in samples.items():
+        table.record(key, now, used)
+
+    rates = table.rates(min_span=FILL_MIN_SPAN)
+    for key, (_, free) in samples.items():
+        name = label.format(key)
+        rate = rates.get(key)
+        entity_owner = (owner, key) if owner else None
+        rate_per_day = rate * SECONDS_PER_DAY if rate is not None else None
+
+        if publish_rate:
+            payload_rate = {
+                'name': f'{name} Fill Rate',
+                'unit_of_measurement': f'{unit}/d',
+                'icon': 'mdi:chart-line',
+                'state_class': 'measurement'
+            }
+            rate_value = round(rate_per_day, 3) if rate_per_day is not None else 'None'
+            server.mqtt_publish(payload_rate, 'sensor', rate_value, create_config=create_config, retain=True, owner=entity_owner)
+
+        payload_full = {
+            'name': f'{name} Time Until Full',
+            'unit_of_measurement': 'd',
+            'device_class': 'duration',
+            'icon': 'mdi:timer-sand',
+            'state_class': 'measurement'
+        }
+        server.mqtt_publish(payload_full, 'sensor', _days_until_full(rate_per_day, free), create_config=create_config, retain=True,
+                            owner=entity_owner)
+
+
+def publish_parity_eta(server, progress_pct, create_config):
+    """Publish the remaining time of a running parity check from observed progress"""
+    table = server.history.table('parity_progress', size=30, max_series=1, min_interval=PARITY_SAMPLE_INTERVAL)
+
+    last = table.last('parity')
+    if last is not None and progress_pct < last:
+        # Progress went backwards: a new check started
+        table.reset('parity')
+    if last is not None and (progress_pct >= 100 or progress_pct <= 0):
+        # A running check just ended; its result is in the parity history now
+        server.parity_history_due = True
+
+    if progress_pct <= 0 or progress_pct >= 100:
+        table.reset('parity')
+        eta = 0 if progress_pct >= 100 else 'None'
+    else:
+        table.record('parity', time.time(), progress_pct)
+        rate = table.rates(min_span=PARITY_MIN_SPAN).get('parity')
+        eta = round((100 - progress_pct) / rate / 60) if rate and rate > 0 else 'None'
+
+    payload = {
+        'name': 'Parity Check ETA',
+        'unit_of_measurement': 'min',
+        'device_class': 'duration',
+        'icon': 'mdi:timer-outline'
+    }
+    server.mqtt_publish(payload, 'sensor', eta, create_config=create_config)
@@ -2,6 +2,7 @@ from typing import Dict, Any
 import re
 import time
 from utils import normalize_str
+from records import Sensor, UPSReading
 
 # Map apcupsd/raw keys -> normalized metric keys
 UPS_FIELD_MAP = {
@@ -49,6 +50,17 @@ SENSOR_META: Dict[str, Dict[str, Any]] = {
     "reported_at":          {"name": "UPS Reported At"},
 }
 
+# Discovery payloads built once from SENSOR_META
+UPS_SENSORS = {
+    key: Sensor(meta["name"], {
+        name: meta[field]
+        for field, name in (("icon", "icon"), ("device_class", "device_class"), ("unit", "unit_of_measurement"),
+                            ("state_class", "state_class"))
+        if field in meta
+    })
+    for key, meta in SENSOR_META.items()
+}
+
 def _normalize_payload(payload: Dict[str, Any]) -> Dict[str, Any]:
     """Convert apcupsd/raw keys to normalized keys used by topics/entities."""
     norm: Dict[str, Any] = {}
@@ -70,42 +82,41 @@ def _coerce_value(key: str, val: Any) -> Any:
             return m.group(0)
     return val
 
-def publish_flat_topics(mqtt, base_topic: str, server_name: str, payload: Dict[str, Any]) -> None:
+
+def read_ups(payload: Dict[str, Any]) -> UPSReading:
+    """Normalize one raw apcupsd-style payload into a compact reading."""
+    return UPSReading(_normalize_payload(payload).items(), time.time())
+
+
+def publish_flat_topics(publish, base_topic: str, server_name: str, payload) -> None:
     """
     Publishes flat metrics under: {base_topic}/{server_name}/ups/<metric>
     Keeps your original flat-topic layout for tooling like Grafana/Node-RED.
+    `publish` is called as publish(topic, value, retain=...), e.g. server.mqtt_send.
+    `payload` is a raw payload dict or a UPSReading.
     """
     topic_root = f"{base_topic}/{server_name}/ups"
-    norm = _normalize_payload(payload)
-    for key, v in norm.items():
-        mqtt.publish(f"{topic_root}/{key}", _coerce_value(key, v), retain=True)
+    reading = payload if isinstance(payload, UPSReading) else read_ups(payload)
+    for key, v in reading:
+        publish(f"{topic_root}/{key}", _coerce_value(key, v), retain=True)
 
-def publish_ha_entities(server, payload: Dict[str, Any], create_config: bool) -> None:
+def publish_ha_entities(server, payload, create_config: bool) -> None:
     """
     Publishes one HA sensor entity per metric using server.mqtt_publish for discovery.
     Each entity publishes to: unraid/<server_id>/<sensor_id>/state
     and config to: homeassistant/sensor/<unraid_id>_<sensor_id>/config
     """
-    norm = _normalize_payload(payload)
-    for key, value in norm.items():
-        meta = SENSOR_META.get(key)
-        if not meta:
+    reading = payload if isinstance(payload, UPSReading) else read_ups(payload)
+    for key, value in reading:
+        sensor = UPS_SENSORS.get(key)
+        if not sensor:
             continue
 
-        state = _coerce_value(key, value)
-
-        # Build discovery payload
-        cfg: Dict[str, Any] = {"name": meta["name"]}
-        if "icon" in meta: cfg["icon"] = meta["icon"]
-        if "device_class" in meta: cfg["device_class"] = meta["device_class"]
-        if "unit" in meta: cfg["unit_of_measurement"] = meta["unit"]
-        if "state_class" in meta: cfg["state_class"] = meta["state_class"]
-
         # server.mqtt_publish handles unique_id/device + topics; retain=True for stability
         server.mqtt_publish(
-            payload=cfg,
+            payload=sensor,
             sensor_type="sensor",
-            state_value=state,
+            state_value=_coerce_value(key, value),
             json_attributes=None,
             create_config=create_config,
             retain=True
@@ -118,7 +129,8 @@ def handle_ups(server, payload: Dict[str, Any], create_config: bool) -> None:
       - Publishes per-metric HA discovery entities
     """
     server_id = normalize_str(server.unraid_name)
-    server.last_ups_payload = payload
-    server.last_ups_time = time.time()
-    publish_flat_topics(server.mqtt_client, server.base_topic, server_id, payload)
-    publish_ha_entities(server, payload, create_config)
+    reading = read_ups(payload)
+    server.last_ups_payload = reading
+    server.last_ups_time = reading.time
+    publish_flat_topics(server.mqtt_send, server.base_topic, server_id, reading)
+    publish_ha_entities(server, reading, create_config)
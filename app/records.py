@@ -0,0 +1,203 @@
+"""
+Compact record types and prebuilt sensor descriptors
+
+Records keep the fields the parsers use from one disk, container, VM, share or
+UPS reading in __slots__, instead of passing nested INI/JSON dicts around.
+
+Sensor descriptors are immutable discovery payloads, built once per entity and
+reused every cycle, so steady-state cycles no longer rebuild a payload dict per
+sensor and mqtt_publish no longer writes topics into the caller's payload.
+"""
+import re
+from types import MappingProxyType
+from utils import normalize_str
+
+
+class Sensor:
+    """Immutable discovery payload of one entity, with its sensor id worked out once"""
+    __slots__ = ('name', 'sensor_id', 'config')
+
+    def __init__(self, name, config=None):
+        config = {'name': name, **(config or {})}
+        object.__setattr__(self, 'name', name)
+        object.__setattr__(self, 'sensor_id', normalize_str(name))
+        object.__setattr__(self, 'config', MappingProxyType(config))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+    def __getitem__(self, key):
+        return self.config[key]
+
+
+# Entity family ('docker', 'vm', 'share', 'disk') -> its templates, so removed objects' descriptors can be dropped
+TEMPLATES = {}
+
+
+class SensorTemplate:
+    """
+    Sensor descriptors for one kind of entity per object, e.g. 'Disk {} Temperature'
+
+    template(key) returns the same Sensor for the same key on every call, until
+    forget_sensors() drops the key once its object is gone.
+    """
+    __slots__ = ('name_format', 'config', 'sensors')
+
+    def __init__(self, name_format, family=None, **config):
+        """
+        Args:
+            family: Entity family of the keys (see entity_registry), for forget_sensors()
+        """
+        self.name_format = name_format
+        self.config = MappingProxyType(config)
+        self.sensors = {}
+        if family:
+            TEMPLATES.setdefault(family, []).append(self)
+
+    def __call__(self, key):
+        sensor = self.sensors.get(key)
+        if sensor is None:
+            sensor = self.sensors[key] = Sensor(self.name_format.format(key), self.config)
+        return sensor
+
+    def forget(self, key):
+        self.sensors.pop(key, None)
+
+
+def forget_sensors(family, keys):
+    """Drop the cached descriptors of removed objects, so churning containers don't grow the caches"""
+    for template in TEMPLATES.get(family, ()):
+        for key in keys:
+            template.forget(key)
+
+
+def _int(value):
+    try:
+        return int(value or 0)
+    except (ValueError, TypeError):
+        return 0
+
+
+def _float(value):
+    try:
+        return float(value or 0)
+    except (ValueError, TypeError):
+        return 0.0
+
+
+def disk_display_name(disk_name):
+    """'disk1' -> '1', 'cache2' -> 'Cache 2', 'parity' -> 'Parity'"""
+    match = re.match(r'([a-z_]+)([0-9]+)', disk_name, re.I)
+    if match:
+        disk_num = match[2]
+        disk_name = match[1] if match[1] != 'disk' else None
+        disk_name = ' '.join(filter(None, [disk_name, disk_num]))
+    return disk_name.title().replace('_', ' ')
+
+
+def in_standby(disk):
+    """Unraid marks spun-down disks with spundown=1 and reports their temperature as '*'"""
+    return str(disk.get('spundown', '0')) == '1' or str(disk.get('temp', '')).strip() == '*'
+
+
+class Disk:
+    """One array/pool disk from the 'disks' nchan channel (or its GraphQL INI equivalent)"""
+    __slots__ = ('name', 'display_name', 'temp', 'size_kb', 'used_kb', 'free_kb', 'standby', 'attributes')
+
+    def __init__(self, section):
+        """
+        Args:
+            section: INI section of the disk; kept as the entity attributes
+        """
+        self.name = section['name']
+        self.display_name = disk_display_name(self.name)
+        temp = section.get('temp')
+        self.temp = int(temp) if str(temp).isnumeric() else 0
+        # Old WebSocket and GraphQL-converted data: sizesb/fsused/fsfree; some versions use camelCase
+        self.size_kb = _int(section.get('sizesb') or section.get('sizeSb') or section.get('size'))
+        self.used_kb = _int(section.get('fsused') or section.get('fsUsed'))
+        self.free_kb = _int(section.get('fsfree') or section.get('fsFree'))
+        self.standby = in_standby(section)
+        self.attributes = section
+
+
+class Container:
+    """One Docker container from the GraphQL docker query"""
+    __slots__ = ('id', 'name', 'image', 'state', 'status', 'auto_start', 'ports')
+
+    def __init__(self, data):
+        names = data.get('names') or []
+        # Container names come as array, typically ["/container_name"]
+        self.name = names[0].lstrip('/') if isinstance(names, list) and names else str(names or '').lstrip('/')
+        self.id = data.get('id', '') or self.name
+        self.image = data.get('image', '')
+        self.state = (data.get('state') or '').lower()
+        self.status = data.get('status', '')
+        self.auto_start = data.get('autoStart', False)
+        self.ports = tuple(
+            f"{port.get('publicPort')}:{port.get('privatePort')}/{port.get('type', 'tcp')}"
+            for port in data.get('ports') or []
+            if isinstance(port, dict) and port.get('privatePort') and port.get('publicPort')
+        )
+
+    @property
+    def running(self):
+        return self.state == 'running'
+
+
+class VM:
+    """One libvirt domain from the GraphQL vms query, with specs from VMMachines.php when known"""
+    __slots__ = ('name', 'uuid', 'state', 'vcpus', 'memory_mb')
+
+    def __init__(self, data, vcpus=0, memory_mb=0):
+        self.name = data.get('name', '')
+        self.uuid = data.get('uuid', '')
+        # 'running', 'shut off', 'paused', ...
+        self.state = (data.get('state') or '').lower()
+        self.vcpus = vcpus
+        self.memory_mb = memory_mb
+
+    @property
+    def running(self):
+        return 'running' in self.state
+
+
+class Share:
+    """One user share from the GraphQL shares query; sizes in bytes"""
+    __slots__ = ('name', 'comment', 'allocator', 'cache', 'include', 'exclude', 'size', 'used', 'free')
+
+    def __init__(self, data):
+        self.name = data.get('name', '')
+        self.comment = data.get('comment', '')
+        self.allocator = data.get('allocator', '')
+        self.cache = data.get('cache', '')
+        self.include = data.get('include', '')
+        self.exclude = data.get('exclude', '')
+        self.size = _float(data.get('size'))
+        self.used = _float(data.get('used'))
+        self.free = _float(data.get('free'))
+
+
+class UPSReading:
+    """
+    One UPS status report as normalized (key, value) pairs, in report order
+
+    Keys are the normalized names of parsers.ups.UPS_FIELD_MAP.
+    """
+    __slots__ = ('values', 'time')
+
+    def __init__(self, values, now):
+        self.values = tuple(values)
+        self.time = now
+
+    def __iter__(self):
+        return iter(self.values)
+
+    def __len__(self):
+        return len(self.values)
+
+    def get(self, key, default=None):
+        for name, value in self.values:
+            if name == key:
+                return value
+        return default
@@ -0,0 +1,170 @@
+"""
+Replay a capture (see capture.py) through the parsers
+
+    python replay.py capture.jsonl.gz [--speed 10] [--mqtt host[:port]]
+
+nchan frames go through the same dispatch as ws_connect, and each recorded
+collector cycle is re-run with its HTTP/GraphQL requests answered from the
+capture, in captured order. Publishes go to a counting stub sink, or to a
+real broker with --mqtt. --speed 0 replays as fast as possible.
+"""
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import unraid_parsers as parsers
+import main as bridge
+from main import UnRAIDServer
+from capture import read_capture, field, PlaybackTransport
+from collectors import MODES
+
+
+class StubSink:
+    """Stands in for the gmqtt client and counts what would have been published"""
+
+    def __init__(self):
+        self.messages = 0
+        self.bytes = 0
+        self.topics = set()
+
+    def publish(self, topic, payload, retain=False):
+        self.messages += 1
+        self.bytes += len(payload if isinstance(payload, (str, bytes)) else str(payload))
+        self.topics.add(topic)
+
+    def subscribe(self, *args, **kwargs):
+        pass
+
+    def unsubscribe(self, *args, **kwargs):
+        pass
+
+    def is_connected(self):
+        return True
+
+
+class CyclePlayback(PlaybackTransport):
+    """Requests of one collector cycle, falling back to exchanges made outside any collector"""
+
+    def __init__(self, records, fallback):
+        super().__init__(records)
+        self.fallback = fallback
+
+    async def handle_async_request(self, request):
+        if self.queues.get((request.method, request.url.path)):
+            return await super().handle_async_request(request)
+        return await self.fallback.handle_async_request(request)
+
+
+# Bodies fetched outside a collector cycle that are fed to a parser directly
+HTTP_PARSERS = {
+    '/VMMachines.php': 'vms',
+}
+
+
+def load(path):
+    records = list(read_capture(path))
+    if not records or records[0].get('kind') != 'header':
+        raise SystemExit(f'{path} is not a capture file')
+    return records[0], records[1:]
+
+
+async def replay(path, speed, mqtt):
+    header, records = load(path)
+    loop = asyncio.get_event_loop()
+
+    # Never load or touch the production entity registry and routes: the server reads them from DATA_PATH on construction
+    bridge.DATA_PATH = tempfile.mkdtemp(prefix='replay_')
+
+    mqtt_config = {'host': mqtt[0], 'port': mqtt[1]} if mqtt else {}
+    server = UnRAIDServer(mqtt_config, {'name': header['server'], 'host': 'replay', 'port': 0}, loop, start=False)
+
+    if mqtt:
+        server.mqtt_client.on_connect = server.on_connect
+        server.mqtt_client.on_message = server.on_message
+        server.mqtt_client.on_disconnect = server.on_disconnect
+        await server.mqtt_client.connect(*mqtt)
+    else:
+        server.mqtt_client = StubSink()
+        server.mqtt_connected = True
+
+    collectors = {collector.name: collector for mode in MODES.values() for collector in mode}
+    for collector in collectors.values():
+        collector.resolve()
+
+    # Exchanges made outside collector cycles (startup probes, WebSocket-mode parsers)
+    background = PlaybackTransport(r for r in records if r['kind'] == 'http' and not r.get('collector'))
+    server.playback = background
+
+    cycles = {}
+    for record in records:
+        if record['kind'] == 'http' and record.get('collector'):
+            cycles.setdefault((record['collector'], record['cycle']), []).append(record)
+
+    ws_channels = server.ws_channels()
+    started = time.time()
+    first = records[0]['t'] if records else 0
+    replayed_cycles = frames = 0
+
+    for record in records:
+        if speed:
+            delay = (record['t'] - first) / speed - (time.time() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        if record['kind'] == 'nchan':
+            server.handle_ws_frame(field(record, 'data'), ws_channels, now=record['t'])
+            frames += 1
+        elif record['kind'] == 'http' and record.get('collector'):
+            key = (record['collector'], record['cycle'])
+            group = cycles.pop(key, None)
+            collector = collectors.get(record['collector'])
+            if group is None or collector is None or not collector.functions:
+                continue
+            server.playback = CyclePlayback(group, background)
+            for collect in collector.functions:
+                try:
+                    await collect(server, create_config=True)
+                except Exception:
+                    server.logger.exception(f'Replay of {collector.name} cycle {record["cycle"]} failed')
+            server.playback = background
+            replayed_cycles += 1
+        elif record['kind'] == 'http' and record['path'] in HTTP_PARSERS:
+            await getattr(parsers, HTTP_PARSERS[record['path']])(server, field(record, 'body'), create_config=True)
+
+        # Let parser tasks spawned by handle_ws_frame run
+        await asyncio.sleep(0)
+
+    pending = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+    if pending:
+        await asyncio.wait(pending, timeout=10)
+
+    elapsed = time.time() - started
+    span = (records[-1]['t'] - first) if records else 0
+    print(f'Replayed {len(records)} records ({frames} frames, {replayed_cycles} collector cycles) '
+          f'covering {span:.0f}s in {elapsed:.2f}s')
+    print(f'Entities: {len(server.state_store)}, unanswered requests: {background.misses}')
+    if isinstance(server.mqtt_client, StubSink):
+        sink = server.mqtt_client
+        rate = sink.messages / elapsed if elapsed else 0
+        print(f'Published {sink.messages} messages ({sink.bytes} bytes) to {len(sink.topics)} topics, {rate:.0f} msg/s')
+    else:
+        await server.mqtt_client.disconnect()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay a captured Unraid session through the parsers')
+    parser.add_argument('capture', help='capture file written with the "capture" server option')
+    parser.add_argument('--speed', type=float, default=1, help='replay speed factor, 0 for as fast as possible')
+    parser.add_argument('--mqtt', help='publish to this broker (host[:port]) instead of the stub sink')
+    args = parser.parse_args(argv)
+
+    mqtt = None
+    if args.mqtt:
+        host, _, port = args.mqtt.partition(':')
+        mqtt = (host, int(port or 1883))
+    asyncio.run(replay(args.capture, args.speed, mqtt))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,56 @@
+"""
+Last-known-state buffer for MQTT publishes made while the broker is unreachable
+Keeps only the newest payload per topic so an outage of any length costs at
+most one message per topic when the connection comes back.
+"""
+import asyncio
+from collections import OrderedDict
+
+
+class ReplayBuffer:
+    def __init__(self, max_topics=5000):
+        self.max_topics = max_topics
+        self.messages = OrderedDict()
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self.messages)
+
+    def put(self, topic, payload, retain=False):
+        """Store the latest payload for a topic, evicting the oldest topic when full"""
+        if topic in self.messages:
+            self.messages.move_to_end(topic)
+        self.messages[topic] = (payload, retain)
+
+        while len(self.messages) > self.max_topics:
+            self.messages.popitem(last=False)
+            self.dropped += 1
+
+    def discard(self, topic):
+        """Forget a pending topic, e.g. because a newer value was just published live"""
+        self.messages.pop(topic, None)
+
+    async def flush(self, send, batch_size=100, pause=0.02):
+        """
+        Replay buffered messages oldest-first in paced batches
+
+        Args:
+            send: Callable (topic, payload, retain) -> bool, False stops the flush
+            batch_size: Messages sent before yielding to the event loop
+            pause: Seconds to wait between batches
+
+        Returns:
+            int: Number of messages sent
+        """
+        sent = 0
+        while self.messages:
+            for _ in range(min(batch_size, len(self.messages))):
+                topic, (payload, retain) = self.messages.popitem(last=False)
+                if not send(topic, payload, retain):
+                    # Connection dropped mid-flush; keep the message for next time
+                    self.put(topic, payload, retain)
+                    self.messages.move_to_end(topic, last=False)
+                    return sent
+                sent += 1
+            await asyncio.sleep(pause)
+        return sent
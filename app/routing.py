@@ -0,0 +1,297 @@
+"""
+Capability-based source routing
+In 'auto' mode a server doesn't run a fixed GraphQL or WebSocket collector set.
+Each capability (disks, array, Docker, VMs, shares, UPS, memory, temperatures)
+lists the sources that can deliver it, cheapest first: one GraphQL query, an
+nchan channel, or scraping a PHP page. One probe per server (GraphQL root
+fields, nchan channels with data, and only the pages still needed) picks the
+first working source per capability, and only those collectors run.
+
+Probe results and routes are kept in DATA_PATH so restarts skip the probe.
+When a routed collector keeps failing, its source is demoted for a while and
+the server is probed again, so the next cheapest source takes over. Routes are
+also re-evaluated without a failure once a demotion runs out (so the cheaper
+source comes back), once the probe is older than ROUTE_TTL, and while any
+capability has no source at all.
+"""
+import os
+import json
+import time
+from startup import probe_graphql_fields, probe_channels
+
+# Re-probe at least this often; routed collectors failing this many cycles in a row trigger one earlier
+ROUTE_TTL = 7 * 86400
+REROUTE_FAILURES = 3
+# Minimum seconds between probes after the startup one, doubled while they change nothing
+REPROBE_INTERVAL = 600
+MAX_REPROBE_INTERVAL = 6 * 3600
+# Seconds a source that kept failing is skipped
+DEMOTION_TTL = 6 * 3600
+
+UPS_PAGE = '/plugins/dynamix.apcupsd/include/UPSstatus.php'
+
+# Collectors that don't depend on a source and run in every routing
+ALWAYS = ('system_sensors', 'docker_load')
+
+
+class Source:
+    __slots__ = ('kind', 'collectors', 'needs', 'channels')
+
+    def __init__(self, kind, collectors, needs=(), channels=()):
+        """
+        Args:
+            kind: 'graphql', 'nchan' or 'http'
+            collectors: Names of the collectors that deliver the capability from this source
+            needs: GraphQL root fields, nchan channels or page paths (by kind) the probe must find working
+            channels: nchan channels the persistent 'websocket' collector subscribes to for this source
+        """
+        self.kind = kind
+        self.collectors = collectors
+        self.needs = needs
+        self.channels = channels
+
+
+ROUTES = {
+    'disks': (Source('graphql', ('graphql_disk', 'disk_telemetry'), needs=('array',)),
+              Source('nchan', ('websocket',), needs=('disks',), channels=('disks',))),
+    'array': (Source('graphql', ('graphql_array',), needs=('array',)),
+              Source('nchan', ('websocket',), needs=('update2',), channels=('update2', 'parity'))),
+    'docker': (Source('graphql', ('graphql_docker',), needs=('docker',)),),
+    'vms': (Source('graphql', ('graphql_vms',), needs=('vms',)),
+            Source('http', ('vm_sensors',), needs=('/VMMachines.php',))),
+    'shares': (Source('graphql', ('graphql_shares',), needs=('shares',)),
+               Source('nchan', ('websocket',), needs=('shares',), channels=('shares',))),
+    'ups': (Source('nchan', ('graphql_ups',), needs=('apcups',)),
+            Source('http', ('http_ups',), needs=(UPS_PAGE,))),
+    'memory': (Source('nchan', ('graphql_system',), needs=('update1',)),),
+    'temps': (Source('nchan', ('graphql_system',), needs=('temperature',)),),
+}
+
+PROBED_CHANNELS = tuple(sorted({need for sources in ROUTES.values() for source in sources if source.kind == 'nchan'
+                                for need in source.needs}))
+
+
+async def probe_page(server, page):
+    """True if the page answers 200 with the current session (no login redirect)"""
+    try:
+        async with server.http_client(verify=False) as http:
+            r = await http.get(f'{server.unraid_url}{page}', headers={'Cookie': server.unraid_cookie}, timeout=15)
+        return r.status_code == 200
+    except Exception as e:
+        server.logger.debug(f'Routing: probe of {page} failed: {e}')
+        return False
+
+
+class Router:
+    def __init__(self, path):
+        """
+        Args:
+            path: JSON file the probe results and routes are persisted to
+        """
+        self.path = path
+        self.probes = None
+        self.probed = 0
+        self.routes = {}
+        self.demoted = {}
+        self.reprobe_interval = REPROBE_INTERVAL
+        self.last_reprobe = 0
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.probes = data.get('probes')
+        self.probed = data.get('probed', 0)
+        self.demoted = {(capability, kind): since for capability, kind, since in data.get('demoted', [])}
+        self.routes = {capability: source for capability, kind in (data.get('routes') or {}).items()
+                       for source in ROUTES.get(capability, ()) if source.kind == kind}
+
+    def save(self):
+        data = {
+            'probed': self.probed,
+            'probes': self.probes,
+            'routes': {capability: source.kind for capability, source in self.routes.items()},
+            'demoted': [(capability, kind, since) for (capability, kind), since in self.demoted.items()]
+        }
+        tmp_path = f'{self.path}.tmp'
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def collectors(self):
+        names = set(ALWAYS)
+        for source in self.routes.values():
+            names.update(source.collectors)
+        return names
+
+    def channels(self):
+        """Channels of the persistent WebSocket collector"""
+        return {channel for source in self.routes.values() for channel in source.channels}
+
+    def wants(self, collector):
+        return collector.name in self.collectors()
+
+    async def probe(self, server):
+        """Probe GraphQL fields and nchan channels, and the pages only for capabilities still without a source"""
+        fields = await probe_graphql_fields(server)
+        channels = await probe_channels(server, PROBED_CHANNELS)
+        probes = {'graphql': sorted(fields) if fields is not None else None,
+                  'nchan': sorted(channels) if channels is not None else None,
+                  'http': []}
+        now = time.time()
+        for capability, sources in ROUTES.items():
+            if self.pick(capability, sources, probes, now, probe_http=False):
+                continue
+            for source in sources:
+                if source.kind == 'http' and not self.is_demoted(capability, source, now):
+                    for page in source.needs:
+                        if page not in probes['http'] and await probe_page(server, page):
+                            probes['http'].append(page)
+        return probes
+
+    def is_demoted(self, capability, source, now):
+        since = self.demoted.get((capability, source.kind))
+        return since is not None and now - since < DEMOTION_TTL
+
+    def pick(self, capability, sources, probes, now, probe_http=True):
+        """
+        The cheapest source of capability that isn't demoted and that the probes show working
+
+        Like is_supported(), a GraphQL or nchan probe that got no answer at all counts as working.
+        """
+        for source in sources:
+            if source.kind == 'http' and not probe_http or self.is_demoted(capability, source, now):
+                continue
+            found = probes.get(source.kind)
+            if found is None and source.kind != 'http' or found is not None and all(need in found for need in source.needs):
+                return source
+        return None
+
+    @staticmethod
+    def complete(probes):
+        """Only probes that got an answer from GraphQL and nchan are worth persisting"""
+        return probes['graphql'] is not None and probes['nchan'] is not None
+
+    def choose(self, probes):
+        """Routes for the probe results; capabilities nothing works for are left out"""
+        now = time.time()
+        self.demoted = {key: since for key, since in self.demoted.items() if now - since < DEMOTION_TTL}
+        routes = {}
+        for capability, sources in ROUTES.items():
+            source = self.pick(capability, sources, probes, now)
+            if source is not None:
+                routes[capability] = source
+        return routes
+
+    async def plan(self, server, collectors):
+        """
+        Route capabilities (from the persisted probe if it is recent enough) and return the collectors to run
+
+        Also fills server.capabilities['graphql'] and ['channels'] like the fixed modes' startup probe.
+        """
+        if self.probes is None or time.time() - self.probed > ROUTE_TTL:
+            probes = await self.probe(server)
+            if self.complete(probes):
+                self.probes, self.probed = probes, time.time()
+                self.routes = self.choose(probes)
+                self.save()
+            elif not self.routes:
+                # Route for this run only; due() probes again once reprobe_interval has passed
+                self.routes = self.choose(probes)
+        else:
+            server.logger.info(f'Routing: using the probe of {time.strftime("%Y-%m-%d %H:%M", time.localtime(self.probed))}')
+        self.last_reprobe = time.time()
+
+        if self.probes:
+            if self.probes.get('graphql') is not None:
+                server.capabilities['graphql'] = set(self.probes['graphql'])
+            if self.probes.get('nchan') is not None:
+                server.capabilities['channels'] = set(self.probes['nchan'])
+        server.logger.info(f'Routing: {self.describe()}')
+        return [collector for collector in collectors if self.wants(collector)]
+
+    def describe(self):
+        unrouted = sorted(set(ROUTES) - set(self.routes))
+        routed = ', '.join(f'{capability}={source.kind}' for capability, source in self.routes.items())
+        return routed + (f'; no source for {", ".join(unrouted)}' if unrouted else '')
+
+    def failing(self, health):
+        """Routed capabilities whose collectors failed REROUTE_FAILURES cycles in a row"""
+        failing = []
+        for capability, source in self.routes.items():
+            for name in source.collectors:
+                status = health.collectors.get(name)
+                if status is not None and status.failures >= REROUTE_FAILURES:
+                    failing.append(capability)
+                    break
+        return failing
+
+    def due(self, now=None):
+        """
+        Why the routes should be re-evaluated although nothing is failing, or None
+
+        At most every reprobe_interval: the probe is incomplete or older than ROUTE_TTL,
+        a demotion ran out, or a capability has no source.
+        """
+        now = now or time.time()
+        if now - self.last_reprobe < self.reprobe_interval:
+            return None
+        if self.probes is None or now - self.probed > ROUTE_TTL:
+            return 'probe expired'
+        expired = sorted(f'{capability}:{kind}' for (capability, kind), since in self.demoted.items() if now - since >= DEMOTION_TTL)
+        if expired:
+            return f'demotion of {", ".join(expired)} ran out'
+        unrouted = sorted(set(ROUTES) - set(self.routes))
+        if unrouted:
+            return f'no source for {", ".join(unrouted)}'
+        return None
+
+    async def reroute(self, server, failing=()):
+        """
+        Demote the failing sources and probe again, at most every reprobe_interval
+
+        Without failing capabilities it only probes when due().
+
+        Returns:
+            bool: True if any capability changed source
+        """
+        now = time.time()
+        if now - self.last_reprobe < self.reprobe_interval:
+            return False
+        if failing:
+            server.logger.warning(f'Routing: sources failing for {", ".join(failing)}, probing again')
+        else:
+            reason = self.due(now)
+            if reason is None:
+                return False
+            server.logger.info(f'Routing: {reason}, probing again')
+        self.last_reprobe = now
+        for capability in failing:
+            self.demoted[(capability, self.routes[capability].kind)] = now
+
+        probes = await self.probe(server)
+        routes = self.choose(probes)
+        changed = [capability for capability in set(routes) | set(self.routes) if routes.get(capability) is not self.routes.get(capability)]
+        if self.complete(probes):
+            self.probes, self.probed = probes, now
+        self.routes = routes
+        self.save()
+
+        if changed:
+            self.reprobe_interval = REPROBE_INTERVAL
+        else:
+            self.reprobe_interval = min(self.reprobe_interval * 2, MAX_REPROBE_INTERVAL)
+        server.logger.info(f'Routing: {self.describe()}')
+        return bool(changed)
+
+    def report(self):
+        now = time.time()
+        return {
+            'routes': {capability: source.kind for capability, source in self.routes.items()},
+            'demoted': {f'{capability}:{kind}': round(DEMOTION_TTL - (now - since)) for (capability, kind), since in self.demoted.items()},
+            'probe_age': round(now - self.probed) if self.probed else None
+        }
@@ -0,0 +1,123 @@
+"""
+Startup planner
+Logs in once, probes which GraphQL root fields and nchan channels the server
+offers in a single round trip each, then hands out staggered start offsets so
+collectors don't hit /login, /graphql and /sub/... in one synchronized burst.
+"""
+import asyncio
+from parsers.graphql_client import graphql_query, GraphQLAbsent, TRANSIENT_STATUS
+from parsers.nchan import parse_frame
+
+PROBE_QUERY = """
+    query {
+      root: __type(name: "Query") {
+        fields {
+          name
+        }
+      }
+    }
+"""
+
+# How long to wait for nchan to replay the last message of each probed channel
+CHANNEL_PROBE_TIMEOUT = 2
+
+
+async def probe_graphql_fields(server):
+    """
+    Return the set of GraphQL root query fields
+
+    An empty set means the server definitely has no usable GraphQL API (HTTP 4xx or
+    the query rejected by the schema); None means the probe failed and says nothing.
+    """
+    try:
+        data = await graphql_query(server, PROBE_QUERY, "probe", raise_absent=True)
+    except GraphQLAbsent:
+        return set()
+    if not data or not data.get('root'):
+        return None
+    return {field['name'] for field in data['root'].get('fields') or [] if isinstance(field, dict)}
+
+
+async def probe_channels(server, channels):
+    """
+    Subscribe to all channels at once and return those nchan replayed a message for
+
+    Returns None if the WebSocket could not be opened, and an empty set if nchan
+    rejected the subscription with a client error (no nchan on this server).
+    """
+    if not channels:
+        return set()
+
+    seen = set()
+    try:
+        async with server.nchan_subscribe(channels, close_timeout=2) as ws:
+            deadline = asyncio.get_event_loop().time() + CHANNEL_PROBE_TIMEOUT
+            while len(seen) < len(channels):
+                remaining = deadline - asyncio.get_event_loop().time()
+                if remaining <= 0:
+                    break
+                try:
+                    data = await asyncio.wait_for(ws.recv(), timeout=remaining)
+                    channel, _, _ = parse_frame(data, channels)
+                except ValueError:
+                    continue
+                except asyncio.TimeoutError:
+                    break
+                if channel:
+                    seen.add(channel)
+    except Exception as e:
+        server.logger.debug(f"Startup: nchan channel probe failed: {e}")
+        # websockets reports a rejected handshake with the HTTP response (status_code on older versions)
+        status = getattr(getattr(e, 'response', None), 'status_code', None) or getattr(e, 'status_code', None)
+        if isinstance(status, int) and 400 <= status < 500 and status not in TRANSIENT_STATUS:
+            return set()
+        return None
+    return seen
+
+
+def is_supported(collector, capabilities):
+    """False only when a successful probe shows a required GraphQL field is missing"""
+    fields = capabilities.get('graphql')
+    if fields is None:
+        return True
+    return all(field in fields for field in collector.requires)
+
+
+async def plan_startup(server, collectors):
+    """
+    Warm up the session, probe capabilities and schedule collectors
+
+    Returns:
+        list: (collector, start delay in seconds) for every collector to start
+    """
+    if server.unraid_username:
+        await server.refresh_unraid_session()
+
+    if server.router is not None:
+        # Source routing probes (or reuses its persisted probe) and drops the collectors of unused sources
+        collectors = await server.router.plan(server, collectors)
+        channels = tuple(sorted({channel for collector in collectors for channel in collector.channels}))
+    else:
+        channels = tuple(sorted({channel for collector in collectors for channel in collector.channels}))
+        if any(collector.requires for collector in collectors):
+            server.capabilities['graphql'] = await probe_graphql_fields(server)
+        server.capabilities['channels'] = await probe_channels(server, channels)
+
+    fields = server.capabilities.get('graphql')
+    if fields is not None:
+        server.logger.info(f"Startup: GraphQL offers {len(fields)} root fields")
+    seen = server.capabilities.get('channels')
+    if channels and seen is not None:
+        missing = sorted(set(channels) - seen)
+        server.logger.info(f"Startup: nchan channels with data: {sorted(seen)}{f', silent: {missing}' if missing else ''}")
+
+    planned = []
+    for collector in collectors:
+        if not is_supported(collector, server.capabilities):
+            server.logger.info(f"Startup: skipping {collector.name}, server lacks {', '.join(collector.requires)}")
+            continue
+        planned.append(collector)
+
+    # Spread first runs evenly over the stagger window, in registry order
+    step = server.startup_stagger / len(planned) if planned else 0
+    return [(collector, round(i * step, 2)) for i, collector in enumerate(planned)]
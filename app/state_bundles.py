@@ -0,0 +1,57 @@
+"""
+Bundled state topics
+With state_topics: bundled a server publishes one JSON document per device
+group ({base}/{server}/state/{group}) instead of one state topic per entity;
+discovery configs point at the group topic with a value_template. Documents
+always hold the latest value of every entity in the group, so delta-published
+entities (Docker) keep their value in every document. A group is republished
+whenever any of its entities reports, like the flat topics would be.
+"""
+
+# Entities that keep their own state topic: connectivity is also the MQTT will
+FLAT = ('connectivity',)
+
+GROUPS = (
+    ('disk_', 'disks'),
+    ('docker_', 'containers'),
+    ('ups_', 'ups'),
+)
+GROUP_NAMES = tuple(group for _, group in GROUPS) + ('system',)
+
+
+def group_of(sensor_id):
+    for prefix, group in GROUPS:
+        if sensor_id.startswith(prefix):
+            return group
+    return 'system'
+
+
+def value_template(sensor_id):
+    return f"{{{{ value_json['{sensor_id}'] }}}}"
+
+
+class StateBundles:
+    def __init__(self):
+        self.groups = {}
+        self.dirty = set()
+
+    def put(self, sensor_id, value):
+        """Record a value; the group's document goes out on the next flush even if nothing changed"""
+        group = group_of(sensor_id)
+        self.groups.setdefault(group, {})[sensor_id] = value
+        self.dirty.add(group)
+
+    def remove(self, sensor_id):
+        group = group_of(sensor_id)
+        if self.groups.get(group, {}).pop(sensor_id, None) is not None:
+            self.dirty.add(group)
+
+    def mark_all(self):
+        """Republish every document on the next flush (e.g. after a reconnect)"""
+        self.dirty.update(self.groups)
+
+    def pop_dirty(self):
+        """[(group, values)] of the documents changed since the last call"""
+        changed = [(group, self.groups[group]) for group in sorted(self.dirty) if self.groups.get(group)]
+        self.dirty.clear()
+        return changed
@@ -0,0 +1,73 @@
+"""
+In-memory store of the latest published state per entity
+One store per server, keyed by sensor id (the normalized entity name)
+"""
+import time
+
+
+class EntityState:
+    __slots__ = ('name', 'sensor_type', 'value', 'attributes', 'updated', 'changed')
+
+    def __init__(self, name, sensor_type, value, attributes, now):
+        self.name = name
+        self.sensor_type = sensor_type
+        self.value = value
+        self.attributes = attributes
+        self.updated = now
+        self.changed = now
+
+    def as_dict(self, now):
+        return {
+            'name': self.name,
+            'type': self.sensor_type,
+            'value': self.value,
+            'attributes': self.attributes,
+            'updated': round(self.updated, 3),
+            'changed': round(self.changed, 3),
+            'age': round(now - self.updated, 1)
+        }
+
+
+class StateStore:
+    def __init__(self):
+        self.entities = {}
+
+    def __len__(self):
+        return len(self.entities)
+
+    def update(self, sensor_id, name, sensor_type, value, attributes=None):
+        """
+        Record the latest value for an entity
+
+        Returns:
+            bool: True if the value or attributes differ from what was stored
+        """
+        now = time.time()
+        entity = self.entities.get(sensor_id)
+        if entity is None:
+            self.entities[sensor_id] = EntityState(name, sensor_type, value, attributes, now)
+            return True
+
+        entity.updated = now
+        changed = entity.value != value or (attributes is not None and entity.attributes != attributes)
+        if changed:
+            entity.value = value
+            if attributes is not None:
+                entity.attributes = attributes
+            entity.changed = now
+        return changed
+
+    def get(self, sensor_id):
+        return self.entities.get(sensor_id)
+
+    def remove(self, sensor_id):
+        self.entities.pop(sensor_id, None)
+
+    def query(self, prefix='', sensor_type=None):
+        """Return {sensor_id: state dict} for entities whose id starts with prefix"""
+        now = time.time()
+        return {
+            sensor_id: entity.as_dict(now)
+            for sensor_id, entity in self.entities.items()
+            if sensor_id.startswith(prefix) and (sensor_type is None or entity.sensor_type == sensor_type)
+        }
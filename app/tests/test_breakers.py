@@ -0,0 +1,180 @@
+"""
+Tests for the endpoint circuit breakers and the per-server retry budget
+Run from the repository root with: python -m unittest discover -s app/tests
+"""
+import os
+import sys
+import asyncio
+import unittest
+from unittest import mock
+
+import httpx
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+import breakers  # noqa: E402
+from breakers import (CircuitBreaker, RetryBudget, Breakers, BreakerTransport, CircuitOpenError, endpoint_of,  # noqa: E402
+                      CLOSED, OPEN, HALF_OPEN, FAILURE_THRESHOLD, BASE_BACKOFF, MAX_BACKOFF)
+
+NOW = 1729350000.0
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    def setUp(self):
+        # Full backoff, no jitter
+        patcher = mock.patch.object(breakers.random, 'uniform', return_value=1.0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker()
+
+    def trip(self, now=NOW):
+        for i in range(FAILURE_THRESHOLD):
+            opened = self.breaker.failure('timeout', now)
+        return opened
+
+    def test_opens_after_threshold(self):
+        for i in range(FAILURE_THRESHOLD - 1):
+            self.assertFalse(self.breaker.failure('timeout', NOW))
+            self.assertEqual(self.breaker.state, CLOSED)
+            self.assertTrue(self.breaker.allow(NOW))
+        self.assertTrue(self.breaker.failure('timeout', NOW))
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertEqual(self.breaker.open_until, NOW + BASE_BACKOFF)
+        self.assertFalse(self.breaker.allow(NOW + BASE_BACKOFF - 1))
+
+    def test_success_resets_failures(self):
+        self.breaker.failure('timeout', NOW)
+        self.breaker.failure('timeout', NOW)
+        self.assertFalse(self.breaker.success(NOW))
+        self.assertEqual(self.breaker.failures, 0)
+        self.assertFalse(self.breaker.failure('timeout', NOW))
+
+    def test_half_open_single_trial(self):
+        self.trip()
+        later = NOW + BASE_BACKOFF
+        self.assertTrue(self.breaker.allow(later))
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        self.assertFalse(self.breaker.allow(later))
+        self.assertTrue(self.breaker.success(later))
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.assertEqual(self.breaker.opens, 0)
+        self.assertTrue(self.breaker.allow(later))
+
+    def test_backoff_grows(self):
+        self.trip()
+        now = NOW
+        for opens in range(1, 10):
+            backoff = min(BASE_BACKOFF * 2 ** (opens - 1), MAX_BACKOFF)
+            self.assertEqual(self.breaker.open_until, now + backoff)
+            now = self.breaker.open_until
+            self.assertTrue(self.breaker.allow(now))
+            # A failed trial opens the breaker again at once, for longer
+            self.assertTrue(self.breaker.failure('timeout', now))
+            self.assertEqual(self.breaker.state, OPEN)
+        self.assertEqual(self.breaker.open_until - now, MAX_BACKOFF)
+
+    def test_as_dict(self):
+        self.trip()
+        report = self.breaker.as_dict(NOW + 4)
+        self.assertEqual(report['state'], OPEN)
+        self.assertEqual(report['consecutive_failures'], FAILURE_THRESHOLD)
+        self.assertEqual(report['retry_in'], BASE_BACKOFF - 4)
+        self.assertEqual(report['last_error'], 'timeout')
+
+
+class RetryBudgetTest(unittest.TestCase):
+    def test_withdraw_and_refill(self):
+        budget = RetryBudget(per_minute=6)
+        budget.updated = NOW
+        for i in range(6):
+            self.assertTrue(budget.withdraw(NOW))
+        self.assertFalse(budget.withdraw(NOW))
+        self.assertEqual(budget.refused, 1)
+        # One token every 10 seconds
+        self.assertFalse(budget.withdraw(NOW + 5))
+        self.assertTrue(budget.withdraw(NOW + 10))
+        self.assertFalse(budget.withdraw(NOW + 10))
+        self.assertEqual(budget.refused, 3)
+
+    def test_refill_is_capped(self):
+        budget = RetryBudget(per_minute=6)
+        budget.updated = NOW
+        budget.withdraw(NOW + 3600)
+        self.assertEqual(budget.tokens, 5)
+
+
+class BreakersTest(unittest.TestCase):
+    def setUp(self):
+        self.changes = []
+        self.breakers = Breakers(retry_budget=2, on_change=lambda endpoint, breaker: self.changes.append((endpoint, breaker.state)))
+
+    def test_retries_draw_from_budget(self):
+        self.breakers.before('/graphql')
+        self.assertEqual(self.breakers.budget.tokens, 2)
+        self.breakers.failure('/graphql', 'HTTP 502')
+        self.breakers.before('/graphql')
+        self.breakers.before('/graphql')
+        with self.assertRaisesRegex(CircuitOpenError, 'retry budget'):
+            self.breakers.before('/graphql')
+        # Endpoints without failures don't need a retry token
+        self.breakers.before('/login')
+
+    def test_open_refuses_and_reports(self):
+        for i in range(FAILURE_THRESHOLD):
+            self.breakers.failure('/sub', 'refused')
+        self.assertEqual(self.changes, [('/sub', OPEN)])
+        self.assertEqual(self.breakers.open(), ['/sub'])
+        with self.assertRaisesRegex(CircuitOpenError, 'circuit open'):
+            self.breakers.before('/sub')
+        self.assertEqual(self.breakers.report()['endpoints']['/sub']['state'], OPEN)
+
+    def test_release_lets_next_trial_through(self):
+        breaker = self.breakers.get('/graphql')
+        breaker.state = HALF_OPEN
+        self.breakers.before('/graphql')
+        with self.assertRaises(CircuitOpenError):
+            self.breakers.before('/graphql')
+        self.breakers.release('/graphql')
+        self.breakers.before('/graphql')
+        self.breakers.success('/graphql')
+        self.assertEqual(self.changes, [('/graphql', CLOSED)])
+
+    def test_endpoint_of(self):
+        self.assertEqual(endpoint_of('/sub/update1,update2'), '/sub')
+        self.assertEqual(endpoint_of('/graphql'), '/graphql')
+
+
+class BreakerTransportTest(unittest.TestCase):
+    def request(self, breakers, handler, path='/graphql'):
+        async def send():
+            transport = BreakerTransport(breakers, httpx.MockTransport(handler))
+            async with httpx.AsyncClient(transport=transport) as client:
+                return await client.get(f'http://tower{path}')
+        return asyncio.run(send())
+
+    def test_outcomes(self):
+        breakers = Breakers()
+        self.request(breakers, lambda request: httpx.Response(503))
+        self.request(breakers, lambda request: httpx.Response(429))
+        self.assertEqual(breakers.get('/graphql').failures, 2)
+        # A client error is an answer, not an endpoint failure
+        self.request(breakers, lambda request: httpx.Response(404))
+        self.assertEqual(breakers.get('/graphql').failures, 0)
+
+    def test_transport_error_opens(self):
+        def refuse(request):
+            raise httpx.ConnectError('refused')
+
+        breakers = Breakers()
+        for i in range(FAILURE_THRESHOLD):
+            with self.assertRaises(httpx.ConnectError):
+                self.request(breakers, refuse, '/sub/update1')
+        calls = []
+        with self.assertRaises(CircuitOpenError):
+            self.request(breakers, lambda request: calls.append(request) or httpx.Response(200), '/sub/disks')
+        self.assertEqual(calls, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+"""
+Tests for the Docker container delta publishing in parsers/graphql_docker.py
+Run from the repository root with: python -m unittest discover -s app/tests
+"""
+import os
+import sys
+import asyncio
+import logging
+import unittest
+from unittest import mock
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+from parsers import graphql_docker  # noqa: E402
+
+NOW = 1729350000.0
+
+
+def container(name, state='running', status='Up 3 hours', image='nginx:latest', ports=()):
+    return {
+        'id': f'{name}-0123456789abcdef',
+        'names': [f'/{name}'],
+        'image': image,
+        'state': state.upper(),
+        'status': status,
+        'autoStart': True,
+        'ports': [{'ip': '0.0.0.0', 'privatePort': private, 'publicPort': public, 'type': 'tcp'} for public, private in ports]
+    }
+
+
+class FakeServer:
+    def __init__(self):
+        self.logger = logging.getLogger('test_docker_deltas')
+        self.docker_deltas = {}
+        self.docker_status_interval = 600
+        self.docker_refresh_interval = 3600
+        self.published = []
+        self.swept = []
+
+    def mqtt_publish(self, payload, sensor_type, state, json_attributes=None, create_config=False, retain=False, owner=None):
+        self.published.append((payload['name'], state, json_attributes['status']))
+
+    def sweep_entities(self, family, keys):
+        self.swept.append((family, keys))
+
+
+class DockerDeltaTest(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeServer()
+
+    def scan(self, containers, now):
+        self.server.published.clear()
+        query = mock.AsyncMock(return_value={'docker': {'containers': containers}})
+        with mock.patch.object(graphql_docker, 'graphql_query', query), mock.patch.object(graphql_docker.time, 'time', return_value=now):
+            asyncio.run(graphql_docker.docker_containers(self.server))
+        return self.server.published
+
+    def test_first_scan_publishes_all(self):
+        published = self.scan([container('plex'), container('nginx', state='exited')], NOW)
+        self.assertEqual(published, [('Docker plex State', 'ON', 'Up 3 hours'), ('Docker nginx State', 'OFF', 'Up 3 hours')])
+        self.assertEqual(self.server.swept[-1], ('docker', {'plex', 'nginx'}))
+
+    def test_unchanged_is_skipped(self):
+        self.scan([container('plex')], NOW)
+        # Only the uptime text moved on, before the status cadence is due
+        self.assertEqual(self.scan([container('plex', status='Up 4 hours')], NOW + 60), [])
+
+    def test_fingerprint_changes(self):
+        self.scan([container('plex', ports=((32400, 32400),))], NOW)
+        changes = {
+            'state': container('plex', state='exited', ports=((32400, 32400),)),
+            'image': container('plex', image='plex:beta', ports=((32400, 32400),)),
+            'ports': container('plex', ports=((32401, 32400),)),
+        }
+        for field, data in changes.items():
+            with self.subTest(field):
+                published = self.scan([data], NOW + 60)
+                self.assertEqual(len(published), 1)
+                self.assertIsNotNone(published[0][1])
+
+    def test_status_cadence(self):
+        self.scan([container('plex')], NOW)
+        published = self.scan([container('plex', status='Up 4 hours')], NOW + 600)
+        # Attributes only, the state is left alone
+        self.assertEqual(published, [('Docker plex State', None, 'Up 4 hours')])
+        self.assertEqual(self.scan([container('plex', status='Up 4 hours')], NOW + 900), [])
+
+    def test_full_refresh(self):
+        self.scan([container('plex')], NOW)
+        self.assertEqual(self.scan([container('plex')], NOW + 3600), [('Docker plex State', 'ON', 'Up 3 hours')])
+        delta = self.server.docker_deltas[container('plex')['id']]
+        self.assertEqual(delta.published, NOW + 3600)
+        self.assertEqual(delta.status_published, NOW + 3600)
+
+    def test_removed_container_is_forgotten(self):
+        self.scan([container('plex'), container('nginx')], NOW)
+        self.scan([container('plex')], NOW + 60)
+        self.assertEqual(list(self.server.docker_deltas), [container('plex')['id']])
+        self.assertEqual(self.server.swept[-1], ('docker', {'plex'}))
+        self.scan([], NOW + 120)
+        self.assertEqual(self.server.docker_deltas, {})
+        self.assertEqual(self.server.swept[-1], ('docker', set()))
+
+    def test_failed_query_keeps_state(self):
+        self.scan([container('plex')], NOW)
+        query = mock.AsyncMock(return_value=None)
+        with mock.patch.object(graphql_docker, 'graphql_query', query):
+            asyncio.run(graphql_docker.docker_containers(self.server))
+        self.assertEqual(len(self.server.docker_deltas), 1)
+        self.assertEqual(len(self.server.swept), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
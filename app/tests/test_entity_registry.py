@@ -0,0 +1,141 @@
+"""
+Tests for the entity lifecycle registry: grace periods, adoption and persistence
+Run from the repository root with: python -m unittest discover -s app/tests
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import unittest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+from entity_registry import EntityRegistry, DEFAULT_GRACE  # noqa: E402
+
+NOW = 1729350000.0
+DAY = 86400
+
+
+class EntityRegistryTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.path = os.path.join(self.tmp, 'data', 'entities.json')
+        self.registry = EntityRegistry(self.path)
+
+    def add_container(self, name):
+        sensor_id = f'docker_{name}_state'
+        self.registry.record(sensor_id, 'binary_sensor', [f'unraid/tower/{sensor_id}'], owner=('docker', name))
+        return sensor_id
+
+    def test_grace_expiry(self):
+        plex = self.add_container('plex')
+        self.add_container('nginx')
+        self.assertEqual(self.registry.present('docker', {'plex', 'nginx'}, NOW), [])
+
+        self.assertEqual(self.registry.present('docker', {'nginx'}, NOW + 60), [])
+        self.assertEqual(self.registry.absent, {('docker', 'plex'): NOW + 60})
+        self.assertEqual(self.registry.present('docker', {'nginx'}, NOW + 60 + DAY - 1), [])
+
+        removed = self.registry.present('docker', {'nginx'}, NOW + 60 + DAY)
+        self.assertEqual([(sensor_id, record.key) for sensor_id, record in removed], [(plex, 'plex')])
+        self.assertNotIn(plex, self.registry.entities)
+        self.assertEqual(self.registry.absent, {})
+
+    def test_return_within_grace(self):
+        plex = self.add_container('plex')
+        self.registry.present('docker', set(), NOW)
+        self.registry.present('docker', {'plex'}, NOW + DAY / 2)
+        self.assertEqual(self.registry.absent, {})
+        self.assertEqual(self.registry.present('docker', set(), NOW + DAY + 1), [])
+        self.assertIn(plex, self.registry.entities)
+
+    def test_families_are_separate(self):
+        self.add_container('plex')
+        self.registry.record('vm_win11_state', 'binary_sensor', ['unraid/tower/vm_win11_state'], owner=('vm', 'win11'))
+        self.registry.present('vm', set(), NOW)
+        self.assertEqual(self.registry.present('docker', {'plex'}, NOW + DEFAULT_GRACE['vm']), [])
+        self.assertEqual(len(self.registry.present('vm', set(), NOW + DEFAULT_GRACE['vm'])), 1)
+
+    def test_grace_override(self):
+        registry = EntityRegistry(self.path, grace={'docker': None, 'share': 60})
+        self.assertEqual(registry.grace['vm'], DEFAULT_GRACE['vm'])
+        registry.record('docker_plex_state', 'binary_sensor', [], owner=('docker', 'plex'))
+        registry.present('docker', set(), NOW)
+        self.assertEqual(registry.present('docker', set(), NOW + 365 * DAY), [])
+        self.assertIn('docker_plex_state', registry.entities)
+
+    def test_unowned_entities_are_kept(self):
+        self.registry.record('cpu_utilization', 'sensor', ['unraid/tower/cpu_utilization'])
+        self.registry.present('docker', set(), NOW)
+        self.assertEqual(self.registry.present('docker', set(), NOW + 365 * DAY), [])
+        self.assertIn('cpu_utilization', self.registry.entities)
+
+    def test_adopt(self):
+        self.assertTrue(self.registry.adopt('docker_old_state', 'binary_sensor', ['unraid/tower/docker_old_state']))
+        self.assertFalse(self.registry.adopt('docker_old_state', 'binary_sensor', []))
+        # Only collected families are adopted
+        self.assertFalse(self.registry.adopt('array_state', 'sensor', []))
+
+        # Claimed by a parser: it belongs to its container from now on
+        self.add_container('plex')
+        self.registry.record('docker_old_state', 'binary_sensor', [], owner=('docker', 'old'))
+        now = time.time()
+        self.registry.present('docker', {'plex', 'old'}, now)
+        self.assertEqual(self.registry.present('docker', {'plex', 'old'}, now + 2 * DAY), [])
+
+    def test_unclaimed_adoption_is_removed(self):
+        self.registry.adopt('docker_old_state', 'binary_sensor', ['unraid/tower/docker_old_state'])
+        removed = self.registry.present('docker', set(), time.time() + DAY + 1)
+        self.assertEqual([sensor_id for sensor_id, _ in removed], ['docker_old_state'])
+
+    def test_topics(self):
+        plex = self.add_container('plex')
+        self.registry.record(plex, 'binary_sensor', ['unraid/tower/docker_plex_state', 'homeassistant/binary_sensor/plex/config'],
+                             owner=('docker', 'plex'))
+        self.registry.drop_topic(plex, 'unraid/tower/docker_plex_state')
+        self.registry.add_topic(plex, 'unraid/tower/docker_plex_state/attributes')
+        self.assertEqual(self.registry.entities[plex].topics,
+                         ['homeassistant/binary_sensor/plex/config', 'unraid/tower/docker_plex_state/attributes'])
+
+    def test_persistence(self):
+        plex = self.add_container('plex')
+        self.add_container('nginx')
+        self.registry.present('docker', {'nginx'}, NOW)
+        self.registry.save()
+        self.assertFalse(self.registry.dirty)
+
+        restored = EntityRegistry(self.path)
+        self.assertEqual(len(restored), 2)
+        self.assertEqual(restored.entities[plex].key, 'plex')
+        self.assertEqual(restored.entities[plex].topics, [f'unraid/tower/{plex}'])
+        # The grace period keeps running across restarts
+        self.assertEqual(restored.absent, {('docker', 'plex'): NOW})
+        self.assertEqual(len(restored.present('docker', {'nginx'}, NOW + DAY)), 1)
+
+    def test_save_only_when_dirty(self):
+        self.registry.save()
+        self.assertFalse(os.path.exists(self.path))
+        self.add_container('plex')
+        self.registry.save()
+        mtime = os.stat(self.path).st_mtime_ns
+        self.registry.present('docker', {'plex'}, NOW)
+        self.assertFalse(self.registry.dirty)
+        self.registry.save()
+        self.assertEqual(os.stat(self.path).st_mtime_ns, mtime)
+
+    def test_corrupt_file(self):
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, 'w') as f:
+            f.write('{"entities": ')
+        self.assertEqual(len(EntityRegistry(self.path)), 0)
+        with open(self.path, 'w') as f:
+            json.dump({'entities': {}, 'absent': []}, f)
+        self.assertEqual(len(EntityRegistry(self.path)), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+"""
+Tests for the SeriesTable sample rings and their least-squares rates
+Run from the repository root with: python -m unittest discover -s app/tests
+"""
+import os
+import sys
+import unittest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+from history import SeriesTable, HistoryStore  # noqa: E402
+
+START = 1729350000.0
+
+
+def fill(table, key, count, slope, interval=60, offset=0.0):
+    for i in range(count):
+        table.record(key, START + i * interval, offset + slope * i * interval)
+
+
+class SeriesTableTest(unittest.TestCase):
+    def test_min_interval(self):
+        table = SeriesTable(size=4, min_interval=900)
+        self.assertTrue(table.record('disk1', START, 1.0))
+        self.assertFalse(table.record('disk1', START + 899, 2.0))
+        self.assertTrue(table.record('disk1', START + 900, 3.0))
+        self.assertEqual(table.last('disk1'), 3.0)
+
+    def test_slope(self):
+        table = SeriesTable(size=16, min_interval=0)
+        fill(table, 'rising', 10, 2.5, offset=100)
+        fill(table, 'falling', 10, -0.25)
+        fill(table, 'flat', 10, 0)
+        rates = table.rates()
+        self.assertAlmostEqual(rates['rising'], 2.5)
+        self.assertAlmostEqual(rates['falling'], -0.25)
+        self.assertEqual(rates['flat'], 0)
+
+    def test_ring_wrap(self):
+        table = SeriesTable(size=8, min_interval=0)
+        # The slope changes after 20 samples; only the last 8 are kept
+        fill(table, 'disk1', 20, 1.0)
+        for i in range(20, 28):
+            table.record('disk1', START + i * 60, 1200 + 3.0 * (i - 20) * 60)
+        self.assertEqual(table.last('disk1'), 1200 + 3.0 * 7 * 60)
+        self.assertAlmostEqual(table.rates()['disk1'], 3.0)
+
+    def test_partial_wrap(self):
+        table = SeriesTable(size=8, min_interval=0)
+        fill(table, 'disk1', 11, 0.5)
+        self.assertAlmostEqual(table.rates()['disk1'], 0.5)
+        self.assertEqual(table.last('disk1'), 0.5 * 10 * 60)
+
+    def test_min_samples_and_span(self):
+        table = SeriesTable(size=8, min_interval=0)
+        fill(table, 'short', 2, 1.0)
+        fill(table, 'long', 5, 1.0, interval=600)
+        self.assertEqual(set(table.rates()), {'long'})
+        self.assertEqual(set(table.rates(min_samples=2)), {'short', 'long'})
+        self.assertEqual(set(table.rates(min_span=3600)), set())
+        self.assertEqual(set(table.rates(min_span=2400)), {'long'})
+
+    def test_same_timestamps(self):
+        table = SeriesTable(size=8, min_interval=0)
+        for value in (1.0, 2.0, 3.0):
+            table.record('disk1', START, value)
+        self.assertEqual(table.rates(), {})
+
+    def test_reset(self):
+        table = SeriesTable(size=8, min_interval=0)
+        fill(table, 'parity', 6, 1.0)
+        table.reset('parity')
+        self.assertIsNone(table.last('parity'))
+        fill(table, 'parity', 4, -2.0)
+        self.assertAlmostEqual(table.rates()['parity'], -2.0)
+
+    def test_discard_reuses_row(self):
+        table = SeriesTable(size=8, min_interval=0)
+        fill(table, 'disk1', 5, 1.0)
+        fill(table, 'disk2', 5, 2.0)
+        table.discard('disk1')
+        fill(table, 'disk3', 3, 4.0)
+        self.assertEqual(len(table), 2)
+        self.assertEqual(len(table.counts), 2)
+        rates = table.rates()
+        self.assertNotIn('disk1', rates)
+        self.assertAlmostEqual(rates['disk3'], 4.0)
+
+    def test_eviction(self):
+        table = SeriesTable(size=4, max_series=2, min_interval=0)
+        fill(table, 'disk1', 3, 1.0)
+        fill(table, 'disk2', 3, 1.0)
+        table.record('disk1', START + 600, 600.0)
+        fill(table, 'disk3', 3, 1.0)
+        # disk2 went longest without a sample
+        self.assertEqual(set(table.rows), {'disk1', 'disk3'})
+        self.assertIsNone(table.last('disk2'))
+        self.assertEqual(table.counts[table.rows['disk3']], 3)
+
+
+class HistoryStoreTest(unittest.TestCase):
+    def test_table_is_kept(self):
+        store = HistoryStore()
+        table = store.table('used', size=4)
+        self.assertIs(store.table('used'), table)
+        self.assertEqual(table.size, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
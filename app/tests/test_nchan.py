@@ -0,0 +1,69 @@
+"""
+Tests for the nchan frame decoder against the frames in fixtures/nchan_frames.json
+Run from the repository root with: python -m unittest discover -s app/tests
+"""
+import os
+import sys
+import json
+import unittest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+from parsers.nchan import parse_frame, frame_text  # noqa: E402
+from parsers.docker_load import CHANNELS as DOCKER_LOAD_CHANNELS  # noqa: E402
+from collectors import MODES  # noqa: E402
+from routing import ROUTES  # noqa: E402
+
+with open(os.path.join(APP_DIR, 'tests', 'fixtures', 'nchan_frames.json')) as f:
+    FRAMES = json.load(f)
+
+# Every channel the bridge subscribes to: collector channels, the routed sources of the WebSocket
+# collector, and session/cpuload which it always keeps (main.ws_channels)
+SUBSCRIBED = ({channel for collector in MODES['auto'] for channel in collector.channels}
+              | {channel for sources in ROUTES.values() for source in sources for channel in source.channels}
+              | set(DOCKER_LOAD_CHANNELS) | {'session', 'cpuload'})
+
+
+class ParseFrameTest(unittest.TestCase):
+    def check(self, fixture, frame):
+        channels = tuple(fixture['channels'])
+        if fixture.get('error'):
+            with self.assertRaises(ValueError):
+                parse_frame(frame, channels)
+            return
+        channel, msg_id, body = parse_frame(frame, channels)
+        self.assertEqual(channel, fixture['channel'])
+        self.assertEqual(msg_id, fixture['id'])
+        self.assertEqual(frame_text(body), fixture['body'])
+        return body
+
+    def test_text_frames(self):
+        for fixture in FRAMES:
+            with self.subTest(fixture['name']):
+                body = self.check(fixture, fixture['frame'])
+                if body is not None:
+                    self.assertIsInstance(body, str)
+
+    def test_binary_frames(self):
+        for fixture in FRAMES:
+            for kind in (bytes, bytearray, memoryview):
+                with self.subTest(fixture['name'], kind=kind.__name__):
+                    frame = fixture['frame'].encode()
+                    body = self.check(fixture, kind(frame) if kind is not bytes else frame)
+                    if body is not None:
+                        # Binary bodies are views into the received buffer, not copies
+                        self.assertIsInstance(body, memoryview)
+
+    def test_every_channel_has_a_frame(self):
+        captured = {fixture['channel'] for fixture in FRAMES if fixture.get('channel')}
+        self.assertEqual(sorted(SUBSCRIBED - captured), [])
+
+    def test_utf8_body(self):
+        frame = 'id: 1729350000:[0],-\n\n<span title="Température">47 °C</span>'.encode()
+        _, _, body = parse_frame(frame, ('temperature', 'update1'))
+        self.assertEqual(frame_text(body), '<span title="Température">47 °C</span>')
+
+
+if __name__ == '__main__':
+    unittest.main()
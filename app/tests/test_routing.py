@@ -0,0 +1,222 @@
+"""
+Tests for capability-based source routing: picking, persistence and re-routing
+Run from the repository root with: python -m unittest discover -s app/tests
+"""
+import os
+import sys
+import asyncio
+import logging
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+import routing  # noqa: E402
+from routing import Router, ROUTES, PROBED_CHANNELS, UPS_PAGE, ROUTE_TTL, DEMOTION_TTL, REPROBE_INTERVAL, MAX_REPROBE_INTERVAL  # noqa: E402
+
+NOW = 1729350000.0
+ALL_FIELDS = {'array', 'docker', 'vms', 'shares'}
+
+
+def probes(graphql=ALL_FIELDS, nchan=PROBED_CHANNELS, http=()):
+    return {'graphql': sorted(graphql) if graphql is not None else None,
+            'nchan': sorted(nchan) if nchan is not None else None,
+            'http': list(http)}
+
+
+def kinds(routes):
+    return {capability: source.kind for capability, source in routes.items()}
+
+
+LOGGER = logging.getLogger('test_routing')
+LOGGER.addHandler(logging.NullHandler())
+
+
+class FakeServer:
+    def __init__(self, fields=ALL_FIELDS, channels=PROBED_CHANNELS, pages=()):
+        self.logger = LOGGER
+        self.capabilities = {}
+        self.fields = fields
+        self.channels = channels
+        self.pages = set(pages)
+        self.page_probes = []
+
+
+class RouterTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.path = os.path.join(self.tmp, 'routes_tower.json')
+        self.router = Router(self.path)
+        self.now = NOW
+        self.server = FakeServer()
+
+        async def fields(server):
+            return set(server.fields) if server.fields is not None else None
+
+        async def channels(server, wanted):
+            return set(server.channels) & set(wanted) if server.channels is not None else None
+
+        async def page(server, path):
+            server.page_probes.append(path)
+            return path in server.pages
+
+        for name, fake in (('probe_graphql_fields', fields), ('probe_channels', channels), ('probe_page', page)):
+            patcher = mock.patch.object(routing, name, fake)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(routing.time, 'time', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def plan(self):
+        collectors = [SimpleNamespace(name=name) for name in ('system_sensors', 'graphql_disk', 'websocket', 'http_ups', 'vm_sensors')]
+        return [collector.name for collector in asyncio.run(self.router.plan(self.server, collectors))]
+
+    def reroute(self, failing=()):
+        return asyncio.run(self.router.reroute(self.server, failing))
+
+    def test_pick_cheapest_working(self):
+        pick = self.router.pick
+        self.assertEqual(pick('disks', ROUTES['disks'], probes(), NOW).kind, 'graphql')
+        self.assertEqual(pick('disks', ROUTES['disks'], probes(graphql=set()), NOW).kind, 'nchan')
+        self.assertIsNone(pick('disks', ROUTES['disks'], probes(graphql=set(), nchan=set()), NOW))
+        # A probe that got no answer doesn't rule its source out
+        self.assertEqual(pick('disks', ROUTES['disks'], probes(graphql=None), NOW).kind, 'graphql')
+
+    def test_pick_http(self):
+        pick = self.router.pick
+        found = probes(nchan=set(), http=(UPS_PAGE,))
+        self.assertEqual(pick('ups', ROUTES['ups'], found, NOW).kind, 'http')
+        self.assertIsNone(pick('ups', ROUTES['ups'], found, NOW, probe_http=False))
+        self.assertIsNone(pick('ups', ROUTES['ups'], probes(nchan=set()), NOW))
+
+    def test_pick_skips_demoted(self):
+        self.router.demoted[('disks', 'graphql')] = NOW
+        self.assertEqual(self.router.pick('disks', ROUTES['disks'], probes(), NOW + DEMOTION_TTL - 1).kind, 'nchan')
+        self.assertEqual(self.router.pick('disks', ROUTES['disks'], probes(), NOW + DEMOTION_TTL).kind, 'graphql')
+
+    def test_choose(self):
+        routes = self.router.choose(probes(graphql={'array', 'shares'}, nchan={'disks', 'update1', 'apcups'}))
+        self.assertEqual(kinds(routes), {'disks': 'graphql', 'array': 'graphql', 'shares': 'graphql', 'ups': 'nchan', 'memory': 'nchan'})
+
+    def test_choose_prunes_expired_demotions(self):
+        self.router.demoted = {('disks', 'graphql'): NOW - DEMOTION_TTL, ('array', 'graphql'): NOW - 60}
+        routes = self.router.choose(probes())
+        self.assertEqual(routes['disks'].kind, 'graphql')
+        self.assertEqual(routes['array'].kind, 'nchan')
+        self.assertEqual(list(self.router.demoted), [('array', 'graphql')])
+
+    def test_plan_probes_pages_only_when_needed(self):
+        self.server = FakeServer(channels=set(PROBED_CHANNELS) - {'apcups'}, pages={UPS_PAGE})
+        names = self.plan()
+        self.assertEqual(self.server.page_probes, [UPS_PAGE])
+        self.assertEqual(self.router.routes['ups'].kind, 'http')
+        self.assertEqual(set(names), {'system_sensors', 'graphql_disk', 'http_ups'})
+        self.assertEqual(self.server.capabilities['graphql'], ALL_FIELDS)
+
+    def test_save_and_load(self):
+        self.server = FakeServer(fields={'array'})
+        self.plan()
+        self.router.demoted[('disks', 'graphql')] = NOW
+        self.router.save()
+
+        restored = Router(self.path)
+        self.assertEqual(kinds(restored.routes), kinds(self.router.routes))
+        self.assertEqual(restored.probes, self.router.probes)
+        self.assertEqual(restored.probed, NOW)
+        self.assertEqual(restored.demoted, {('disks', 'graphql'): NOW})
+        self.assertEqual(restored.channels(), self.router.channels())
+
+    def test_plan_reuses_fresh_probe(self):
+        self.plan()
+        self.server = FakeServer(fields=set(), channels=set())
+        self.router = Router(self.path)
+        self.now = NOW + ROUTE_TTL
+        self.plan()
+        self.assertEqual(self.router.routes['disks'].kind, 'graphql')
+        self.now = NOW + ROUTE_TTL + 1
+        self.router = Router(self.path)
+        self.plan()
+        self.assertNotIn('disks', self.router.routes)
+
+    def test_incomplete_probe_is_not_saved(self):
+        self.server = FakeServer(channels=None)
+        self.plan()
+        self.assertFalse(os.path.exists(self.path))
+        # The nchan probe got no answer, so its sources are still routed
+        self.assertEqual(kinds(self.router.routes)['memory'], 'nchan')
+        self.assertEqual(self.router.due(NOW + REPROBE_INTERVAL), 'probe expired')
+
+    def test_corrupt_file(self):
+        with open(self.path, 'w') as f:
+            f.write('{"routes": ')
+        self.assertEqual(Router(self.path).routes, {})
+
+    def test_failing(self):
+        self.plan()
+        health = SimpleNamespace(collectors={'graphql_disk': SimpleNamespace(failures=3), 'graphql_array': SimpleNamespace(failures=2)})
+        self.assertEqual(self.router.failing(health), ['disks'])
+
+    def test_reroute_demotes_failing_source(self):
+        self.plan()
+        self.assertFalse(self.reroute(['disks']))
+        self.now += REPROBE_INTERVAL
+        self.assertTrue(self.reroute(['disks']))
+        self.assertEqual(self.router.routes['disks'].kind, 'nchan')
+        self.assertIn('disks', self.router.channels())
+        self.assertEqual(Router(self.path).routes['disks'].kind, 'nchan')
+
+    def test_reroute_backs_off_while_nothing_changes(self):
+        self.server = FakeServer(fields={'array'}, channels={'disks'})
+        self.plan()
+        interval = REPROBE_INTERVAL
+        for i in range(8):
+            self.now += interval
+            self.assertFalse(self.reroute())
+            interval = min(interval * 2, MAX_REPROBE_INTERVAL)
+            self.assertEqual(self.router.reprobe_interval, interval)
+        self.assertEqual(interval, MAX_REPROBE_INTERVAL)
+
+    def test_demotion_runs_out(self):
+        self.plan()
+        self.now += REPROBE_INTERVAL
+        self.reroute(['disks'])
+        self.assertEqual(self.router.routes['disks'].kind, 'nchan')
+        self.assertIsNone(self.router.due(self.now + REPROBE_INTERVAL))
+
+        self.now += DEMOTION_TTL
+        self.assertEqual(self.router.due(), 'demotion of disks:graphql ran out')
+        self.assertTrue(self.reroute())
+        self.assertEqual(self.router.routes['disks'].kind, 'graphql')
+        self.assertEqual(self.router.demoted, {})
+        self.assertIsNone(self.router.due(self.now + REPROBE_INTERVAL))
+
+    def test_probe_expires(self):
+        self.plan()
+        self.assertIsNone(self.router.due(NOW + REPROBE_INTERVAL))
+        self.now = NOW + ROUTE_TTL + 1
+        self.server = FakeServer(fields=set())
+        self.assertEqual(self.router.due(), 'probe expired')
+        self.assertTrue(self.reroute())
+        self.assertNotIn('docker', self.router.routes)
+        self.assertEqual(self.router.probed, self.now)
+
+    def test_unrouted_capability_is_picked_up(self):
+        self.server = FakeServer(fields=set(ALL_FIELDS) - {'docker'})
+        self.plan()
+        self.assertFalse(self.reroute())
+        self.now += REPROBE_INTERVAL
+        self.assertEqual(self.router.due(), 'no source for docker')
+        self.server.fields = ALL_FIELDS
+        self.assertTrue(self.reroute())
+        self.assertEqual(self.router.routes['docker'].kind, 'graphql')
+        self.assertIsNone(self.router.due(self.now + MAX_REPROBE_INTERVAL))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,26 +1,36 @@
 import re
-import math
-import httpx
-from lxml import etree
-from utils import Preferences
-from humanfriendly import parse_size
-import time
-import psutil
 import json
 
-from parsers.uptime import system_uptime
-from parsers.cpu import cpu_temperature_avg, cpu_utilization, cpuload
-from parsers.memory import update1
-from parsers.network import update3
-from parsers.tempsensors import temperature
-from parsers.parity import parity
-from parsers.disks import disks
-from parsers.shares import shares
-from parsers.vms import vms
-from parsers.array_status import array_status
-from parsers.update2 import update2
+from collectors import STARTUP
 from parsers.ups import handle_ups
 
+# Parser name -> module; resolved on first access so a mode only loads (and pays
+# the import cost of lxml, humanfriendly, psutil...) for the parsers it uses
+LAZY_PARSERS = {
+    'system_uptime': 'parsers.uptime',
+    'cpu_temperature_avg': 'parsers.cpu',
+    'cpu_utilization': 'parsers.cpu',
+    'cpuload': 'parsers.cpu',
+    'update1': 'parsers.memory',
+    'update3': 'parsers.network',
+    'temperature': 'parsers.tempsensors',
+    'parity': 'parsers.parity',
+    'disks': 'parsers.disks',
+    'shares': 'parsers.shares',
+    'vms': 'parsers.vms',
+    'array_status': 'parsers.array_status',
+    'update2': 'parsers.update2',
+}
+
+
+def __getattr__(name):
+    module_name = LAZY_PARSERS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(STARTUP.import_module(module_name), name)
+    globals()[name] = value
+    return value
+
 
 async def default(self, msg_data, create_config):
     pass
@@ -1,5 +1,7 @@
 import os
+import sys
 import json
+import logging
 import yaml
 import configparser
 
@@ -25,6 +27,17 @@ class Preferences:
         return d
 
 
+def get_logger(name):
+    """Logger writing '<time> [<level>] [<name>] <message>' lines to stdout"""
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.INFO)
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter(f'%(asctime)s [%(levelname)s] [{name}] %(message)s'))
+        logger.addHandler(handler)
+    return logger
+
+
 def handle_sigterm(*args):
     raise KeyboardInterrupt()
 